@@ -0,0 +1,205 @@
+import typing
+import os
+import json
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+from nicopy.grids import GlobalGrids
+from nicopy.grids.mod_grid import grid_conv
+from nicopy.reader import GlobalReader, LegacyReader, PandaReader
+from nicopy.util import calc_gall, calc_lall
+
+from synthetic import write_grids, write_legacy, write_panda
+
+varname = "ms_tem"
+
+
+class Run(typing.NamedTuple):
+    """
+    glevel, rlevel, kall, nstep: size of the synthetic run
+    grid: format string of the grid files
+    legacy: format string of the legacy data files
+    panda: paths of the PE files
+    """
+
+    glevel: int
+    rlevel: int
+    kall: int
+    nstep: int
+    grid: str
+    legacy: str
+    panda: typing.List[str]
+
+
+class Result(typing.NamedTuple):
+    """
+    time: best wall time of the repeats [s]
+    nbytes: bytes of file data read, 0 for cases working in memory
+    peak: peak of traced (numpy and python) allocations [bytes]; memory
+        maps of the files are not included
+    """
+
+    glevel: int
+    case: str
+    time: float
+    nbytes: int
+    peak: int
+
+
+def generate(
+    directory: str, glevel: int, rlevel: int, kall: int, nstep: int, num_of_pe: int
+) -> Run:
+    """
+    write the synthetic files of a run unless they exist
+    """
+    directory = os.path.join(directory, f"g{glevel}r{rlevel}k{kall}s{nstep}")
+    grid = os.path.join(directory, "grid", "grid.rgn{l:05d}")
+    legacy = os.path.join(directory, "legacy", f"{varname}.rgn{{l:05d}}")
+    panda = os.path.join(directory, f"panda{num_of_pe}", "history.pe{pe:06d}")
+    done = os.path.join(directory, f"done{num_of_pe}")
+    if not os.path.exists(done):
+        write_grids(grid, glevel, rlevel)
+        write_legacy(legacy, glevel, rlevel, kall, nstep)
+        write_panda(panda, glevel, rlevel, kall, nstep, num_of_pe, [varname])
+        open(done, "w").close()
+    paths = [panda.format(pe=pe) for pe in range(num_of_pe)]
+    return Run(glevel, rlevel, kall, nstep, grid, legacy, paths)
+
+
+def cases(run: Run) -> typing.Dict[str, typing.Callable[[], int]]:
+    """
+    Returns:
+        benchmark cases returning the bytes of file data they read
+    """
+    glevel, rlevel, kall, nstep = run.glevel, run.rlevel, run.kall, run.nstep
+    lall = calc_lall(rlevel)
+    _, gall_1d = calc_gall(glevel, rlevel)
+    grids = GlobalGrids(glevel, rlevel, run.grid)
+    legacy = [run.legacy.format(l=rgn) for rgn in range(lall)]
+
+    def grid_load() -> int:
+        GlobalGrids(glevel, rlevel, run.grid)
+        return sum(os.path.getsize(run.grid.format(l=rgn)) for rgn in range(lall))
+
+    def get_lonlat_v() -> int:
+        grids.get_lonlat_v()
+        return 0
+
+    def center2vertex() -> int:
+        conv = grid_conv(gall_1d)
+        for rgn in range(lall):
+            conv.center2vertex(grids.grd_x[rgn])
+        return 0
+
+    def read_rgn() -> int:
+        nbytes = 0
+        for filename in legacy:
+            with LegacyReader(glevel, rlevel, kall, filename) as reader:
+                for step in range(nstep):
+                    for k in range(kall):
+                        nbytes += reader.read_rgn(step, k, native=True).nbytes
+        return nbytes
+
+    def read_pe() -> int:
+        nbytes = 0
+        for filename in run.panda:
+            reader = PandaReader(filename)
+            for step in reader.steps(varname):
+                for k in range(kall):
+                    nbytes += reader.read_pe(varname, step, k, native=True).nbytes
+            reader.fclose()
+        return nbytes
+
+    def global_legacy() -> int:
+        with GlobalReader(glevel, rlevel, legacy, kall) as reader:
+            return reader.read_block(range(nstep)).nbytes
+
+    def global_panda() -> int:
+        with GlobalReader(glevel, rlevel, run.panda) as reader:
+            return reader.read_block(range(1, nstep + 1), None, varname).nbytes
+
+    return {
+        "grid_load": grid_load,
+        "get_lonlat_v": get_lonlat_v,
+        "center2vertex": center2vertex,
+        "read_rgn": read_rgn,
+        "read_pe": read_pe,
+        "global_legacy": global_legacy,
+        "global_panda": global_panda,
+    }
+
+
+def measure(
+    glevel: int, case: str, func: typing.Callable[[], int], repeat: int
+) -> Result:
+    """
+    time func repeat times, then trace its allocations in one more call;
+    files freshly written or read by an earlier repeat come from the page
+    cache, so reads measure decoding and copying rather than the disk
+    """
+    times = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        nbytes = func()
+        times.append(time.perf_counter() - start_time)
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return Result(glevel, case, min(times), nbytes, peak)
+
+
+def report(result: Result):
+    mb = result.nbytes / 1024**2
+    rate = f"{mb / result.time:10.1f}" if result.nbytes else f"{'-':>10}"
+    print(
+        f"{result.glevel:6d} {result.case:14s} {result.time:10.4f} "
+        f"{mb:10.1f} {rate} {result.peak / 1024**2:10.1f}",
+        flush=True,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="benchmark grid and reader performance on synthetic runs"
+    )
+    parser.add_argument("--glevels", type=int, nargs="+", default=[5, 6, 7])
+    parser.add_argument("--rlevel", type=int, default=1)
+    parser.add_argument("--kall", type=int, default=4)
+    parser.add_argument("--steps", type=int, default=2, help="number of steps")
+    parser.add_argument("--pe", type=int, default=4, help="number of PE files")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--cases", nargs="+", help="cases to run, all if omitted")
+    parser.add_argument(
+        "--workdir", help="directory keeping the synthetic files, temporary if omitted"
+    )
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        workdir = args.workdir or tmpdir
+        results = []
+        print(
+            f"{'glevel':>6} {'case':14s} {'time [s]':>10} {'read [MB]':>10} "
+            f"{'MB/s':>10} {'peak [MB]':>10}"
+        )
+        for glevel in args.glevels:
+            run = generate(workdir, glevel, args.rlevel, args.kall, args.steps, args.pe)
+            for case, func in cases(run).items():
+                if args.cases and case not in args.cases:
+                    continue
+                result = measure(glevel, case, func, args.repeat)
+                report(result)
+                results.append(result)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump([r._asdict() for r in results], f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+import typing
+import os
+import argparse
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from nicopy.reader import PandaWriter
+from nicopy.util import calc_gall, calc_lall
+
+
+def diamonds() -> np.ndarray:
+    """
+    corners of the ten diamonds of the icosahedron
+
+    Returns:
+        NDArray of shape (10, 4, 3), corners (p, q) = (0, 0), (1, 0), (1, 1),
+        (0, 1) of every diamond, five northern then five southern
+    """
+    lat = np.arctan(0.5)
+    north = np.array([0.0, 0.0, 1.0])
+    lon_u = np.deg2rad(72.0 * np.arange(5))
+    lon_l = lon_u + np.deg2rad(36.0)
+    upper = np.stack(
+        [
+            np.cos(lat) * np.cos(lon_u),
+            np.cos(lat) * np.sin(lon_u),
+            np.full(5, np.sin(lat)),
+        ],
+        axis=1,
+    )
+    lower = np.stack(
+        [
+            np.cos(lat) * np.cos(lon_l),
+            np.cos(lat) * np.sin(lon_l),
+            np.full(5, -np.sin(lat)),
+        ],
+        axis=1,
+    )
+    corners = []
+    for d in range(5):
+        corners.append([upper[d], lower[d], upper[(d + 1) % 5], north])
+    for d in range(5):
+        corners.append([lower[d], -north, lower[(d + 1) % 5], upper[(d + 1) % 5]])
+    return np.array(corners)
+
+
+def lattice(glevel: int, rlevel: int, rgn: int, n: int) -> np.ndarray:
+    """
+    points of region rgn on the lattice of its diamond, starting one point
+    outside the region; points beyond the diamond are extrapolated within
+    the plane of its triangles
+
+    Args:
+        n: number of points along each side
+
+    Returns:
+        NDArray of shape (3, n, n) on the unit sphere, indexed (j, i)
+    """
+    rall = 2**rlevel
+    nmax = 2 ** (glevel - rlevel)
+    d, r = divmod(rgn, rall * rall)
+    rj, ri = divmod(r, rall)
+    c00, c10, c11, c01 = diamonds()[d]
+    j, i = np.meshgrid(np.arange(n), np.arange(n), indexing="ij")
+    a = ((ri * nmax + i - 1) / 2**glevel)[..., np.newaxis]
+    b = ((rj * nmax + j - 1) / 2**glevel)[..., np.newaxis]
+    x = np.where(
+        a >= b,
+        (1 - a) * c00 + (a - b) * c10 + b * c11,
+        (1 - b) * c00 + (b - a) * c01 + a * c11,
+    )
+    x /= np.linalg.norm(x, axis=-1, keepdims=True)
+    return x.transpose(2, 0, 1)
+
+
+def make_grids(glevel: int, rlevel: int) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """
+    centers and vertices of all regions
+
+    Cell centers are the points of the icosahedral lattice projected to the
+    sphere. Points outside a region are replaced by the nearest inner center
+    of any region or pole, which is the neighbour the halo holds in NICAM.
+    At the corners of the diamonds the halo corner point does not exist; it
+    copies the halo point (gmin-1, gmin) in the pentagon regions and keeps
+    the nearest center elsewhere. Vertices are the normalized centroids of
+    the triangles (ij, ip1j, ip1jp1) and (ij, ip1jp1, ijp1), with the
+    missing halo corners filled as grid_conv.center2vertex does.
+
+    Returns:
+        grd_x: NDArray of shape (lall, 3, gall)
+        grd_xt: NDArray of shape (lall, 3, 2, gall)
+    """
+    gall, gall_1d = calc_gall(glevel, rlevel)
+    lall = calc_lall(rlevel)
+    rall = 2**rlevel
+    n = gall_1d + 1
+    x = np.stack([lattice(glevel, rlevel, rgn, n) for rgn in range(lall)])
+    points = x.transpose(0, 2, 3, 1)
+    outer = np.ones((n, n), dtype=bool)
+    outer[1 : gall_1d - 1, 1 : gall_1d - 1] = False
+    poles = np.array([[0.0, 0.0, 1.0], [0.0, 0.0, -1.0]])
+    centers = np.concatenate(
+        [points[:, ~outer].reshape((-1, 3)), poles],
+    )
+    _, nearest = cKDTree(centers).query(points[:, outer].reshape((-1, 3)))
+    points[:, outer] = centers[nearest].reshape((lall, -1, 3))
+    # region (ri, rj) = (0, 0) of every diamond has a pentagon at gmin
+    pentagon = slice(None, None, rall * rall)
+    x[pentagon, :, 0, 0] = x[pentagon, :, 0, 1]
+
+    ij = x[:, :, :-1, :-1]
+    ti = ij + x[:, :, :-1, 1:] + x[:, :, 1:, 1:]
+    tj = ij + x[:, :, 1:, 1:] + x[:, :, 1:, :-1]
+    xt = np.stack([ti, tj], axis=2)
+    xt[:, :, 0, 0, -1] = xt[:, :, 1, 0, -1]
+    xt[:, :, 1, -1, 0] = xt[:, :, 0, -1, 0]
+    xt[pentagon, :, 0, 0, 0] = xt[pentagon, :, 1, 0, 1]
+    xt /= np.linalg.norm(xt, axis=1, keepdims=True)
+    return ij.reshape((lall, 3, gall)), xt.reshape((lall, 3, 2, gall))
+
+
+def make_data(grd_x: np.ndarray, step: int, kall: int) -> np.ndarray:
+    """
+    smooth field of one step, the same for every file format
+
+    Args:
+        grd_x: NDArray of shape (..., 3, gall)
+
+    Returns:
+        NDArray of shape (..., kall, gall)
+    """
+    k = np.arange(kall)[:, np.newaxis]
+    x, y, z = grd_x[..., 0:1, :], grd_x[..., 1:2, :], grd_x[..., 2:3, :]
+    return np.cos(step) * x + np.sin(step) * y + (k + 1) * z
+
+
+def write_record(f: typing.BinaryIO, v: np.ndarray):
+    """
+    write a fortran sequential record between 4-byte big-endian markers
+    """
+    marker = np.array([v.nbytes], dtype=">i4").tobytes()
+    f.write(marker)
+    f.write(np.ascontiguousarray(v).tobytes())
+    f.write(marker)
+
+
+def write_grids(output: str, glevel: int, rlevel: int) -> typing.List[str]:
+    """
+    write legacy grid files in the LegacyGrids record layout
+
+    Args:
+        output: format string of the files with the region number as l,
+            e.g. "grid/grid.rgn{l:05d}"
+
+    Returns:
+        paths of the files
+    """
+    gall, _ = calc_gall(glevel, rlevel)
+    grd_x, grd_xt = make_grids(glevel, rlevel)
+    paths = []
+    for rgn in range(calc_lall(rlevel)):
+        path = makedirs(output.format(l=rgn))
+        with open(path, "wb") as f:
+            write_record(f, np.array([gall], dtype=">i4"))
+            for i in range(3):
+                write_record(f, grd_x[rgn, i].astype(">f8"))
+            for i in range(3):
+                write_record(f, grd_xt[rgn, i].ravel().astype(">f8"))
+        paths.append(path)
+    return paths
+
+
+def write_legacy(
+    output: str,
+    glevel: int,
+    rlevel: int,
+    kall: int,
+    nstep: int,
+    precision: int = 4,
+    access: str = "direct",
+) -> typing.List[str]:
+    """
+    write legacy region files of one variable read by LegacyReader
+
+    Args:
+        output: format string of the files with the region number as l,
+            e.g. "data/ms_tem.rgn{l:05d}"
+        kall: number of layers
+        nstep: number of steps, the fields of PE steps 1 to nstep
+        precision: bytes per value
+        access: record layout ("direct" or "sequential")
+
+    Returns:
+        paths of the files
+    """
+    if access not in ["direct", "sequential"]:
+        raise ValueError("'access' must be 'direct' or 'sequential'")
+    grd_x, _ = make_grids(glevel, rlevel)
+    paths = []
+    for rgn in range(calc_lall(rlevel)):
+        path = makedirs(output.format(l=rgn))
+        with open(path, "wb") as f:
+            # step index i holds step i + 1 of the PE files
+            for step in range(1, nstep + 1):
+                v = make_data(grd_x[rgn], step, kall).astype(f">f{precision}")
+                if access == "sequential":
+                    write_record(f, v)
+                else:
+                    f.write(v.tobytes())
+        paths.append(path)
+    return paths
+
+
+def write_panda(
+    output: str,
+    glevel: int,
+    rlevel: int,
+    kall: int,
+    nstep: int,
+    num_of_pe: int = 1,
+    varnames: typing.Sequence[str] = ("ms_tem",),
+    dtype: str = ">f4",
+) -> typing.List[str]:
+    """
+    write FIO PE files holding contiguous blocks of regions
+
+    Args:
+        output: format string of the files with the file number as pe,
+            e.g. "data/history.pe{pe:06d}"
+        kall: number of layers
+        nstep: number of steps, stored as steps 1 to nstep
+        num_of_pe: number of files
+        varnames: variables written at every step
+        dtype: dtype of the records, whose byte order is the file endian
+
+    Returns:
+        paths of the files
+    """
+    dtype = np.dtype(dtype)
+    endian = "<" if dtype.str[0] == "<" else ">"
+    lall = calc_lall(rlevel)
+    grd_x, _ = make_grids(glevel, rlevel)
+    paths = []
+    for pe, rgnid in enumerate(np.array_split(np.arange(lall), num_of_pe)):
+        path = makedirs(output.format(pe=pe))
+        with PandaWriter(path, glevel, rlevel, rgnid, endian=endian) as writer:
+            for step in range(1, nstep + 1):
+                v = make_data(grd_x[rgnid], step, kall).astype(dtype)
+                for varname in varnames:
+                    writer.write_pe(
+                        varname, step, v, time_start=step, time_end=step + 1
+                    )
+        paths.append(path)
+    return paths
+
+
+def makedirs(path: str) -> str:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="write synthetic grid, legacy and PE files"
+    )
+    parser.add_argument("output", help="output directory")
+    parser.add_argument("--glevel", type=int, default=5)
+    parser.add_argument("--rlevel", type=int, default=1)
+    parser.add_argument("--kall", type=int, default=1)
+    parser.add_argument("--steps", type=int, default=1, help="number of steps")
+    parser.add_argument("--pe", type=int, default=4, help="number of PE files")
+    parser.add_argument("--precision", type=int, default=4)
+    parser.add_argument("--access", default="direct", help="direct | sequential")
+    args = parser.parse_args()
+
+    output = args.output
+    write_grids(f"{output}/grid/grid.rgn{{l:05d}}", args.glevel, args.rlevel)
+    write_legacy(
+        f"{output}/legacy/data.rgn{{l:05d}}",
+        args.glevel,
+        args.rlevel,
+        args.kall,
+        args.steps,
+        args.precision,
+        args.access,
+    )
+    write_panda(
+        f"{output}/panda/history.pe{{pe:06d}}",
+        args.glevel,
+        args.rlevel,
+        args.kall,
+        args.steps,
+        args.pe,
+        dtype=f">f{args.precision}",
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -2,5 +2,6 @@
 
 from . import grids
 from . import reader
+from .dataset import open_dataset
 
-__all__ = ["grids", "reader"]  # , "util"]
+__all__ = ["grids", "reader", "open_dataset"]  # , "util"]
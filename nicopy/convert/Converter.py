@@ -0,0 +1,337 @@
+import typing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from logging import getLogger
+import netCDF4
+import numpy as np
+from numpy.typing import DTypeLike
+from ..reader.LegacyReader import LegacyReader
+from ..reader.PandaReader import PandaReader
+
+logger = getLogger(__name__)
+
+
+class Converter:
+    """
+    Streaming conversion of PE files or legacy region files to NetCDF
+
+    Every region goes to its own file of (time, k, cell) variables with
+    cell = gall, the layout read by NetcdfReader. Variables are chunked as
+    (ct, 1, gall) with ct steps per chunk of about chunk_bytes, so the time
+    series of a layer is read from few chunks. A region is written variable
+    by variable in slabs of ct steps, each assembled step by step from the
+    contiguous (kall, gall) block of the region in the input record, so
+    about one slab is in memory per worker. Input files are converted in
+    parallel by a process pool.
+
+    Conversion is resumable: every variable records the number of steps
+    written in its attribute converted_steps after each slab, and an
+    interrupted run continues from there when started again.
+    """
+
+    def __init__(
+        self,
+        output: str,
+        chunk_bytes: int = 1024**2,
+        complevel: int = 4,
+        dtype: DTypeLike = None,
+        max_workers: typing.Optional[int] = None,
+        overwrite: bool = False,
+    ):
+        """
+        Args:
+            output: format string of the output files with the region
+                number as l, e.g. "nc/history.rgn{l:05d}.nc"
+            chunk_bytes: approximate size of a storage chunk
+            complevel: zlib compression level, 0 for no compression
+            dtype: dtype of the output variables, input dtype if None
+            max_workers: number of worker processes (ProcessPoolExecutor
+                default if None); 1 converts in this process
+            overwrite: start over instead of resuming existing files
+        """
+        self.output = output
+        self.chunk_bytes = chunk_bytes
+        self.complevel = complevel
+        self.dtype = None if dtype is None else np.dtype(dtype)
+        self.max_workers = max_workers
+        self.overwrite = overwrite
+
+    def convert(
+        self,
+        filenames: typing.Sequence[str],
+        variables: typing.Optional[typing.Sequence[str]] = None,
+        steps: typing.Optional[typing.Sequence[int]] = None,
+    ) -> typing.List[str]:
+        """
+        convert PE files
+
+        Args:
+            filenames: PE files
+            variables: variables to convert, all variables if None
+            steps: steps to convert, all steps of the variables if None
+
+        Returns:
+            paths of the output files
+        """
+        return self.map(
+            self.convert_pe, [(filename, variables, steps) for filename in filenames]
+        )
+
+    def convert_legacy(
+        self,
+        glevel: int,
+        rlevel: int,
+        kall: int,
+        filenames: typing.Sequence[str],
+        varname: str,
+        steps: typing.Optional[typing.Sequence[int]] = None,
+        precision: int = 4,
+        access: str = "direct",
+    ) -> typing.List[str]:
+        """
+        convert legacy region files (*.rgnNNNNN) of one variable
+
+        Args:
+            glevel: nicam glevel
+            rlevel: nicam rlevel
+            kall: number of layers
+            filenames: region files
+            varname: name of the output variable
+            steps: steps (indices) to convert, all steps if None
+            precision: bytes per value
+            access: record layout
+
+        Returns:
+            paths of the output files
+        """
+        return self.map(
+            self.convert_rgn,
+            [
+                (glevel, rlevel, kall, filename, varname, steps, precision, access)
+                for filename in filenames
+            ],
+        )
+
+    def map(
+        self, func: typing.Callable[..., typing.List[str]], calls: typing.List[tuple]
+    ) -> typing.List[str]:
+        """
+        call func(*call) for every call, in worker processes unless
+        max_workers is 1
+        """
+        if self.max_workers == 1:
+            results = [func(*call) for call in calls]
+        else:
+            with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = [executor.submit(func, *call) for call in calls]
+                results = [future.result() for future in futures]
+        return [path for paths in results for path in paths]
+
+    def convert_pe(
+        self,
+        filename: str,
+        variables: typing.Optional[typing.Sequence[str]] = None,
+        steps: typing.Optional[typing.Sequence[int]] = None,
+    ) -> typing.List[str]:
+        """
+        convert the regions of one PE file
+
+        Returns:
+            paths of the output files
+        """
+        reader = PandaReader(filename)
+        try:
+            header = reader.finfo["header"]
+            varnames = reader.variables() if variables is None else list(variables)
+            selected = None if steps is None else set(steps)
+            var_steps = {}
+            for varname in varnames:
+                available = reader.steps(varname)
+                if selected is not None:
+                    available = [s for s in available if s in selected]
+                var_steps[varname] = available
+            all_steps = sorted(set().union(*var_steps.values()))
+            times = {}
+            for varname in varnames:
+                for step in var_steps[varname]:
+                    if step not in times:
+                        record = reader.find_record(varname, step)
+                        times[step] = reader.finfo["dinfo"][record["did"]]
+            paths = []
+            for r, l in enumerate(header["rgnid"]):
+                path = self.output.format(l=int(l))
+                with self.open(path, all_steps, times) as nc:
+                    for varname in varnames:
+                        if len(var_steps[varname]) == 0:
+                            continue
+                        record = reader.find_record(varname, var_steps[varname][0])
+                        dinfo = reader.finfo["dinfo"][record["did"]]
+
+                        def read(step: int, varname=varname) -> np.ndarray:
+                            record = reader.find_record(varname, step)
+                            return np.ndarray(
+                                record["shape"],
+                                dtype=record["dtype"],
+                                buffer=reader.mmap(),
+                                offset=record["offset"],
+                            )[r]
+
+                        self.write_variable(
+                            nc,
+                            varname,
+                            all_steps,
+                            set(var_steps[varname]),
+                            read,
+                            record["shape"][1:],
+                            np.dtype(record["dtype"]),
+                            dinfo["layername"],
+                            {
+                                "long_name": dinfo["description"],
+                                "units": dinfo["unit"],
+                                "note": dinfo["note"],
+                            },
+                        )
+                paths.append(path)
+                logger.info(f"{filename}: region {l} written to {path}")
+        finally:
+            reader.fclose()
+        return paths
+
+    def convert_rgn(
+        self,
+        glevel: int,
+        rlevel: int,
+        kall: int,
+        filename: str,
+        varname: str,
+        steps: typing.Optional[typing.Sequence[int]] = None,
+        precision: int = 4,
+        access: str = "direct",
+    ) -> typing.List[str]:
+        """
+        convert one legacy region file
+
+        Returns:
+            path of the output file
+        """
+        match = re.search(r"\.rgn(\d+)$", filename)
+        if match is None:
+            raise ValueError(f"{filename} has no region number (*.rgnNNNNN)")
+        reader = LegacyReader(glevel, rlevel, kall, filename, precision, access)
+        with reader:
+            v_all = reader.map()
+            all_steps = list(range(len(v_all)) if steps is None else steps)
+            path = self.output.format(l=int(match.group(1)))
+            with self.open(path, all_steps, {}) as nc:
+                self.write_variable(
+                    nc,
+                    varname,
+                    all_steps,
+                    set(all_steps),
+                    lambda step: v_all[step],
+                    v_all.shape[1:],
+                    v_all.dtype,
+                    f"k{kall}",
+                    {},
+                )
+        logger.info(f"{filename} written to {path}")
+        return [path]
+
+    def open(
+        self, path: str, steps: typing.Sequence[int], times: typing.Dict[int, dict]
+    ) -> netCDF4.Dataset:
+        """
+        create an output file with its time axis, or open it to resume
+
+        Args:
+            steps: steps along the time axis
+            times: dinfo of a record of every step holding time_start and
+                time_end (steps without one get 0)
+        """
+        if os.path.exists(path) and not self.overwrite:
+            nc = netCDF4.Dataset(path, "a")
+            written = np.asarray(nc.variables["step"][:])
+            if not np.array_equal(written, steps):
+                nc.close()
+                raise ValueError(
+                    f"{path} holds other steps; convert with overwrite to replace it"
+                )
+            return nc
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        nc = netCDF4.Dataset(path, "w")
+        nc.createDimension("time", len(steps))
+        step = nc.createVariable("step", "i4", ("time",))
+        step.long_name = "model step"
+        step[:] = np.asarray(steps, dtype=np.int32)
+        for name in ["time_start", "time_end"]:
+            var = nc.createVariable(name, "i8", ("time",))
+            var[:] = np.array([times[s][name] if s in times else 0 for s in steps])
+        return nc
+
+    def write_variable(
+        self,
+        nc: netCDF4.Dataset,
+        varname: str,
+        steps: typing.Sequence[int],
+        available: typing.Set[int],
+        read: typing.Callable[[int], np.ndarray],
+        shape: typing.Tuple[int, int],
+        dtype: np.dtype,
+        layername: str,
+        attrs: typing.Dict[str, str],
+    ):
+        """
+        write a variable slab by slab, resuming after its converted_steps
+
+        Args:
+            steps: steps along the time axis
+            available: steps held by the input; others get the fill value
+            read: read(step) returns the (kall, gall) block of a step
+            shape: (kall, gall)
+            dtype: dtype of the input
+        """
+        kall, gall = shape
+        dtype = (self.dtype or dtype).newbyteorder("=")
+        ntime = len(steps)
+        ct = int(np.clip(self.chunk_bytes // (gall * dtype.itemsize), 1, ntime))
+        if varname in nc.variables:
+            var = nc.variables[varname]
+            ct = var.chunking()[0]
+            done = int(var.getncattr("converted_steps"))
+        else:
+            dim = layername or f"k{kall}"
+            if dim in nc.dimensions and len(nc.dimensions[dim]) != kall:
+                dim = f"{dim}_{kall}"
+            if dim not in nc.dimensions:
+                nc.createDimension(dim, kall)
+            if "cell" not in nc.dimensions:
+                nc.createDimension("cell", gall)
+            var = nc.createVariable(
+                varname,
+                dtype,
+                ("time", dim, "cell"),
+                zlib=self.complevel > 0,
+                complevel=max(self.complevel, 1),
+                shuffle=True,
+                chunksizes=(ct, 1, gall),
+                fill_value=np.nan if dtype.kind == "f" else None,
+            )
+            var.setncatts({k: v for k, v in attrs.items() if v})
+            var.converted_steps = 0
+            done = 0
+
+        fill = var.get_fill_value()
+        buffer = np.empty((ct, kall, gall), dtype=var.dtype)
+        for t0 in range(done, ntime, ct):
+            n = min(ct, ntime - t0)
+            for i, step in enumerate(steps[t0 : t0 + n]):
+                if step in available:
+                    buffer[i] = read(step)
+                else:
+                    buffer[i] = fill
+            var[t0 : t0 + n] = buffer[:n]
+            var.converted_steps = t0 + n
+            nc.sync()
@@ -0,0 +1,3 @@
+from .Converter import Converter
+
+__all__ = ["Converter"]
@@ -0,0 +1,78 @@
+import argparse
+import logging
+import re
+import typing
+from .Converter import Converter
+
+
+def parse_steps(text: str) -> typing.List[int]:
+    """
+    "1,5,9" or "start:stop[:step]" as range(start, stop, step)
+    """
+    if ":" in text:
+        return list(range(*[int(v) for v in text.split(":")]))
+    return [int(v) for v in text.split(",")]
+
+
+def main(argv: typing.Optional[typing.Sequence[str]] = None):
+    parser = argparse.ArgumentParser(
+        prog="python -m nicopy.convert",
+        description="convert PE files or legacy region files to NetCDF files "
+        "of (time, k, cell) variables, one per region; an interrupted "
+        "conversion continues when run again",
+    )
+    parser.add_argument(
+        "output", help='output files with the region number as l, e.g. "rgn{l:05d}.nc"'
+    )
+    parser.add_argument(
+        "inputs", nargs="+", help="PE files, or legacy region files (*.rgnNNNNN)"
+    )
+    parser.add_argument("--variables", nargs="+", help="variables of PE files")
+    parser.add_argument("--steps", type=parse_steps, help='"1,5,9" or "1:25"')
+    parser.add_argument("--workers", type=int, help="number of worker processes")
+    parser.add_argument("--chunk-bytes", type=int, default=1024**2)
+    parser.add_argument("--complevel", type=int, default=4)
+    parser.add_argument("--dtype", help="output dtype, e.g. f4")
+    parser.add_argument("--overwrite", action="store_true", help="do not resume")
+    legacy = parser.add_argument_group("legacy region files")
+    legacy.add_argument("--varname", help="name of the output variable")
+    legacy.add_argument("--glevel", type=int)
+    legacy.add_argument("--rlevel", type=int)
+    legacy.add_argument("--kall", type=int)
+    legacy.add_argument("--precision", type=int, default=4)
+    legacy.add_argument("--access", default="direct")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    converter = Converter(
+        args.output,
+        chunk_bytes=args.chunk_bytes,
+        complevel=args.complevel,
+        dtype=args.dtype,
+        max_workers=args.workers,
+        overwrite=args.overwrite,
+    )
+    legacy_files = [re.search(r"\.rgn(\d+)$", f) for f in args.inputs]
+    if all(legacy_files):
+        required = ["varname", "glevel", "rlevel", "kall"]
+        missing = [f"--{a}" for a in required if getattr(args, a) is None]
+        if missing:
+            parser.error(f"legacy region files require {', '.join(missing)}")
+        converter.convert_legacy(
+            args.glevel,
+            args.rlevel,
+            args.kall,
+            args.inputs,
+            args.varname,
+            args.steps,
+            args.precision,
+            args.access,
+        )
+    elif not any(legacy_files):
+        converter.convert(args.inputs, args.variables, args.steps)
+    else:
+        parser.error("cannot mix legacy region files and PE files")
+
+
+if __name__ == "__main__":
+    main()
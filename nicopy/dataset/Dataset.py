@@ -0,0 +1,393 @@
+import typing
+import glob
+import os
+import re
+import numpy as np
+from ..reader.PandaReader import PandaReader
+from ..util import as_slice, calc_gall, calc_gall_in, calc_lall
+
+dims = ("step", "k", "region", "cell")
+
+Index = typing.Union[int, slice, typing.Sequence[int], np.ndarray]
+
+
+class Variable:
+    """
+    Lazy (step, k, region, cell) array of one variable over all PE files
+
+    Nothing is read until the array is indexed. Indexing resolves the
+    requested steps and regions to the records and files holding them and
+    gathers only the requested layers and inner cells from a memory map of
+    every record, so only the pages of those values are read. Regions
+    without a file, and steps missing in a file, hold nan (or 0).
+
+    Positional indexing with integers, slices and integer sequences per
+    dimension works like numpy with one index array per dimension
+    (orthogonal indexing, as in NetCDF); sel() takes step numbers and
+    region ids instead.
+
+    steps: NDArray of shape (nstep), step numbers along the step dimension
+    time_start, time_end: NDArray of shape (nstep)
+    """
+
+    def __init__(
+        self,
+        varname: str,
+        readers: typing.Sequence[PandaReader],
+        rgnids: typing.Sequence[np.ndarray],
+        lall: int,
+    ):
+        """
+        Args:
+            varname: variable name
+            readers: readers of all files holding the variable
+            rgnids: regions of every file
+            lall: number of regions
+        """
+        self.varname = varname
+        self.readers = list(readers)
+        self.rgnids = list(rgnids)
+        self.lall = lall
+        header = readers[0].finfo["header"]
+        self.gall, self.gall_1d = calc_gall(header["glevel"], header["rlevel"])
+        self.gall_in = calc_gall_in(header["glevel"], header["rlevel"])
+
+        steps: typing.Dict[int, typing.Tuple[int, int]] = {}
+        for reader in self.readers:
+            for step in reader.steps(varname):
+                if step not in steps:
+                    record = reader.find_record(varname, step)
+                    dinfo = reader.finfo["dinfo"][record["did"]]
+                    steps[step] = (dinfo["time_start"], dinfo["time_end"])
+        self.steps = np.array(sorted(steps), dtype=int)
+        self.time_start = np.array([steps[s][0] for s in self.steps])
+        self.time_end = np.array([steps[s][1] for s in self.steps])
+        record = self.readers[0].find_record(varname, int(self.steps[0]))
+        dinfo = self.readers[0].finfo["dinfo"][record["did"]]
+        self.attrs = {
+            "description": dinfo["description"],
+            "unit": dinfo["unit"],
+            "layername": dinfo["layername"],
+            "note": dinfo["note"],
+        }
+        self.kall = record["shape"][1]
+        self.dtype = np.dtype(record["dtype"]).newbyteorder("=")
+        self.shape = (len(self.steps), self.kall, lall, self.gall_in)
+        self.ndim = len(self.shape)
+        self.dims = dims
+
+        # file and position within the file of every region
+        self.file = np.full(lall, -1)
+        self.position = np.full(lall, -1)
+        for i, rgnid in enumerate(self.rgnids):
+            self.file[rgnid] = i
+            self.position[rgnid] = np.arange(len(rgnid))
+        j, i = np.meshgrid(
+            np.arange(1, self.gall_1d - 1),
+            np.arange(1, self.gall_1d - 1),
+            indexing="ij",
+        )
+        self.inner = (j * self.gall_1d + i).ravel()
+
+    def __repr__(self) -> str:
+        shape = ", ".join(f"{d}: {n}" for d, n in zip(self.dims, self.shape))
+        return f"<nicopy.Variable {self.varname} ({shape}) {self.dtype}>"
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def __array__(self, dtype=None, copy=None):
+        v = self[...]
+        return v if dtype is None else v.astype(dtype)
+
+    def __getitem__(self, key) -> np.ndarray:
+        index, drop = expand_key(key, self.shape)
+        return self.read(*index)[tuple(0 if d else slice(None) for d in drop)]
+
+    def sel(
+        self,
+        step: typing.Union[int, typing.Sequence[int], None] = None,
+        k: typing.Optional[Index] = None,
+        region: typing.Union[int, typing.Sequence[int], None] = None,
+        cell: typing.Optional[Index] = None,
+    ) -> np.ndarray:
+        """
+        Args:
+            step: step number(s), all steps if None
+            k: layer(s), all layers if None
+            region: region id(s), all regions if None
+            cell: inner cell(s) ij, all cells if None
+
+        Returns:
+            NDArray of shape (nstep, nk, nregion, ncell) with the dimensions
+            of scalar arguments dropped
+        """
+        key: typing.List[typing.Any] = [slice(None)] * 4
+        if step is not None:
+            position = np.searchsorted(self.steps, step)
+            position = np.minimum(position, len(self.steps) - 1)
+            if not np.all(self.steps[position] == step):
+                raise KeyError(f"{self.varname} has no step {step}")
+            key[0] = position if np.ndim(step) else int(position)
+        for axis, value in [(1, k), (2, region), (3, cell)]:
+            if value is not None:
+                key[axis] = value
+        return self[tuple(key)]
+
+    def read(self, steps: Index, ks: Index, regions: Index, cells: Index) -> np.ndarray:
+        """
+        Args:
+            steps, ks, regions, cells: slices or index arrays of the four
+                dimensions
+
+        Returns:
+            NDArray of shape (nstep, nk, nregion, ncell)
+        """
+        step_index = np.arange(self.shape[0])[steps]
+        regions = np.arange(self.lall)[regions]
+        out_shape = (
+            len(step_index),
+            len(np.arange(self.kall)[ks]),
+            len(regions),
+            len(np.arange(self.gall_in)[cells]),
+        )
+        out = np.empty(out_shape, dtype=self.dtype)
+        if out.size == 0:
+            return out
+        file = self.file[regions]
+        if (file < 0).any() or not self.complete(step_index, np.unique(file)):
+            out[...] = np.nan if self.dtype.kind in "fc" else 0
+        k_index = np.arange(self.kall)[ks]
+        cell_index = self.inner[cells]
+        for i in np.unique(file[file >= 0]):
+            reader = self.readers[i]
+            members = np.flatnonzero(file == i)
+            index = [self.position[regions[members]], k_index, cell_index]
+            sliced = [as_slice(x) for x in index]
+            if all(isinstance(x, slice) for x in sliced):
+                # a strided view of the record
+                key = tuple(sliced)
+            else:
+                # one gather touching only the requested values
+                key = np.ix_(*index)
+            target = as_slice(members)
+            for n, s in enumerate(step_index):
+                record = reader.finfo["index"].get((self.varname, int(self.steps[s])))
+                if record is None:
+                    continue
+                v = np.ndarray(
+                    record["shape"],
+                    dtype=record["dtype"],
+                    buffer=reader.mmap(),
+                    offset=record["offset"],
+                )
+                # (nregion, nk, ncell) -> (nk, nregion, ncell)
+                out[n][:, target] = v[key].transpose(1, 0, 2)
+        return out
+
+    def complete(self, step_index: np.ndarray, files: np.ndarray) -> bool:
+        """
+        Returns:
+            True if all files hold all steps
+        """
+        for i in files:
+            index = self.readers[i].finfo["index"]
+            for s in step_index:
+                if (self.varname, int(self.steps[s])) not in index:
+                    return False
+        return True
+
+    def chunks(self) -> typing.Tuple[int, ...]:
+        """
+        Returns:
+            chunk shape of one step of all layers and the regions of one file
+            if all files hold equally many contiguous regions
+        """
+        sizes = set(len(rgnid) for rgnid in self.rgnids)
+        contiguous = all(
+            isinstance(as_slice(np.sort(rgnid)), slice) for rgnid in self.rgnids
+        )
+        rgn = sizes.pop() if len(sizes) == 1 and contiguous else self.lall
+        return (1, self.kall, rgn, self.gall_in)
+
+    def to_dask(self, chunks: typing.Optional[typing.Tuple[int, ...]] = None):
+        """
+        Args:
+            chunks: chunk shape, one record of one file (chunks()) if None
+
+        Returns:
+            dask.array.Array reading chunk by chunk through this variable
+        """
+        import dask.array
+
+        return dask.array.from_array(
+            self,
+            chunks=self.chunks() if chunks is None else chunks,
+            name=f"nicopy-{self.varname}-{id(self)}",
+            asarray=False,
+            fancy=False,
+        )
+
+
+class Dataset:
+    """
+    All variables of a run in PE files, indexed by variable name
+
+    Every variable is a lazy Variable with dimensions (step, k, region,
+    cell); together they add the variable dimension. Headers and record
+    indices are read on open, data only when a variable is indexed.
+    """
+
+    def __init__(self, filenames: typing.Sequence[str]):
+        """
+        Args:
+            filenames: PE files of a run
+        """
+        if len(filenames) == 0:
+            raise ValueError("no input files")
+        self.filenames = list(filenames)
+        self.readers = [PandaReader(filename) for filename in self.filenames]
+        header = self.readers[0].finfo["header"]
+        self.glevel = header["glevel"]
+        self.rlevel = header["rlevel"]
+        self.lall = calc_lall(self.rlevel)
+        for reader in self.readers:
+            h = reader.finfo["header"]
+            if h["glevel"] != self.glevel or h["rlevel"] != self.rlevel:
+                self.close()
+                raise ValueError(f"{h['fname']} has another glevel or rlevel")
+        rgnid = np.concatenate([r.finfo["header"]["rgnid"] for r in self.readers])
+        if len(np.unique(rgnid)) != len(rgnid):
+            self.close()
+            raise ValueError("region ids appear in more than one file")
+
+        self.variables: typing.Dict[str, Variable] = {}
+        varnames = dict.fromkeys(v for r in self.readers for v in r.variables())
+        for varname in varnames:
+            holding = [r for r in self.readers if len(r.steps(varname)) > 0]
+            self.variables[varname] = Variable(
+                varname,
+                holding,
+                [r.finfo["header"]["rgnid"] for r in holding],
+                self.lall,
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        for reader in self.readers:
+            if reader.finfo["status"]["opened"]:
+                reader.fclose()
+
+    def __getitem__(self, varname: str) -> Variable:
+        return self.variables[varname]
+
+    def __contains__(self, varname: str) -> bool:
+        return varname in self.variables
+
+    def __iter__(self) -> typing.Iterator[str]:
+        return iter(self.variables)
+
+    def __len__(self) -> int:
+        return len(self.variables)
+
+    def __repr__(self) -> str:
+        lines = [f"<nicopy.Dataset glevel={self.glevel} rlevel={self.rlevel}>"]
+        lines += [f"    {v!r}" for v in self.variables.values()]
+        return "\n".join(lines)
+
+    def to_xarray(self, chunks: typing.Optional[typing.Tuple[int, ...]] = None):
+        """
+        Args:
+            chunks: chunk shape of every variable, see Variable.to_dask
+
+        Returns:
+            xarray.Dataset of dask-backed variables with step, time_start
+            and time_end coordinates per variable (step_<varname> if the
+            steps of variables differ)
+        """
+        import xarray
+
+        data_vars = {}
+        coords = {"region": np.arange(self.lall)}
+        for varname, var in self.variables.items():
+            step_dim = "step"
+            if "step" in coords and not np.array_equal(coords["step"], var.steps):
+                step_dim = f"step_{varname}"
+            if step_dim not in coords:
+                coords[step_dim] = var.steps
+                coords[f"time_start_{varname}"] = (step_dim, var.time_start)
+                coords[f"time_end_{varname}"] = (step_dim, var.time_end)
+            k_dim = var.attrs["layername"] or f"k{var.kall}"
+            data_vars[varname] = xarray.Variable(
+                (step_dim, k_dim, "region", "cell"),
+                var.to_dask(chunks),
+                attrs=var.attrs,
+            )
+        return xarray.Dataset(data_vars, coords=coords)
+
+
+def open_dataset(
+    path: typing.Union[str, typing.Sequence[str]], pattern: str = r"\.pe\d+$"
+) -> Dataset:
+    """
+    open the PE files of a run as one lazy Dataset
+
+    Args:
+        path: directory holding the PE files, glob pattern or list of files
+        pattern: regular expression selecting the files of a directory
+
+    Returns:
+        Dataset
+    """
+    if not isinstance(path, str):
+        filenames = list(path)
+    elif os.path.isdir(path):
+        filenames = sorted(
+            os.path.join(path, f) for f in os.listdir(path) if re.search(pattern, f)
+        )
+    else:
+        filenames = sorted(glob.glob(path))
+    return Dataset(filenames)
+
+
+def expand_key(
+    key, shape: typing.Tuple[int, ...]
+) -> typing.Tuple[typing.List[Index], typing.List[bool]]:
+    """
+    Returns:
+        an index (slice or integer array) for every dimension and whether the
+        dimension is dropped (integer index)
+    """
+    if not isinstance(key, tuple):
+        key = (key,)
+    ellipsis = [n for n, k in enumerate(key) if k is Ellipsis]
+    if ellipsis:
+        n = ellipsis[0]
+        key = key[:n] + (slice(None),) * (len(shape) - len(key) + 1) + key[n + 1 :]
+    if len(key) > len(shape):
+        raise IndexError(f"too many indices for {len(shape)} dimensions")
+    key = key + (slice(None),) * (len(shape) - len(key))
+    index: typing.List[Index] = []
+    drop: typing.List[bool] = []
+    for k, n in zip(key, shape):
+        if isinstance(k, slice):
+            index.append(k)
+            drop.append(False)
+        elif np.ndim(k) == 0:
+            k = int(k)
+            if not -n <= k < n:
+                raise IndexError(f"index {k} is out of bounds for size {n}")
+            index.append(np.array([k % n]))
+            drop.append(True)
+        else:
+            k = np.asarray(k)
+            if k.dtype == bool:
+                k = np.flatnonzero(k)
+            index.append(np.arange(n)[k])
+            drop.append(False)
+    return index, drop
@@ -0,0 +1,3 @@
+from .Dataset import Dataset, Variable, open_dataset
+
+__all__ = ["Dataset", "Variable", "open_dataset"]
@@ -1,17 +1,41 @@
+import typing
 import numpy as np
 from ..util import calc_gall, calc_gall_in, calc_lall
-from .mod_grid import xyz2latlon
+from .GridCache import GridCache
+from .mod_grid import cell_area, hexagon_vertex_index, radius, xyz2latlon
+from .Polygons import Polygons
 
 
 class AbstractGrids:
-    def __init__(self, glevel: int, rlevel: int, filename: str):
+    def __init__(
+        self,
+        glevel: int,
+        rlevel: int,
+        filename: str,
+        cache: typing.Union[GridCache, str, None] = None,
+    ):
+        """
+        Args:
+            glevel: nicam glevel
+            rlevel: nicam rlevel
+            filename: path to the grid file
+            cache: GridCache or cache directory to load the derived geometry
+                from (and store it to on a miss)
+        """
         self.glevel = glevel
         self.rlevel = rlevel
         self.filename = filename
         self.gall, self.gall_1d = calc_gall(glevel, rlevel)
         self.gall_in = calc_gall_in(glevel, rlevel)
         self.lall = calc_lall(rlevel)
-        self.load()
+        self.lonlat_c: typing.Optional[typing.Tuple[np.ndarray, np.ndarray]] = None
+        self.lonlat_v: typing.Optional[typing.Tuple[np.ndarray, np.ndarray]] = None
+        if isinstance(cache, str):
+            cache = GridCache(cache)
+        if cache is None or not cache.load(self):
+            self.load()
+            if cache is not None:
+                cache.store(self)
 
     def load(self):
         pass
@@ -22,15 +46,8 @@ class AbstractGrids:
             lon_c: NDArray of shape (gall_1d, gall_1d)
             lat_c: NDArray of shape (gall_1d, gall_1d)
         """
-        gall = self.gall
         gall_1d = self.gall_1d
-        grd_x = self.grd_x
-
-        lon_c = np.empty([gall])
-        lat_c = np.empty([gall])
-
-        for ij in range(gall):
-            lat_c[ij], lon_c[ij] = xyz2latlon(grd_x[:, ij])
+        lat_c, lon_c = xyz2latlon(self.grd_x)
 
         lon_c = lon_c.reshape([gall_1d, gall_1d]) * 180.0 / np.pi
         lat_c = lat_c.reshape([gall_1d, gall_1d]) * 180.0 / np.pi
@@ -43,16 +60,8 @@ class AbstractGrids:
             lon_e: NDArray of shape (2, gall_1d, gall_1d)
             lat_e: NDArray of shape (2, gall_1d, gall_1d)
         """
-        gall = self.gall
         gall_1d = self.gall_1d
-        grd_xt = self.grd_xt
-
-        lon_e = np.empty([2, gall])
-        lat_e = np.empty([2, gall])
-
-        for ij in range(gall):
-            lat_e[0, ij], lon_e[0, ij] = xyz2latlon(grd_xt[:, 0, ij])
-            lat_e[1, ij], lon_e[1, ij] = xyz2latlon(grd_xt[:, 1, ij])
+        lat_e, lon_e = xyz2latlon(self.grd_xt)
 
         lon_e = lon_e.reshape([2, gall_1d, gall_1d]) * 180.0 / np.pi
         lat_e = lat_e.reshape([2, gall_1d, gall_1d]) * 180.0 / np.pi
@@ -65,6 +74,10 @@ class AbstractGrids:
             lon_c: NDArray of shape (gall_in)
             lat_c: NDArray of shape (gall_in)
         """
+        if self.lonlat_c is not None:
+            # copies, so callers may modify them in place (e.g. rearrange_lon)
+            lon_c, lat_c = self.lonlat_c
+            return lon_c.copy(), lat_c.copy()
         gall_1d = self.gall_1d
         lon_c, lat_c = self.get_lonlat_c_2d()
         lon_cin = lon_c[1 : gall_1d - 1, 1 : gall_1d - 1].ravel()
@@ -77,35 +90,32 @@ class AbstractGrids:
             lon_v: NDArray of shape (gall_in, 6)
             lat_v: NDArray of shape (gall_in, 6)
         """
+        if self.lonlat_v is not None:
+            # copies, so callers may modify them in place (e.g. rearrange_lon)
+            lon_v, lat_v = self.lonlat_v
+            return lon_v.copy(), lat_v.copy()
         lon_t, lat_t = self.get_lonlat_e_2d()
-        gall_1d = self.gall_1d
-        utx = np.empty([self.gall, 6], np.float32)
-        uty = np.empty([self.gall, 6], np.float32)
-        cell_info = np.empty([self.gall], np.int32)
-        #
-        for j in range(1, self.gall_1d - 1):
-            for i in range(1, self.gall_1d - 1):
-                ij = self.gall_1d * j + i
-                utx[ij, 0] = lon_t[1, j - 1, i - 1]
-                utx[ij, 1] = lon_t[0, j - 1, i - 1]
-                utx[ij, 2] = lon_t[1, j - 1, i]
-                utx[ij, 3] = lon_t[0, j, i]
-                utx[ij, 4] = lon_t[1, j, i]
-                utx[ij, 5] = lon_t[0, j, i - 1]
-                #
-                uty[ij, 0] = lat_t[1, j - 1, i - 1]
-                uty[ij, 1] = lat_t[0, j - 1, i - 1]
-                uty[ij, 2] = lat_t[1, j - 1, i]
-                uty[ij, 3] = lat_t[0, j, i]
-                uty[ij, 4] = lat_t[1, j, i]
-                uty[ij, 5] = lat_t[0, j, i - 1]
-                cell_info[ij] = 6
-        utx_out = utx.reshape([gall_1d, gall_1d, 6])[
-            1 : gall_1d - 1, 1 : gall_1d - 1, :
-        ]
-        uty_out = uty.reshape([gall_1d, gall_1d, 6])[
-            1 : gall_1d - 1, 1 : gall_1d - 1, :
-        ]
-        lon_v = utx_out.reshape(self.gall_in, 6)
-        lat_v = uty_out.reshape(self.gall_in, 6)
+        index = hexagon_vertex_index(self.gall_1d)
+        lon_v = lon_t.reshape(-1)[index].astype(np.float32)
+        lat_v = lat_t.reshape(-1)[index].astype(np.float32)
         return lon_v, lat_v
+
+    def get_polygons(self, dateline: str = "split", closed: bool = False):
+        """
+        outlines of all cells as one ragged array, see Polygons.from_lonlat
+
+        Returns:
+            Polygons whose cell is ij
+        """
+        lon_v, lat_v = self.get_lonlat_v()
+        return Polygons.from_lonlat(lon_v, lat_v, dateline, closed)
+
+    def get_area(self, radius: float = radius):
+        """
+        Args:
+            radius: radius of the sphere [m]
+
+        Returns:
+            area: NDArray of shape (gall_in) [m^2]
+        """
+        return cell_area(self.grd_x, self.grd_xt) * radius**2
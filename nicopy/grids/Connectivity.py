@@ -0,0 +1,307 @@
+import typing
+import numpy as np
+
+if typing.TYPE_CHECKING:
+    from .GlobalGrids import GlobalGrids
+    from .AbstractGrids import AbstractGrids
+
+# neighbours (dj, di) of a grid point in the icosahedral lattice
+neighbours = np.array([[0, 1], [1, 1], [1, 0], [0, -1], [-1, -1], [-1, 0]])
+
+
+class Connectivity:
+    """
+    Region adjacency and halo exchange derived from shared grid coordinates
+
+    Every halo point of every region is matched with the inner grid point of
+    the region holding the same position. Halo points at a pole, which
+    belongs to no region, get the value at the pole of a quadratic fitted to
+    the cells around it (see pole_stencil); other halo points without a
+    match (the corner beyond a pentagon) are left untouched by fill_halo.
+
+    Edges of a region are its halo rows, in the order j = 0, i = gall_1d - 1,
+    j = gall_1d - 1, i = 0; corners are its halo corners (j, i) = (0, 0),
+    (0, gall_1d - 1), (gall_1d - 1, gall_1d - 1), (gall_1d - 1, 0).
+
+    edge_rgn: NDArray of shape (lall, 4), region across every edge
+    edge_dir: NDArray of shape (lall, 4), edge of edge_rgn facing back
+    edge_reversed: NDArray of shape (lall, 4), True if the halo row runs
+        opposite to the first inner row of edge_rgn along that edge
+    corner_rgn: NDArray of shape (lall, 4), region holding every corner, -1
+        if no region does (poles, corners off the lattice)
+    pentagon: NDArray of shape (lall), True if the inner grid point (1, 1)
+        is a pentagon
+    """
+
+    def __init__(
+        self,
+        lall: int,
+        gall_1d: int,
+        halo: np.ndarray,
+        source: np.ndarray,
+        pole: np.ndarray,
+        pole_source: np.ndarray,
+        pole_weight: typing.Optional[np.ndarray] = None,
+    ):
+        """
+        Args:
+            lall: number of regions
+            gall_1d: number of grid points in one direction (with halo)
+            halo: halo points of shape (n) as flat indices into (lall, gall)
+            source: inner grid points of shape (n) copied into halo
+            pole: halo points at the poles of shape (m)
+            pole_source: inner grid points of shape (m, npole) combined into
+                pole
+            pole_weight: weights of pole_source of shape (m, npole) summing
+                to 1, the mean if None
+        """
+        self.gall_1d = gall_1d
+        self.gall = gall_1d * gall_1d
+        self.halo = halo
+        self.source = source
+        self.pole = pole
+        self.pole_source = pole_source
+        if pole_weight is None:
+            npole = np.shape(pole_source)[-1]
+            pole_weight = np.full(np.shape(pole_source), 1.0 / npole)
+        self.pole_weight = pole_weight
+
+        self.lall = lall
+        gall = self.gall
+        origin = np.full(lall * gall, -1)
+        origin[halo] = source
+        origin = origin.reshape((lall, gall_1d, gall_1d))
+        nmax = gall_1d - 2
+        rows = [
+            origin[:, 0, 1 : nmax + 1],
+            origin[:, 1 : nmax + 1, nmax + 1],
+            origin[:, nmax + 1, 1 : nmax + 1],
+            origin[:, 1 : nmax + 1, 0],
+        ]
+        self.edge_rgn = np.full((lall, 4), -1)
+        self.edge_dir = np.full((lall, 4), -1)
+        self.edge_reversed = np.zeros((lall, 4), dtype=bool)
+        mid = (nmax - 1) // 2
+        for e, row in enumerate(rows):
+            # the middle of the edge tells neighbour and orientation
+            l, j, i = self.unravel(row[:, mid])
+            _, j_next, i_next = self.unravel(row[:, min(mid + 1, nmax - 1)])
+            valid = l >= 0
+            facing = np.select(
+                [j == 1, i == nmax, j == nmax, i == 1], [0, 1, 2, 3], default=-1
+            )
+            along = np.where(facing % 2 == 0, i_next - i, j_next - j)
+            self.edge_rgn[:, e] = np.where(valid, l, -1)
+            self.edge_dir[:, e] = np.where(valid, facing, -1)
+            self.edge_reversed[:, e] = valid & (along < 0)
+
+        corners = origin[:, [0, 0, nmax + 1, nmax + 1], [0, nmax + 1, nmax + 1, 0]]
+        self.corner_rgn = np.where(corners >= 0, corners // gall, -1)
+        # the halo corner (0, 0) of a pentagon has no grid point of its own
+        self.pentagon = (corners[:, 0] < 0) | (corners[:, 0] == origin[:, 0, 1])
+        self.pentagon |= corners[:, 0] == origin[:, 1, 0]
+
+    @classmethod
+    def from_grids(
+        cls,
+        grids: typing.Union["GlobalGrids", typing.Sequence["AbstractGrids"]],
+        tolerance: float = 1e-9,
+    ):
+        """
+        Args:
+            grids: GlobalGrids, or grids of every region in region order
+            tolerance: positions on the unit sphere closer than this are the
+                same grid point
+        """
+        if hasattr(grids, "grd_x"):
+            grd_x = np.asarray(grids.grd_x)  # type: ignore
+        else:
+            grd_x = np.stack([g.grd_x for g in grids])  # type: ignore
+        lall, _, gall = grd_x.shape
+        gall_1d = int(np.sqrt(gall))
+        x = grd_x.transpose(0, 2, 1).reshape((-1, 3))
+        x = x / np.linalg.norm(x, axis=-1, keepdims=True)
+
+        inner = np.zeros((gall_1d, gall_1d), dtype=bool)
+        inner[1 : gall_1d - 1, 1 : gall_1d - 1] = True
+        inner = np.tile(inner.ravel(), lall)
+        inner_index = np.flatnonzero(inner)
+        halo = np.flatnonzero(~inner)
+
+        source = np.full(len(halo), -1)
+        # match on a grid of cell size tolerance, and again on a grid shifted
+        # by half a cell for points that straddle a cell boundary
+        for shift in [0.0, 0.5]:
+            todo = source < 0
+            source[todo] = match(x[inner_index], x[halo[todo]], tolerance, shift)
+
+        # unmatched halo points shared by several regions are poles
+        unmatched = halo[source < 0]
+        key = np.round(x[unmatched] / tolerance).astype(np.int64)
+        _, group, count = np.unique(
+            key, axis=0, return_inverse=True, return_counts=True
+        )
+        group = group.ravel()
+        at_pole = count[group] >= 3
+        pole = unmatched[at_pole]
+        pole_group = group[at_pole]
+        # cells next to the halo points at every pole
+        l, ij = np.divmod(pole, gall)
+        j, i = np.divmod(ij, gall_1d)
+        jn = j[:, np.newaxis] + neighbours[:, 0]
+        in_ = i[:, np.newaxis] + neighbours[:, 1]
+        near = (jn >= 1) & (jn <= gall_1d - 2) & (in_ >= 1) & (in_ <= gall_1d - 2)
+        cells = l[:, np.newaxis] * gall + jn * gall_1d + in_
+        around: typing.Dict[int, np.ndarray] = {}
+        weight: typing.Dict[int, np.ndarray] = {}
+        for g in np.unique(pole_group):
+            ring = np.unique(cells[pole_group == g][near[pole_group == g]])
+            position = x[pole[pole_group == g][0]]
+            around[g], weight[g] = pole_stencil(x, inner_index, position, ring)
+        npole = max([len(c) for c in around.values()], default=5)
+        # pad with weight 0 to the largest stencil
+        pole_source = np.stack(
+            [np.resize(around[g], npole) for g in pole_group]
+        ).reshape((len(pole), npole))
+        pole_weight = np.stack(
+            [np.pad(weight[g], (0, npole - len(weight[g]))) for g in pole_group]
+        ).reshape((len(pole), npole))
+
+        matched = source >= 0
+        return cls(
+            lall,
+            gall_1d,
+            halo[matched],
+            inner_index[source[matched]],
+            pole,
+            pole_source,
+            pole_weight,
+        )
+
+    def unravel(
+        self, index: np.ndarray
+    ) -> typing.Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Returns:
+            (l, j, i) of flat indices into (lall, gall), -1 where index is -1
+        """
+        l, ij = np.divmod(index, self.gall)
+        j, i = np.divmod(ij, self.gall_1d)
+        invalid = index < 0
+        return (
+            np.where(invalid, -1, l),
+            np.where(invalid, -1, j),
+            np.where(invalid, -1, i),
+        )
+
+    def fill_halo(self, field: np.ndarray, region_axis: int = -2) -> np.ndarray:
+        """
+        fill the halo of every region in place
+
+        Args:
+            field: C-contiguous NDArray of shape (..., lall, gall_1d, gall_1d)
+                or (..., lall, gall); with region_axis=0 of shape
+                (lall, ..., gall), the layout of PE records (rgn, kall, gall)
+            region_axis: -2 or 0
+
+        Returns:
+            field
+        """
+        lall, gall = self.lall, self.gall
+        if field.size % (lall * gall) != 0 or not field.flags.c_contiguous:
+            raise ValueError(
+                f"'field' must be a C-contiguous array of {lall} regions of "
+                f"{gall} grid points"
+            )
+        if region_axis == 0:
+            v = field.reshape((lall, -1, gall))
+            halo_l, halo_g = np.divmod(self.halo, gall)
+            source_l, source_g = np.divmod(self.source, gall)
+            v[halo_l, :, halo_g] = v[source_l, :, source_g]
+            if len(self.pole) > 0:
+                pole_l, pole_g = np.divmod(self.pole, gall)
+                around_l, around_g = np.divmod(self.pole_source, gall)
+                v[pole_l, :, pole_g] = np.einsum(
+                    "mnk,mn->mk", v[around_l, :, around_g], self.pole_weight
+                )
+        elif region_axis == -2:
+            flat = field.reshape((-1, lall * gall))
+            flat[:, self.halo] = flat[:, self.source]
+            if len(self.pole) > 0:
+                flat[:, self.pole] = np.einsum(
+                    "bmn,mn->bm", flat[:, self.pole_source], self.pole_weight
+                )
+        else:
+            raise ValueError("'region_axis' must be -2 or 0")
+        return field
+
+    def with_halo(self, field: np.ndarray, region_axis: int = -2) -> np.ndarray:
+        """
+        Args:
+            field: NDArray of shape (..., lall, gall_in), e.g. from a reader,
+                or (lall, ..., gall_in) with region_axis=0
+            region_axis: -2 or 0
+
+        Returns:
+            NDArray of shape field.shape[:-1] + (gall_1d, gall_1d) with filled
+            halo
+        """
+        gall_1d = self.gall_1d
+        out = np.zeros(field.shape[:-1] + (gall_1d, gall_1d), dtype=field.dtype)
+        out[..., 1 : gall_1d - 1, 1 : gall_1d - 1] = field.reshape(
+            field.shape[:-1] + (gall_1d - 2, gall_1d - 2)
+        )
+        return self.fill_halo(out, region_axis)
+
+
+def match(
+    points: np.ndarray, queries: np.ndarray, tolerance: float, shift: float
+) -> np.ndarray:
+    """
+    Returns:
+        index of the point at the position of every query, -1 if none
+    """
+    key_p = np.floor(points / tolerance + shift).astype(np.int64)
+    key_q = np.floor(queries / tolerance + shift).astype(np.int64)
+    keys = np.concatenate([key_p, key_q])
+    _, inverse = np.unique(keys, axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    owner = np.full(inverse.max(initial=-1) + 1, -1)
+    owner[inverse[: len(points)]] = np.arange(len(points))
+    return owner[inverse[len(points) :]]
+
+
+def pole_stencil(
+    x: np.ndarray, inner_index: np.ndarray, pole: np.ndarray, ring: np.ndarray
+) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """
+    cells and weights giving the value at a pole
+
+    The plain mean of the ring of cells around the pole is off by O(h^2),
+    which the Laplacian of the cells next to the pole turns into an O(1)
+    error. Instead the weights fit a quadratic in the plane tangent at the
+    pole to the cells within 2.5 times the radius of the ring, so the pole
+    value is exact for quadratic fields; with too few cells for the fit they
+    fall back to the mean of the ring.
+
+    Args:
+        x: unit vectors of all grid points of shape (lall * gall, 3)
+        inner_index: flat indices of the inner grid points
+        pole: unit vector of the pole of shape (3)
+        ring: flat indices of the cells next to the pole
+
+    Returns:
+        flat indices of the cells and their weights, which sum to 1
+    """
+    radius = np.linalg.norm(x[ring] - pole, axis=-1).max()
+    distance = np.linalg.norm(x[inner_index] - pole, axis=-1)
+    cells = inner_index[distance < 2.5 * radius]
+    e1 = np.cross(pole, np.eye(3)[np.argmin(np.abs(pole))])
+    e1 /= np.linalg.norm(e1)
+    e2 = np.cross(pole, e1)
+    u = (x[cells] - pole) @ e1
+    v = (x[cells] - pole) @ e2
+    design = np.stack([np.ones_like(u), u, v, u * u, u * v, v * v], axis=-1)
+    if np.linalg.matrix_rank(design) < design.shape[-1]:
+        return ring, np.full(len(ring), 1.0 / len(ring))
+    return cells, np.linalg.pinv(design)[0]
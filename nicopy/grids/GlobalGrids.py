@@ -0,0 +1,113 @@
+import typing
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from ..util import calc_gall, calc_gall_in, calc_lall
+from .AbstractGrids import AbstractGrids
+from .GridCache import GridCache
+from .LegacyGrids import LegacyGrids
+from .mod_grid import cell_area, hexagon_vertex_index, radius, xyz2latlon
+from .Polygons import Polygons
+
+
+class GlobalGrids:
+    """
+    Grids of all lall regions in contiguous arrays
+
+    grd_x: NDArray of shape (lall, 3, gall)
+    grd_xt: NDArray of shape (lall, 3, 2, gall)
+    """
+
+    def __init__(
+        self,
+        glevel: int,
+        rlevel: int,
+        filenames: typing.Union[str, typing.Sequence[str]],
+        grids_class: typing.Type[AbstractGrids] = LegacyGrids,
+        cache: typing.Union[GridCache, str, None] = None,
+        max_workers: typing.Optional[int] = None,
+    ):
+        """
+        Args:
+            glevel: nicam glevel
+            rlevel: nicam rlevel
+            filenames: format string of the region files with the region
+                number as l, e.g. "grid.rgn{l:05d}", or a list of lall paths
+            grids_class: LegacyGrids or NetcdfGrids
+            cache: GridCache or cache directory passed to every region
+            max_workers: number of loader threads (ThreadPoolExecutor default
+                if None)
+        """
+        self.glevel = glevel
+        self.rlevel = rlevel
+        self.gall, self.gall_1d = calc_gall(glevel, rlevel)
+        self.gall_in = calc_gall_in(glevel, rlevel)
+        self.lall = calc_lall(rlevel)
+        if isinstance(filenames, str):
+            filenames = [filenames.format(l=rgn) for rgn in range(self.lall)]
+        if len(filenames) != self.lall:
+            raise ValueError(f"{self.lall} grid files are required")
+        self.filenames = list(filenames)
+        if isinstance(cache, str):
+            cache = GridCache(cache)
+
+        self.grd_x = np.empty([self.lall, 3, self.gall])
+        self.grd_xt = np.empty([self.lall, 3, 2, self.gall])
+
+        def load(rgn: int):
+            grids = grids_class(glevel, rlevel, self.filenames[rgn], cache=cache)
+            self.grd_x[rgn] = grids.grd_x
+            self.grd_xt[rgn] = grids.grd_xt
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # list() re-raises the first exception of the workers
+            list(executor.map(load, range(self.lall)))
+
+    def get_lonlat_c(self):
+        """
+        Returns:
+            lon_c: NDArray of shape (lall, gall_in)
+            lat_c: NDArray of shape (lall, gall_in)
+        """
+        gall_1d = self.gall_1d
+        # (lall, 3, gall) -> (3, lall, gall)
+        lat_c, lon_c = xyz2latlon(self.grd_x.transpose(1, 0, 2))
+        lon_c = lon_c.reshape([self.lall, gall_1d, gall_1d]) * 180.0 / np.pi
+        lat_c = lat_c.reshape([self.lall, gall_1d, gall_1d]) * 180.0 / np.pi
+        lon_cin = lon_c[:, 1 : gall_1d - 1, 1 : gall_1d - 1].reshape(self.lall, -1)
+        lat_cin = lat_c[:, 1 : gall_1d - 1, 1 : gall_1d - 1].reshape(self.lall, -1)
+        return lon_cin, lat_cin
+
+    def get_lonlat_v(self):
+        """
+        Returns:
+            lon_v: NDArray of shape (lall, gall_in, 6)
+            lat_v: NDArray of shape (lall, gall_in, 6)
+        """
+        # (lall, 3, 2, gall) -> (3, lall, 2, gall)
+        lat_t, lon_t = xyz2latlon(self.grd_xt.transpose(1, 0, 2, 3))
+        lon_t = lon_t.reshape([self.lall, -1]) * 180.0 / np.pi
+        lat_t = lat_t.reshape([self.lall, -1]) * 180.0 / np.pi
+        index = hexagon_vertex_index(self.gall_1d)
+        lon_v = lon_t[:, index].astype(np.float32)
+        lat_v = lat_t[:, index].astype(np.float32)
+        return lon_v, lat_v
+
+    def get_area(self, radius: float = radius):
+        """
+        Args:
+            radius: radius of the sphere [m]
+
+        Returns:
+            area: NDArray of shape (lall, gall_in) [m^2]
+        """
+        return cell_area(self.grd_x, self.grd_xt) * radius**2
+
+    def get_polygons(self, dateline: str = "split", closed: bool = False):
+        """
+        outlines of all cells as one ragged array, see Polygons.from_lonlat
+
+        Returns:
+            Polygons whose cell is l * gall_in + ij
+        """
+        lon_v, lat_v = self.get_lonlat_v()
+        return Polygons.from_lonlat(lon_v, lat_v, dateline, closed)
@@ -0,0 +1,176 @@
+import typing
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+
+if typing.TYPE_CHECKING:
+    from .AbstractGrids import AbstractGrids
+
+# arrays kept per grid file
+cached_arrays = ["grd_x", "grd_xt", "lon_c", "lat_c", "lon_v", "lat_v"]
+
+
+class GridCache:
+    """
+    On-disk cache of derived grid geometry
+
+    Each entry is a directory of .npy files (grd_x, grd_xt, lon/lat of the
+    cell centers and of the hexagon vertices) keyed by grid class, glevel,
+    rlevel and path, mtime and size of the source file. Entries are loaded
+    as copy-on-write memmaps, so nothing is read until it is used. The
+    least recently used entries are removed once the directory grows
+    beyond max_bytes.
+    """
+
+    def __init__(
+        self, directory: typing.Optional[str] = None, max_bytes: int = 4 * 1024**3
+    ):
+        """
+        Args:
+            directory: cache directory, $NICOPY_CACHE_DIR or ~/.cache/nicopy
+                if None
+            max_bytes: upper bound of the total size of the cache directory
+        """
+        if directory is None:
+            directory = os.environ.get(
+                "NICOPY_CACHE_DIR",
+                os.path.join(os.path.expanduser("~"), ".cache", "nicopy"),
+            )
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, grids: "AbstractGrids") -> str:
+        filename = os.path.abspath(grids.filename)
+        stat = os.stat(filename)
+        source = ":".join(
+            [
+                type(grids).__name__,
+                str(grids.glevel),
+                str(grids.rlevel),
+                filename,
+                str(stat.st_mtime_ns),
+                str(stat.st_size),
+            ]
+        )
+        return hashlib.sha1(source.encode()).hexdigest()
+
+    def load(self, grids: "AbstractGrids") -> bool:
+        """
+        set the cached arrays on grids
+
+        Returns:
+            True on a cache hit
+        """
+        path = os.path.join(self.directory, self.key(grids))
+        if not os.path.isdir(path):
+            return False
+        try:
+            arrays = {
+                name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="c")
+                for name in cached_arrays
+            }
+        except (OSError, ValueError):
+            # broken entry, rebuild it
+            shutil.rmtree(path, ignore_errors=True)
+            return False
+        os.utime(path)  # mark as recently used
+        grids.grd_x = arrays["grd_x"]
+        grids.grd_xt = arrays["grd_xt"]
+        grids.lonlat_c = (arrays["lon_c"], arrays["lat_c"])
+        grids.lonlat_v = (arrays["lon_v"], arrays["lat_v"])
+        return True
+
+    def store(self, grids: "AbstractGrids"):
+        """
+        write the geometry of grids and load it back from the cache
+        (the computed arrays are kept if the entry is evicted at once)
+        """
+        key = self.key(grids)
+        lon_c, lat_c = grids.get_lonlat_c()
+        lon_v, lat_v = grids.get_lonlat_v()
+        grids.lonlat_c = (lon_c, lat_c)
+        grids.lonlat_v = (lon_v, lat_v)
+        arrays = {
+            "grd_x": grids.grd_x,
+            "grd_xt": grids.grd_xt,
+            "lon_c": lon_c,
+            "lat_c": lat_c,
+            "lon_v": lon_v,
+            "lat_v": lat_v,
+        }
+        meta = {
+            "grids": type(grids).__name__,
+            "glevel": grids.glevel,
+            "rlevel": grids.rlevel,
+            "filename": os.path.abspath(grids.filename),
+        }
+        # entries of an older version of the same file are stale
+        self.invalidate(grids.filename)
+        # write into a temporary directory and rename it, so concurrent
+        # jobs never see a partial entry
+        tmp = tempfile.mkdtemp(prefix=".tmp", dir=self.directory)
+        try:
+            for name, array in arrays.items():
+                np.save(os.path.join(tmp, f"{name}.npy"), np.ascontiguousarray(array))
+            with open(os.path.join(tmp, "meta.json"), "w") as f:
+                json.dump(meta, f)
+            os.replace(tmp, os.path.join(self.directory, key))
+        except OSError:
+            # another job stored the same entry first
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.evict()
+        self.load(grids)
+
+    def entries(self) -> typing.List[typing.Tuple[str, float, int]]:
+        """
+        Returns:
+            (path, last use, size in bytes) of every entry
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.startswith(".") or not os.path.isdir(path):
+                continue
+            try:
+                size = sum(
+                    os.path.getsize(os.path.join(path, f)) for f in os.listdir(path)
+                )
+                entries.append((path, os.path.getmtime(path), size))
+            except OSError:
+                # removed by another job meanwhile
+                continue
+        return entries
+
+    def evict(self):
+        """
+        remove the least recently used entries beyond max_bytes
+        """
+        entries = sorted(self.entries(), key=lambda entry: entry[1])
+        total = sum(size for _, _, size in entries)
+        for path, _, size in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+    def invalidate(self, filename: typing.Optional[str] = None):
+        """
+        remove the entries built from filename, or all entries if None
+        """
+        if filename is not None:
+            filename = os.path.abspath(filename)
+        for path, _, _ in self.entries():
+            if filename is not None:
+                try:
+                    with open(os.path.join(path, "meta.json")) as f:
+                        built_from = json.load(f)["filename"]
+                except (OSError, ValueError, KeyError):
+                    # unreadable metadata does not prove the entry is filename's
+                    continue
+                if built_from != filename:
+                    continue
+            shutil.rmtree(path, ignore_errors=True)
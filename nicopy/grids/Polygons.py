@@ -0,0 +1,159 @@
+import typing
+import numpy as np
+from ..util import rearrange_lon
+
+datelines = ["split", "unwrap"]
+
+
+class Polygons(typing.NamedTuple):
+    """
+    Cell outlines of many cells as one ragged array
+
+    Polygon n has the vertices coords[offsets[n]:offsets[n + 1]] and
+    outlines the cell cell[n] of the flattened input, so a field of the
+    same cells is colored by np.ravel(field)[cell]. A cell crossing the
+    dateline gives two polygons if split.
+
+    coords: NDArray of shape (nvertex, 2) holding (lon, lat) [deg]
+    offsets: NDArray of shape (npolygon + 1)
+    cell: NDArray of shape (npolygon)
+    """
+
+    coords: np.ndarray
+    offsets: np.ndarray
+    cell: np.ndarray
+
+    @classmethod
+    def from_lonlat(
+        cls,
+        lon_v: np.ndarray,
+        lat_v: np.ndarray,
+        dateline: str = "split",
+        closed: bool = False,
+    ):
+        """
+        Args:
+            lon_v: NDArray of shape (..., 6), e.g. (gall_in, 6) or
+                (lall, gall_in, 6) from get_lonlat_v
+            lat_v: NDArray of the shape of lon_v
+            dateline: "split" cuts cells crossing the dateline into a part
+                east and a part west of it; "unwrap" keeps them whole with
+                longitudes beyond 180
+            closed: repeat the first vertex at the end of every polygon, as
+                required by shapefiles and spatialpandas
+
+        The repeated vertex of a pentagon is dropped.
+        """
+        if dateline not in datelines:
+            raise ValueError(f"'dateline' must be one of {datelines}")
+        dtype = np.result_type(lon_v, np.float32)
+        lon = np.array(lon_v, dtype=float).reshape((-1, 6))
+        lat = np.array(lat_v, dtype=float).reshape((-1, 6))
+        cell = np.arange(len(lon))
+
+        # continuous longitudes along every outline, crossing +180 if at all
+        lon = lon[:, :1] + rearrange_lon(lon - lon[:, :1])
+        lon[lon.min(axis=1) < -180.0] += 360.0
+        cross = lon.max(axis=1) > 180.0
+        xy = np.stack([lon, lat], axis=-1)
+        valid = np.ones(lon.shape, dtype=bool)
+        if dateline == "split" and cross.any():
+            west, west_valid = clip(xy[cross], 180.0, below=True)
+            east, east_valid = clip(xy[cross], 180.0, below=False)
+            east[..., 0] -= 360.0
+            # pad the outlines that were not cut to the clipped vertex count
+            nvertex = west.shape[1]
+            whole = np.repeat(xy[~cross][:, -1:], nvertex, axis=1)
+            whole[:, :6] = xy[~cross]
+            whole_valid = np.zeros((len(whole), nvertex), dtype=bool)
+            whole_valid[:, :6] = True
+            xy = np.concatenate([whole, west, east])
+            valid = np.concatenate([whole_valid, west_valid, east_valid])
+            cell = np.concatenate([cell[~cross], cell[cross], cell[cross]])
+            order = np.argsort(cell, kind="stable")
+            xy, valid, cell = xy[order], valid[order], cell[order]
+
+        # drop vertices repeating the previous valid one (pentagons, clipping)
+        # and the slivers left by cells touching the dateline at a vertex
+        valid &= ~repeated(xy, valid)
+        count = valid.sum(axis=1)
+        keep = count >= 3
+        xy, valid, cell, count = xy[keep], valid[keep], cell[keep], count[keep]
+        if closed:
+            first = np.argmax(valid, axis=1)
+            xy = np.concatenate([xy, xy[np.arange(len(xy)), first][:, None]], axis=1)
+            valid = np.concatenate([valid, np.ones((len(xy), 1), dtype=bool)], axis=1)
+            count = count + 1
+        offsets = np.zeros(len(count) + 1, dtype=np.int64)
+        np.cumsum(count, out=offsets[1:])
+        return cls(xy[valid].astype(dtype), offsets, cell)
+
+    def __len__(self) -> int:  # type: ignore
+        return len(self.cell)
+
+    def padded(self) -> np.ndarray:
+        """
+        Returns:
+            NDArray of shape (npolygon, max vertices, 2), shorter polygons
+            padded with their last vertex, e.g. for
+            matplotlib.collections.PolyCollection
+        """
+        count = np.diff(self.offsets)
+        nvertex = int(count.max(initial=0))
+        rank = np.minimum(np.arange(nvertex), count[:, np.newaxis] - 1)
+        return self.coords[self.offsets[:-1, np.newaxis] + rank]
+
+
+def clip(
+    xy: np.ndarray, lon: float, below: bool
+) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """
+    clip convex outlines at a meridian (Sutherland-Hodgman for one edge)
+
+    Args:
+        xy: NDArray of shape (n, m, 2)
+        lon: longitude [deg] of the cut
+        below: keep the part west (True) or east (False) of lon
+
+    Returns:
+        xy: NDArray of shape (n, 2 * m, 2)
+        valid: NDArray of bool of shape (n, 2 * m)
+    """
+    a = xy
+    b = np.roll(xy, -1, axis=1)
+    if below:
+        inside_a, inside_b = a[..., 0] <= lon, b[..., 0] <= lon
+    else:
+        inside_a, inside_b = a[..., 0] >= lon, b[..., 0] >= lon
+    # every edge a -> b emits the crossing point (if it crosses) and b (if
+    # b is inside)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = (lon - a[..., 0]) / (b[..., 0] - a[..., 0])
+        crossing = a + t[..., np.newaxis] * (b - a)
+    crossing[..., 0] = lon
+    out = np.stack([crossing, b], axis=2).reshape((len(xy), -1, 2))
+    valid = np.stack([inside_a != inside_b, inside_b], axis=2).reshape((len(xy), -1))
+    return out, valid
+
+
+def repeated(xy: np.ndarray, valid: np.ndarray) -> np.ndarray:
+    """
+    Returns:
+        NDArray of bool of shape valid.shape, True for valid vertices equal
+        to the previous valid vertex of the (cyclic) outline
+    """
+    n, m = valid.shape
+    position = np.where(valid, np.arange(m), -1)
+    # index of the last valid vertex up to every position
+    last = np.maximum.accumulate(position, axis=1)
+    # the vertex before the first valid one is the last valid one
+    previous = np.empty_like(last)
+    previous[:, 1:] = last[:, :-1]
+    previous[:, 0] = -1
+    wrap = last[:, -1:]
+    previous = np.where(previous < 0, wrap, previous)
+    rows = np.arange(n)[:, np.newaxis]
+    same = (xy[rows, previous] == xy).all(axis=-1)
+    # a polygon of one point keeps it
+    same &= previous != np.arange(m)
+    return valid & same
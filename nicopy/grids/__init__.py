@@ -1,5 +1,18 @@
 from .LegacyGrids import LegacyGrids
 from .NetcdfGrids import NetcdfGrids
+from .GlobalGrids import GlobalGrids
+from .GridCache import GridCache
+from .Connectivity import Connectivity
+from .Polygons import Polygons
 from .mod_grid import xyz2latlon, latlon2xyz
 
-__all__ = ["LegacyGrids", "NetcdfGrids", "xyz2latlon", "latlon2xyz"]
+__all__ = [
+    "LegacyGrids",
+    "NetcdfGrids",
+    "GlobalGrids",
+    "GridCache",
+    "Connectivity",
+    "Polygons",
+    "xyz2latlon",
+    "latlon2xyz",
+]
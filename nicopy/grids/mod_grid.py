@@ -3,13 +3,21 @@
 #
 # nicam grid converter
 #
-import sys
+import functools
 import numpy as np
 
 radius = 6371.0e3
 
 
 def latlon2xyz(lat, lon):
+    """
+    Args:
+        lat: latitude [rad], scalar or NDArray of any shape
+        lon: longitude [rad], same shape as lat
+
+    Returns:
+        NDArray of shape (3, *lat.shape)
+    """
     x = radius * np.cos(lat) * np.cos(lon)
     y = radius * np.cos(lat) * np.sin(lon)
     z = radius * np.sin(lat)
@@ -31,44 +39,87 @@ EPS = 9.0e-30
 
 
 def xyz2latlon(v):
+    """
+    Args:
+        v: NDArray of shape (3,), (3, N) or (3, 2, N)
+
+    Returns:
+        lat: latitude [rad], scalar or NDArray of shape v.shape[1:]
+        lon: longitude [rad], scalar or NDArray of shape v.shape[1:]
+    """
+    v = np.asarray(v, dtype=np.float64)
     x = v[0]
     y = v[1]
     z = v[2]
     length = np.sqrt(x * x + y * y + z * z)
+    length_h = np.sqrt(x * x + y * y)
 
-    if length < EPS:
-        lat = 0.0
-        lon = 0.0
-        return lat, lon
-
-    if z / length >= 1.0:  # vector is parallele to z axis.
-        lat = np.arcsin(1.0)
-        lon = 0.0
-        return lat, lon
-    elif z / length <= -1.0:  # ! vector is parallele to z axis.
-        lat = np.arcsin(-1.0)
-        lon = 0.0
-        return lat, lon
-    else:
-        lat = np.arcsin(z / length)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # clipping reproduces the arcsin(+-1.0) / arccos(+-1.0) branches
+        sin_lat = np.clip(z / length, -1.0, 1.0)
+        cos_lon = np.clip(x / length_h, -1.0, 1.0)
 
-    length_h = np.sqrt(x * x + y * y)
+    lat = np.arcsin(sin_lat)
+    lon = np.arccos(cos_lon)
+    lon = np.where(y < 0.0, -lon, lon)
+
+    # vector is parallele to z axis.
+    pole = (sin_lat >= 1.0) | (sin_lat <= -1.0) | (length_h < EPS)
+    lon = np.where(pole, 0.0, lon)
+
+    zero = length < EPS
+    lat = np.where(zero, 0.0, lat)
+    lon = np.where(zero, 0.0, lon)
+
+    return lat[()], lon[()]
 
-    if length_h < EPS:
-        lon = 0.0
-        return lat, lon
 
-    if x / length_h >= 1.0:
-        lon = np.arccos(1.0)
-    elif x / length_h <= -1.0:
-        lon = np.arccos(-1.0)
-    else:
-        lon = np.arccos(x / length_h)
+def spherical_triangle_area(a, b, c):
+    """
+    area of spherical triangles on the unit sphere (Van Oosterom and
+    Strackee)
 
-    if y < 0.0:
-        lon = -lon
+    Args:
+        a: unit vectors of the first corners, NDArray of shape (..., 3)
+        b: unit vectors of the second corners, NDArray of shape (..., 3)
+        c: unit vectors of the third corners, NDArray of shape (..., 3)
 
-    return lat, lon
+    Returns:
+        NDArray of shape (...)
+    """
+    det = np.einsum("...i,...i->...", a, np.cross(b, c))
+    ab = np.einsum("...i,...i->...", a, b)
+    bc = np.einsum("...i,...i->...", b, c)
+    ca = np.einsum("...i,...i->...", c, a)
+    return 2.0 * np.arctan2(np.abs(det), 1.0 + ab + bc + ca)
+
+
+def cell_area(grd_x, grd_xt):
+    """
+    area of the inner cells on the unit sphere, the sum of the 6 triangles
+    between the cell center and its hexagon (pentagon) edges
+
+    Args:
+        grd_x: NDArray of shape (..., 3, gall)
+        grd_xt: NDArray of shape (..., 3, 2, gall)
+
+    Returns:
+        NDArray of shape (..., gall_in)
+    """
+    grd_x = np.asarray(grd_x, dtype=np.float64)
+    grd_xt = np.asarray(grd_xt, dtype=np.float64)
+    gall = grd_x.shape[-1]
+    gall_1d = int(np.sqrt(gall))
+    index = hexagon_vertex_index(gall_1d)
+    # vertex 4 is (ADM_TJ, j, i) of the cell (j, i) itself
+    inner = index[:, 4] - gall
+    # (..., 3, gall_in) -> (..., gall_in, 3)
+    c = np.moveaxis(grd_x[..., inner], -2, -1)
+    v = np.moveaxis(grd_xt.reshape(grd_xt.shape[:-2] + (-1,))[..., index], -3, -1)
+    c = c / np.linalg.norm(c, axis=-1, keepdims=True)
+    a = v / np.linalg.norm(v, axis=-1, keepdims=True)
+    b = np.roll(a, -1, axis=-2)
+    return spherical_triangle_area(c[..., np.newaxis, :], a, b).sum(axis=-1)
 
 
 def VECTR_cross(a, b, c, d):
@@ -85,6 +136,33 @@ def VECTR_abs(a):
     return l
 
 
+@functools.lru_cache(maxsize=None)
+def hexagon_vertex_index(gall_1d: int):
+    """
+    gather table of the 6 triangle vertices surrounding every inner cell
+
+    Args:
+        gall_1d: number of grid points in one direction (with halo)
+
+    Returns:
+        NDArray of shape (gall_in, 6) holding flat indices into a vertex
+        array of shape (2, gall) (or (2, gall_1d, gall_1d))
+    """
+    gall = gall_1d * gall_1d
+    j, i = np.meshgrid(
+        np.arange(1, gall_1d - 1), np.arange(1, gall_1d - 1), indexing="ij"
+    )
+    j = j.ravel()[:, np.newaxis]
+    i = i.ravel()[:, np.newaxis]
+    # (ADM_TI or ADM_TJ, j, i) of vertices 0..5 relative to cell (j, i)
+    t = np.array([1, 0, 1, 0, 1, 0])
+    dj = np.array([-1, -1, -1, 0, 0, 0])
+    di = np.array([-1, -1, 0, 0, 0, -1])
+    index = t * gall + (j + dj) * gall_1d + (i + di)
+    index.setflags(write=False)
+    return index
+
+
 class grid_conv:
     def __init__(self, ADM_gall_1d):
         self.ADM_gmin = 0 + 1  # if fortran 0 is 1
@@ -94,7 +172,6 @@ class grid_conv:
         self.ADM_gall_in = (ADM_gall_1d - 2) ** 2
         self.ADM_nxyz = 3
         self.ADM_have_sgp = True  # tentative
-        self.wk = np.empty([2, self.ADM_gall, 4, 3])  # ADM_TI to ADM_TJ
 
     def suf(self, j, i):
         # suffix = ADM_gall_1d * (j-1) + i
@@ -102,42 +179,18 @@ class grid_conv:
         return suffix
 
     def pgrid(self, lat_t, lon_t):
-        #
-        # exact grid
-        #
-        #
-        # set up array
-        #
-        gall_1d = self.ADM_gall_1d
-        utx = np.empty([self.ADM_gall, 6], np.float32)
-        uty = np.empty([self.ADM_gall, 6], np.float32)
-        cell_info = np.empty([self.ADM_gall], np.int32)
-        #
-        for j in range(1, self.ADM_gall_1d - 1):
-            for i in range(1, self.ADM_gall_1d - 1):
-                ij = self.ADM_gall_1d * j + i
-                utx[ij, 0] = lon_t[1, j - 1, i - 1]
-                utx[ij, 1] = lon_t[0, j - 1, i - 1]
-                utx[ij, 2] = lon_t[1, j - 1, i]
-                utx[ij, 3] = lon_t[0, j, i]
-                utx[ij, 4] = lon_t[1, j, i]
-                utx[ij, 5] = lon_t[0, j, i - 1]
-                #
-                uty[ij, 0] = lat_t[1, j - 1, i - 1]
-                uty[ij, 1] = lat_t[0, j - 1, i - 1]
-                uty[ij, 2] = lat_t[1, j - 1, i]
-                uty[ij, 3] = lat_t[0, j, i]
-                uty[ij, 4] = lat_t[1, j, i]
-                uty[ij, 5] = lat_t[0, j, i - 1]
-                cell_info[ij] = 6
-        utx_out = utx.reshape([gall_1d, gall_1d, 6])[
-            1 : gall_1d - 1, 1 : gall_1d - 1, :
-        ]
-        uty_out = uty.reshape([gall_1d, gall_1d, 6])[
-            1 : gall_1d - 1, 1 : gall_1d - 1, :
-        ]
-        utx_out = utx_out.reshape(self.ADM_gall_in, 6)
-        uty_out = uty_out.reshape(self.ADM_gall_in, 6)
+        """
+        Args:
+            lat_t: NDArray of shape (2, gall_1d, gall_1d)
+            lon_t: NDArray of shape (2, gall_1d, gall_1d)
+
+        Returns:
+            uty: NDArray of shape (gall_in, 6)
+            utx: NDArray of shape (gall_in, 6)
+        """
+        index = hexagon_vertex_index(self.ADM_gall_1d)
+        utx_out = np.asarray(lon_t).reshape(-1)[index].astype(np.float32)
+        uty_out = np.asarray(lat_t).reshape(-1)[index].astype(np.float32)
 
         return (
             uty_out,
@@ -145,37 +198,40 @@ class grid_conv:
         )
 
     def center2vertex(self, GRD_x):
+        """
+        Args:
+            GRD_x: NDArray of shape (3, gall)
+
+        Returns:
+            GRD_xt: NDArray of shape (3, 2, gall)
+        """
         # Todo treat pentagon
         ADM_TI = 0
         ADM_TJ = 1
         ADM_gmin = self.ADM_gmin
         ADM_gmax = self.ADM_gmax
-        ADM_gall = self.ADM_gall
-        # ADM_gall_1d = self.ADM_gall_1d
-        GRD_xt = np.zeros([3, 2, self.ADM_gall])
-        wk = self.wk
-        if self.ADM_gall != ADM_gall:
-            print("error")
-            sys.exit()
-
-        # for j in range(ADM_gmin-1,ADM_gmax+1) :
-        #    for i in range(ADM_gmin-1,ADM_gmax+1) :
-        for j in range(ADM_gmin - 1, ADM_gmax):
-            for i in range(ADM_gmin - 1, ADM_gmax):
-                ij = self.suf(j, i)
-                ip1j = self.suf(j, i + 1)
-                ip1jp1 = self.suf(j + 1, i + 1)
-                ijp1 = self.suf(j + 1, i)
-                for d in range(self.ADM_nxyz):
-                    wk[ADM_TI, ij, 0, d] = GRD_x[d, ij]
-                    wk[ADM_TI, ij, 1, d] = GRD_x[d, ip1j]
-                    wk[ADM_TI, ij, 2, d] = GRD_x[d, ip1jp1]
-                    wk[ADM_TI, ij, 3, d] = GRD_x[d, ij]
-
-                    wk[ADM_TJ, ij, 0, d] = GRD_x[d, ij]
-                    wk[ADM_TJ, ij, 1, d] = GRD_x[d, ip1jp1]
-                    wk[ADM_TJ, ij, 2, d] = GRD_x[d, ijp1]
-                    wk[ADM_TJ, ij, 3, d] = GRD_x[d, ij]
+        if GRD_x.shape != (self.ADM_nxyz, self.ADM_gall):
+            raise ValueError(
+                f"'GRD_x' must be of shape ({self.ADM_nxyz}, {self.ADM_gall})"
+            )
+
+        # triangle corners (ij, ip1j, ip1jp1, ij) and (ij, ip1jp1, ijp1, ij)
+        # of every cell in ADM_gmin - 1 <= i, j < ADM_gmax; the last row and
+        # column have no corners and stay undefined (nan)
+        j, i = np.meshgrid(
+            np.arange(ADM_gmin - 1, ADM_gmax),
+            np.arange(ADM_gmin - 1, ADM_gmax),
+            indexing="ij",
+        )
+        ij = self.suf(j, i).ravel()
+        ip1j = self.suf(j, i + 1).ravel()
+        ip1jp1 = self.suf(j + 1, i + 1).ravel()
+        ijp1 = self.suf(j + 1, i).ravel()
+
+        x = GRD_x.T
+        wk = np.full([2, self.ADM_gall, 4, 3], np.nan)
+        wk[ADM_TI, ij] = x[np.stack([ij, ip1j, ip1jp1, ij], axis=1)]
+        wk[ADM_TJ, ij] = x[np.stack([ij, ip1jp1, ijp1, ij], axis=1)]
         wk[ADM_TI, self.suf(ADM_gmin - 1, ADM_gmax), :, :] = wk[
             ADM_TJ, self.suf(ADM_gmin - 1, ADM_gmax), :, :
         ]
@@ -186,20 +242,34 @@ class grid_conv:
         wk[ADM_TI, self.suf(ADM_gmin - 1, ADM_gmin - 1), :, :] = wk[
             ADM_TJ, self.suf(ADM_gmin - 1, ADM_gmin), :, :
         ]
-        o = np.zeros(3)
-        for t in range(2):
-            for j in range(ADM_gmin - 1, ADM_gmax + 1):
-                for i in range(ADM_gmin - 1, ADM_gmax + 1):
-                    #            for j in range(ADM_gmin,ADM_gmax) :
-                    #                for i in range(ADM_gmin,ADM_gmax) :
-                    ij = self.suf(j, i)
-                    gc = np.zeros(3)
-                    for m in range(3):
-                        r_lenC = VECTR_dot(o, wk[t, ij, m, :], o, wk[t, ij, m + 1, :])
-                        r = VECTR_cross(o, wk[t, ij, m, :], o, wk[t, ij, m + 1, :])
-                        r_lenS = VECTR_abs(r)
-                        r[:] = r[:] / r_lenS * np.arctan2(r_lenS, r_lenC)
-                        gc[:] = gc[:] + r[:]
-                    gc_len = VECTR_abs(gc)
-                    GRD_xt[:, t, ij] = gc[:] / gc_len
-        return GRD_xt
+
+        # arc-weighted centroid of all triangles at once, evaluated in the
+        # same operation order as VECTR_dot / VECTR_cross / VECTR_abs
+        a = wk[:, :, 0:3, :]
+        b = wk[:, :, 1:4, :]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            r_lenC = (
+                a[..., 0] * b[..., 0] + a[..., 1] * b[..., 1] + a[..., 2] * b[..., 2]
+            )
+            r = np.empty_like(a)
+            r[..., 0] = a[..., 1] * b[..., 2] - a[..., 2] * b[..., 1]
+            r[..., 1] = a[..., 2] * b[..., 0] - a[..., 0] * b[..., 2]
+            r[..., 2] = a[..., 0] * b[..., 1] - a[..., 1] * b[..., 0]
+            r_lenS = np.sqrt(
+                r[..., 0] * r[..., 0] + r[..., 1] * r[..., 1] + r[..., 2] * r[..., 2]
+            )
+            r = (
+                r
+                / r_lenS[..., np.newaxis]
+                * np.arctan2(r_lenS, r_lenC)[..., np.newaxis]
+            )
+            gc = r[:, :, 0, :] + r[:, :, 1, :] + r[:, :, 2, :]
+            gc_len = np.sqrt(
+                gc[..., 0] * gc[..., 0]
+                + gc[..., 1] * gc[..., 1]
+                + gc[..., 2] * gc[..., 2]
+            )
+            GRD_xt = gc / gc_len[..., np.newaxis]
+
+        # (2, gall, 3) -> (3, 2, gall)
+        return np.ascontiguousarray(GRD_xt.transpose(2, 0, 1))
@@ -0,0 +1,3 @@
+from .Operators import Operators
+
+__all__ = ["Operators"]
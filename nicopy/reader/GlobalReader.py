@@ -0,0 +1,298 @@
+import typing
+import glob
+import re
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from numpy.typing import DTypeLike
+from ..util import as_cells, as_slice, calc_gall_in, calc_lall
+from .LegacyReader import LegacyReader
+from .PandaReader import PandaReader
+
+if typing.TYPE_CHECKING:
+    from ..regrid import CellIndex
+
+
+class GlobalReader:
+    """
+    Assemble the regions of all files of a run into one (lall, gall_in) array
+
+    Legacy files are placed by the region number in their name
+    (*.rgnNNNNN), PE files by the rgnid list in their header. Files are
+    read concurrently by a thread pool filling one preallocated array.
+    """
+
+    def __init__(
+        self,
+        glevel: int,
+        rlevel: int,
+        filenames: typing.Union[str, typing.Sequence[str]],
+        kall: typing.Optional[int] = None,
+        precision: int = 4,
+        access: str = "direct",
+        max_workers: typing.Optional[int] = None,
+    ):
+        """
+        Args:
+            glevel: nicam glevel
+            rlevel: nicam rlevel
+            filenames: glob pattern or list of legacy region files or PE files
+            kall: number of layers, required for legacy files
+            precision: bytes per value of legacy files
+            access: record layout of legacy files
+            max_workers: number of reader threads (ThreadPoolExecutor default
+                if None)
+        """
+        self.glevel = glevel
+        self.rlevel = rlevel
+        self.gall_in = calc_gall_in(glevel, rlevel)
+        self.lall = calc_lall(rlevel)
+        self.max_workers = max_workers
+        if isinstance(filenames, str):
+            filenames = sorted(glob.glob(filenames))
+        if len(filenames) == 0:
+            raise ValueError("no input files")
+        self.filenames = list(filenames)
+
+        self.readers: typing.List[typing.Union[LegacyReader, PandaReader]] = []
+        self.rgnids: typing.List[np.ndarray] = []
+        legacy = [re.search(r"\.rgn(\d+)$", f) for f in self.filenames]
+        if all(legacy):
+            if kall is None:
+                raise ValueError("'kall' is required for legacy files")
+            self.format = "legacy"
+            for filename, match in zip(self.filenames, legacy):
+                reader = LegacyReader(glevel, rlevel, kall, filename, precision, access)
+                self.readers.append(reader)
+                self.rgnids.append(np.array([int(match.group(1))]))
+        elif not any(legacy):
+            self.format = "panda"
+            for filename in self.filenames:
+                reader = PandaReader(filename)
+                header = reader.finfo["header"]
+                if header["glevel"] != glevel or header["rlevel"] != rlevel:
+                    reader.fclose()
+                    raise ValueError(
+                        f"{filename} has glevel={header['glevel']} and "
+                        f"rlevel={header['rlevel']}"
+                    )
+                self.readers.append(reader)
+                self.rgnids.append(np.asarray(header["rgnid"]))
+        else:
+            raise ValueError("cannot mix legacy region files and PE files")
+
+        rgnid = np.concatenate(self.rgnids)
+        if rgnid.min() < 0 or rgnid.max() >= self.lall:
+            raise ValueError(f"region id out of range for lall={self.lall}")
+        if len(np.unique(rgnid)) != len(rgnid):
+            raise ValueError("region ids appear in more than one file")
+        self.complete = len(rgnid) == self.lall
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        for reader in self.readers:
+            if isinstance(reader, PandaReader):
+                if reader.finfo["status"]["opened"]:
+                    reader.fclose()
+            else:
+                reader.close()
+
+    def map(self, func: typing.Callable[[int], None], start: int = 0):
+        """
+        call func(i) for every file index from start on the thread pool
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            # list() re-raises the first exception of the workers
+            list(executor.map(func, range(start, len(self.readers))))
+
+    def num_of_layer(self, step: int, varname: typing.Optional[str] = None) -> int:
+        """
+        Returns:
+            number of layers of a variable at a step
+        """
+        reader = self.readers[0]
+        if isinstance(reader, PandaReader):
+            if varname is None:
+                raise ValueError("'varname' is required for PE files")
+            return reader.find_record(varname, step)["shape"][1]
+        return reader.kall
+
+    def file_dtype(self, step: int, varname: typing.Optional[str] = None) -> np.dtype:
+        """
+        Returns:
+            native-endian dtype of a variable at a step in the files
+        """
+        reader = self.readers[0]
+        if isinstance(reader, PandaReader):
+            if varname is None:
+                raise ValueError("'varname' is required for PE files")
+            dtype = reader.find_record(varname, step)["dtype"]
+        else:
+            dtype = f">f{reader.precision}"
+        return np.dtype(dtype).newbyteorder("=")
+
+    def empty(self, shape: typing.Tuple[int, ...], dtype: DTypeLike):
+        """
+        allocate a global array; regions without a file hold nan (or 0)
+        """
+        out = np.empty(shape, dtype=dtype)
+        if not self.complete:
+            out[...] = np.nan if out.dtype.kind in "fc" else 0
+        return out
+
+    def read(
+        self,
+        step: int,
+        k: int,
+        varname: typing.Optional[str] = None,
+        out: typing.Optional[np.ndarray] = None,
+        dtype: DTypeLike = None,
+    ):
+        """
+        Args:
+            step: step
+            k: layer
+            varname: variable name, required for PE files
+            out: C-contiguous NDArray of shape (lall, gall_in) to write into;
+                regions without a file are left untouched
+            dtype: dtype of the new array if out is None, native-endian file
+                dtype if None
+
+        Returns:
+            NDArray of shape (lall, gall_in)
+        """
+        if self.format == "panda" and varname is None:
+            raise ValueError("'varname' is required for PE files")
+        out_shape = (self.lall, self.gall_in)
+        if out is None:
+            if dtype is None:
+                dtype = self.file_dtype(step, varname)
+            out = self.empty(out_shape, dtype)
+        elif out.shape != out_shape or not out.flags.c_contiguous:
+            raise ValueError(f"'out' must be a C-contiguous array of shape {out_shape}")
+
+        def read_file(i: int):
+            reader = self.readers[i]
+            l_index = as_slice(self.rgnids[i])
+            if isinstance(l_index, slice) and l_index.step == 1:
+                # contiguous regions: write straight into the global array
+                target = out[l_index]
+            else:
+                target = None
+            if isinstance(reader, PandaReader):
+                v = reader.read_pe(varname, step, k, out=target, native=True)
+            else:
+                v = reader.read_rgn(step, k, output_shape="1D", out=target)
+            if target is None:
+                out[l_index] = v
+
+        self.map(read_file)
+        return out
+
+    def read_block(
+        self,
+        steps: typing.Union[int, typing.Sequence[int]],
+        ks: typing.Union[int, typing.Sequence[int], None] = None,
+        varname: typing.Optional[str] = None,
+        out: typing.Optional[np.ndarray] = None,
+        dtype: DTypeLike = None,
+    ):
+        """
+        Args:
+            steps: step or sequence of steps
+            ks: layer or sequence of layers, all layers if None
+            varname: variable name, required for PE files
+            out: NDArray of shape (nstep, lall, nk, gall_in) to write into;
+                regions without a file are left untouched
+            dtype: dtype of the new array if out is None, native-endian file
+                dtype if None
+
+        Returns:
+            NDArray of shape (nstep, lall, nk, gall_in)
+        """
+        if self.format == "panda" and varname is None:
+            raise ValueError("'varname' is required for PE files")
+
+        def read_file(i: int):
+            reader = self.readers[i]
+            if isinstance(reader, PandaReader):
+                block = reader.read_block(varname, steps, ks, dtype=dtype)
+            else:
+                # (nstep, nk, gall_in) -> (nstep, 1, nk, gall_in)
+                block = reader.read_block(steps, ks, output_shape="1D", dtype=dtype)
+                block = block[:, np.newaxis]
+            if out is None:
+                return block
+            out[:, as_slice(self.rgnids[i])] = block
+            return None
+
+        start = 0
+        if out is None:
+            # the first file fixes nstep, nk and dtype of the global array
+            block = read_file(0)
+            nstep, _, nk, gall_in = block.shape
+            out = self.empty((nstep, self.lall, nk, gall_in), block.dtype)
+            out[:, as_slice(self.rgnids[0])] = block
+            start = 1
+        self.map(read_file, start)
+        return out
+
+    def read_points(
+        self,
+        points: np.ndarray,
+        steps: typing.Union[int, typing.Sequence[int]],
+        ks: typing.Union[int, typing.Sequence[int], None] = None,
+        varname: typing.Optional[str] = None,
+        index: typing.Optional["CellIndex"] = None,
+        dtype: DTypeLike = None,
+    ):
+        """
+        read time series at a few cells; only the files holding their
+        regions are read, and only the bytes of the requested values
+
+        Args:
+            points: (region, ij) pairs of shape (npoints, 2), or (lat, lon)
+                pairs [deg] if index is given
+            steps: step or sequence of steps
+            ks: layer or sequence of layers, all layers if None
+            varname: variable name, required for PE files
+            index: CellIndex placing (lat, lon) points at the nearest cell
+            dtype: dtype of the returned array, native-endian file dtype
+                if None
+
+        Returns:
+            NDArray of shape (nstep, nk, npoints); points in regions without
+            a file hold nan (or 0)
+        """
+        if self.format == "panda" and varname is None:
+            raise ValueError("'varname' is required for PE files")
+        l, ij = as_cells(points, index)
+        if l.min(initial=0) < 0 or l.max(initial=0) >= self.lall:
+            raise ValueError(f"region id out of range for lall={self.lall}")
+        members = [np.flatnonzero(np.isin(l, rgnid)) for rgnid in self.rgnids]
+        blocks: typing.Dict[int, np.ndarray] = {}
+
+        def read_file(i: int):
+            reader = self.readers[i]
+            n = members[i]
+            if len(n) == 0:
+                return
+            if isinstance(reader, PandaReader):
+                selected = np.stack([l[n], ij[n]], axis=1)
+                block = reader.read_points(varname, selected, steps, ks, dtype=dtype)
+            else:
+                block = reader.read_points(ij[n], steps, ks, dtype=dtype)
+            blocks[i] = block
+
+        self.map(read_file)
+        if not blocks:
+            raise ValueError("no point lies in a region of the files")
+        first = next(iter(blocks.values()))
+        out = self.empty(first.shape[:2] + (len(l),), first.dtype)
+        for i, block in blocks.items():
+            out[..., members[i]] = block
+        return out
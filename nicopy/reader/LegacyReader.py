@@ -1,57 +1,278 @@
 import typing
+import os
 import numpy as np
-from ..util import calc_gall
+from numpy.typing import DTypeLike
+from ..util import as_slice, calc_gall, copy_to, iter_prefetch
+from .PandaReader import pread_points
 
 
 class LegacyReader:
-    def __init__(self, glevel: int, rlevel: int, kall: int, filename: str):
+    def __init__(
+        self,
+        glevel: int,
+        rlevel: int,
+        kall: int,
+        filename: str,
+        precision: int = 4,
+        access: str = "direct",
+    ):
+        """
+        Args:
+            glevel: nicam glevel
+            rlevel: nicam rlevel
+            kall: number of layers per step
+            filename: path to the region file
+            precision: default bytes per value (4 or 8)
+            access: default record layout ("direct" or "sequential")
+        """
         self.glevel = glevel
         self.rlevel = rlevel
         self.gall, self.gall_1d = calc_gall(glevel, rlevel)
         self.kall = kall
         self.filename = filename
+        self.precision = precision
+        self.access = access
+        self.maps: typing.Dict[typing.Tuple[int, str], np.ndarray] = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        release the file mappings
+        """
+        self.maps.clear()
+
+    def map(
+        self,
+        precision: typing.Optional[int] = None,
+        access: typing.Optional[str] = None,
+    ):
+        """
+        map the whole file once; later calls return the same mapping
+
+        Returns:
+            NDArray of shape (nstep, kall, gall)
+        """
+        precision = self.precision if precision is None else precision
+        access = self.access if access is None else access
+        if access not in ["direct", "sequential"]:
+            raise ValueError("'access' must be 'direct' or 'sequential'")
+        key = (precision, access)
+        if key not in self.maps:
+            gall = self.gall
+            kall = self.kall
+            dtype = np.dtype((f">f{precision}", (kall, gall)))
+            if access == "sequential":
+                # each step is one fortran record between 4-byte markers
+                header = ("head", ">i")
+                footer = ("footer", ">i")
+                dtype = np.dtype([header, ("v_all", dtype), footer])
+            nstep = os.path.getsize(self.filename) // dtype.itemsize
+            v_all = np.memmap(self.filename, mode="r", dtype=dtype, shape=(nstep,))
+            if access == "sequential":
+                v_all = v_all["v_all"]
+            self.maps[key] = v_all.reshape((nstep, kall, gall))
+        return self.maps[key]
 
     def read_rgn(
         self,
         step: int,
         k: int,
-        precision: int = 4,
+        precision: typing.Optional[int] = None,
         output_halo: bool = False,
         output_shape: str = "2D",
-        access: str = "direct",
+        access: typing.Optional[str] = None,
+        out: typing.Optional[np.ndarray] = None,
+        dtype: DTypeLike = None,
+        native: bool = False,
     ):
+        """
+        Without out, dtype or native, a read-only big-endian view of the file
+        is returned. Otherwise the layer is copied in one pass (byteswap,
+        halo strip and cast) into a native-endian C-contiguous array.
+
+        Args:
+            out: C-contiguous NDArray with the size of the output to write into
+            dtype: dtype of the returned array, e.g. np.float32
+        """
         if output_shape not in ["1D", "2D"]:
             raise ValueError("'output_shape' must be '1D' or '2d'")
-        if access not in ["direct", "sequential"]:
-            raise ValueError("'access' must be 'direct' or 'sequential'")
-        gall = self.gall
-        kall = self.kall
-        f: typing.BinaryIO = open(self.filename, "rb")
-        if access == "sequential":
-            offset = 4
+        v_all = self.map(precision, access)[step, k, :]
+        gall_1d = self.gall_1d
+        if output_halo:
+            v_out = v_all.reshape((gall_1d, gall_1d))
+        else:
+            v_out = v_all.reshape((gall_1d, gall_1d))[
+                1 : gall_1d - 1,
+                1 : gall_1d - 1,
+            ]
+        if out is not None or dtype is not None or native:
+            v_out = copy_to(v_out, out, dtype).reshape(v_out.shape)
+        if output_shape == "1D":
+            return v_out.ravel()
         else:
-            offset = 0
-        v_all = np.memmap(
-            f,
-            mode="r",
-            dtype=f">f{precision}",
-            offset=step * kall * gall * precision + offset,
-            shape=(kall, gall),
-        )[k, :]
+            return v_out
+
+    def read_block(
+        self,
+        steps: typing.Union[int, typing.Sequence[int], None] = None,
+        ks: typing.Union[int, typing.Sequence[int], None] = None,
+        precision: typing.Optional[int] = None,
+        output_halo: bool = False,
+        output_shape: str = "2D",
+        access: typing.Optional[str] = None,
+        out: typing.Optional[np.ndarray] = None,
+        dtype: DTypeLike = None,
+    ):
+        """
+        read several steps and layers at once
+
+        Args:
+            steps: step or sequence of steps, all steps if None
+            ks: layer or sequence of layers, all layers if None
+            out: C-contiguous NDArray to write into instead of allocating
+            dtype: dtype of the new array if out is None, native-endian
+                file dtype if None
+
+        Returns:
+            NDArray of shape (nstep, nk, gall_1d, gall_1d) for "2D" or
+            (nstep, nk, gall_1d * gall_1d) for "1D", without the halo
+            unless output_halo is set
+        """
+        if output_shape not in ["1D", "2D"]:
+            raise ValueError("'output_shape' must be '1D' or '2d'")
+        v_all = self.map(precision, access)
+        nstep, kall, _ = v_all.shape
+        steps = np.arange(nstep) if steps is None else np.arange(nstep)[steps]
+        ks = np.arange(kall) if ks is None else np.arange(kall)[ks]
+        steps = np.atleast_1d(steps)
+        ks = np.atleast_1d(ks)
+
         gall_1d = self.gall_1d
         if output_halo:
-            if output_shape == "1D":
-                return v_all
-            else:
-                return v_all.reshape((gall_1d, gall_1d))
+            ij = slice(None)
+            nij = gall_1d
+        else:
+            ij = slice(1, gall_1d - 1)
+            nij = gall_1d - 2
+        if output_shape == "1D":
+            out_shape: typing.Tuple[int, ...] = (len(steps), len(ks), nij * nij)
         else:
-            if output_shape == "1D":
-                return v_all.reshape((gall_1d, gall_1d))[
-                    1 : gall_1d - 1,
-                    1 : gall_1d - 1,
-                ].ravel()
-            else:
-                return v_all.reshape((gall_1d, gall_1d))[
-                    1 : gall_1d - 1,
-                    1 : gall_1d - 1,
-                ]
+            out_shape = (len(steps), len(ks), nij, nij)
+        if out is None:
+            if dtype is None:
+                dtype = v_all.dtype.newbyteorder("=")
+            out = np.empty(out_shape, dtype=dtype)
+        elif out.shape != out_shape or not out.flags.c_contiguous:
+            raise ValueError(f"'out' must be a C-contiguous array of shape {out_shape}")
+
+        k_index = as_slice(ks)
+        for n, step in enumerate(steps):
+            # halo strip, layer selection, byteswap and cast in one copy
+            out[n].reshape((len(ks), nij, nij))[...] = v_all[step].reshape(
+                (kall, gall_1d, gall_1d)
+            )[k_index, ij, ij]
+        return out
+
+    def read_points(
+        self,
+        ij: typing.Union[int, typing.Sequence[int]],
+        steps: typing.Union[int, typing.Sequence[int], None] = None,
+        ks: typing.Union[int, typing.Sequence[int], None] = None,
+        precision: typing.Optional[int] = None,
+        access: typing.Optional[str] = None,
+        dtype: DTypeLike = None,
+        max_gap: int = 4096,
+    ):
+        """
+        read time series at a few cells of the region
+
+        Only the values at the requested cells are read; offsets at most
+        max_gap bytes apart are fetched with a single read.
+
+        Args:
+            ij: inner grid point or sequence of inner grid points
+            steps: step or sequence of steps, all steps if None
+            ks: layer or sequence of layers, all layers if None
+            dtype: dtype of the returned array, native-endian file dtype
+                if None
+
+        Returns:
+            NDArray of shape (nstep, nk, npoints)
+        """
+        v_all = self.map(precision, access)
+        nstep, kall, gall = v_all.shape
+        steps = np.arange(nstep) if steps is None else np.arange(nstep)[steps]
+        ks = np.arange(kall) if ks is None else np.arange(kall)[ks]
+        steps = np.atleast_1d(steps)
+        ks = np.atleast_1d(ks)
+        ij = np.atleast_1d(np.asarray(ij, dtype=np.int64))
+        nmax = self.gall_1d - 2
+        if ij.min(initial=0) < 0 or ij.max(initial=0) >= nmax * nmax:
+            raise ValueError(f"'ij' must be in [0, {nmax * nmax})")
+        # inner grid point -> grid point with halo
+        j, i = np.divmod(ij, nmax)
+        g = (j + 1) * self.gall_1d + (i + 1)
+
+        file_dtype = v_all.dtype
+        step_size = file_dtype.itemsize * kall * gall
+        first = 0
+        if (self.access if access is None else access) == "sequential":
+            # fortran record markers around every step
+            step_size += 8
+            first = 4
+        element = ks[:, np.newaxis] * gall + g[np.newaxis, :]
+        offsets = (
+            first
+            + steps[:, np.newaxis, np.newaxis] * step_size
+            + element * file_dtype.itemsize
+        )
+        with open(self.filename, "rb") as fp:
+            values = pread_points(fp, offsets, file_dtype, max_gap)
+        if dtype is None:
+            dtype = file_dtype.newbyteorder("=")
+        return values.astype(dtype, copy=False)
+
+    def iter_steps(
+        self,
+        k: int,
+        steps: typing.Optional[typing.Iterable[int]] = None,
+        depth: int = 2,
+        dtype: DTypeLike = None,
+        precision: typing.Optional[int] = None,
+        output_shape: str = "2D",
+        access: typing.Optional[str] = None,
+    ) -> typing.Iterator[typing.Tuple[int, np.ndarray]]:
+        """
+        stream steps of one layer while the next depth steps are read on a
+        background thread
+
+        Args:
+            steps: steps to read, all steps if None
+            depth: number of steps read ahead
+            dtype: dtype of the buffers, native-endian file dtype if None
+
+        Yields:
+            (step, NDArray without the halo); the array is reused once the
+            next step is requested
+        """
+        if output_shape not in ["1D", "2D"]:
+            raise ValueError("'output_shape' must be '1D' or '2d'")
+        v_all = self.map(precision, access)
+        if steps is None:
+            steps = range(v_all.shape[0])
+        if dtype is None:
+            dtype = v_all.dtype.newbyteorder("=")
+        nij = self.gall_1d - 2
+        shape = (nij * nij,) if output_shape == "1D" else (nij, nij)
+
+        def read(step: int, out: np.ndarray):
+            self.read_rgn(
+                step, k, precision, output_shape=output_shape, access=access, out=out
+            )
+
+        yield from iter_prefetch(read, steps, shape, dtype, depth)
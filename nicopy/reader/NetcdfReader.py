@@ -1,14 +1,239 @@
+import typing
+import collections
 import netCDF4
 import numpy as np
+from numpy.typing import DTypeLike
+from ..util import copy_to, iter_prefetch
+
+# attributes that require mask / scale handling
+mask_and_scale_attrs = ["_FillValue", "missing_value", "scale_factor", "add_offset"]
 
 
 class NetcdfReader:
-    def __init__(self, filename: str):
+    """
+    Reader of (time, k, cell) variables in NetCDF files
+
+    Data are decoded one storage chunk (a block of steps and layers, all
+    cells) at a time and kept in an LRU cache bounded by cache_bytes, so
+    reads of neighbouring slices do not decompress the same chunk again.
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        cache_bytes: int = 64 * 1024**2,
+        mask_and_scale: typing.Optional[bool] = None,
+    ):
+        """
+        Args:
+            filename: path to the NetCDF file
+            cache_bytes: upper bound of the decoded chunk cache, 0 to disable
+            mask_and_scale: apply fill values and scale/offset; if None only
+                for variables that define one of them
+        """
         self.nc = netCDF4.Dataset(filename)
+        self.cache_bytes = cache_bytes
+        self.mask_and_scale = mask_and_scale
+        self.cache: "collections.OrderedDict[tuple, np.ndarray]" = (
+            collections.OrderedDict()
+        )
+        self.cached_bytes = 0
+        self.chunks: typing.Dict[str, typing.Tuple[int, int]] = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.cache.clear()
+        self.cached_bytes = 0
+        if self.nc.isopen():
+            self.nc.close()
+
+    def variable(self, varname: str) -> netCDF4.Variable:
+        """
+        Returns:
+            the variable, set up for chunked reads on first use
+        """
+        var = self.nc.variables[varname]
+        if varname not in self.chunks:
+            mask_and_scale = self.mask_and_scale
+            if mask_and_scale is None:
+                mask_and_scale = any(a in var.ncattrs() for a in mask_and_scale_attrs)
+            var.set_auto_maskandscale(mask_and_scale)
+            chunking = var.chunking()
+            if chunking == "contiguous" or chunking is None:
+                # one step with all layers per read
+                self.chunks[varname] = (1, var.shape[1])
+            else:
+                self.chunks[varname] = (chunking[0], chunking[1])
+        return var
+
+    def cacheable(self, varname: str, it: int, ik: int) -> bool:
+        """
+        Returns:
+            True if chunk (it, ik) is cached or small enough to be cached
+        """
+        if (varname, it, ik) in self.cache:
+            return True
+        var = self.variable(varname)
+        ct, ck = self.chunks[varname]
+        return ct * ck * var.shape[-1] * var.dtype.itemsize <= self.cache_bytes
+
+    def chunk(self, varname: str, it: int, ik: int) -> np.ndarray:
+        """
+        Returns:
+            decoded chunk (it, ik) of shape (nt, nk, gall)
+        """
+        key = (varname, it, ik)
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+        var = self.variable(varname)
+        ct, ck = self.chunks[varname]
+        v = var[it * ct : (it + 1) * ct, ik * ck : (ik + 1) * ck, :]
+        if v.nbytes <= self.cache_bytes:
+            self.cache[key] = v
+            self.cached_bytes += v.nbytes
+            while self.cached_bytes > self.cache_bytes:
+                _, old = self.cache.popitem(last=False)
+                self.cached_bytes -= old.nbytes
+        return v
+
+    def gall_1d(self, varname: str) -> int:
+        return int(np.sqrt(self.variable(varname).shape[-1]))
+
+    def read_rgn(
+        self,
+        varname: str,
+        step: int,
+        k: int,
+        out: typing.Optional[np.ndarray] = None,
+        dtype: DTypeLike = None,
+        native: bool = False,
+    ):
+        """
+        Without out, dtype or native, a (masked) array is returned. Otherwise
+        the fill value is kept in place of masked cells and the layer is
+        written into a native-endian C-contiguous array in one pass.
+
+        Args:
+            out: C-contiguous NDArray of shape (gall_in) to write into
+            dtype: dtype of the returned array, e.g. np.float32
+
+        Returns:
+            NDArray of shape (gall_in)
+        """
+        var = self.variable(varname)
+        ct, ck = self.chunks[varname]
+        step = range(var.shape[0])[step]
+        k = range(var.shape[1])[k]
+        if self.cacheable(varname, step // ct, k // ck):
+            v_all = self.chunk(varname, step // ct, k // ck)[step % ct, k % ck]
+        else:
+            # the chunk would not be kept: decode only the requested layer
+            v_all = var[step, k, :]
+        gall_1d = self.gall_1d(varname)
+        v_in = v_all.reshape((gall_1d, gall_1d))[1 : gall_1d - 1, 1 : gall_1d - 1]
+        if out is None and dtype is None and not native:
+            return v_in.ravel()
+        v_out = copy_to(np.ma.getdata(v_in), out, dtype).reshape(v_in.shape)
+        mask = np.ma.getmask(v_in)
+        if mask is not np.ma.nomask:
+            v_out[mask] = v_in.fill_value
+        return v_out.ravel()
+
+    def read_block(
+        self,
+        varname: str,
+        steps: typing.Union[int, typing.Sequence[int], None] = None,
+        ks: typing.Union[int, typing.Sequence[int], None] = None,
+        out: typing.Optional[np.ndarray] = None,
+        dtype: DTypeLike = None,
+    ):
+        """
+        read several steps and layers at once, chunk by chunk; masked
+        cells hold the fill value
+
+        Args:
+            steps: step or sequence of steps, all steps if None
+            ks: layer or sequence of layers, all layers if None
+            out: C-contiguous NDArray of shape (nstep, nk, gall_in)
+            dtype: dtype of the new array if out is None, native variable
+                dtype if None
+
+        Returns:
+            NDArray of shape (nstep, nk, gall_in)
+        """
+        var = self.variable(varname)
+        nstep, kall = var.shape[0], var.shape[1]
+        steps = np.arange(nstep) if steps is None else np.arange(nstep)[steps]
+        ks = np.arange(kall) if ks is None else np.arange(kall)[ks]
+        steps = np.atleast_1d(steps)
+        ks = np.atleast_1d(ks)
+        gall_1d = self.gall_1d(varname)
+        out_shape = (len(steps), len(ks), (gall_1d - 2) ** 2)
+        if out is None:
+            if dtype is None:
+                dtype = var.dtype.newbyteorder("=")
+            out = np.empty(out_shape, dtype=dtype)
+        elif out.shape != out_shape or not out.flags.c_contiguous:
+            raise ValueError(f"'out' must be a C-contiguous array of shape {out_shape}")
+        out_2d = out.reshape((len(steps), len(ks), gall_1d - 2, gall_1d - 2))
+
+        ct, ck = self.chunks[varname]
+        # group the requested (step, k) pairs by chunk
+        it, ik = steps // ct, ks // ck
+        for t_chunk in np.unique(it):
+            n = np.flatnonzero(it == t_chunk)
+            for k_chunk in np.unique(ik):
+                m = np.flatnonzero(ik == k_chunk)
+                if self.cacheable(varname, int(t_chunk), int(k_chunk)):
+                    chunk = self.chunk(varname, int(t_chunk), int(k_chunk))
+                    v = chunk[np.ix_(steps[n] % ct, ks[m] % ck)]
+                else:
+                    # read only the requested steps and layers of the chunk
+                    t_read, t_index = np.unique(steps[n], return_inverse=True)
+                    k_read, k_index = np.unique(ks[m], return_inverse=True)
+                    v = var[t_read, k_read, :][np.ix_(t_index, k_index)]
+                v = v.reshape((len(n), len(m), gall_1d, gall_1d))[
+                    ..., 1 : gall_1d - 1, 1 : gall_1d - 1
+                ]
+                out_2d[np.ix_(n, m)] = np.ma.filled(v)
+        return out
+
+    def iter_steps(
+        self,
+        varname: str,
+        k: int,
+        steps: typing.Optional[typing.Iterable[int]] = None,
+        depth: int = 2,
+        dtype: DTypeLike = None,
+    ) -> typing.Iterator[typing.Tuple[int, np.ndarray]]:
+        """
+        stream steps of one layer while the next depth steps are read on a
+        background thread; the reader must not be used by other threads
+        meanwhile
+
+        Args:
+            steps: steps to read, all steps if None
+            depth: number of steps read ahead
+            dtype: dtype of the buffers, native variable dtype if None
+
+        Yields:
+            (step, NDArray of shape (gall_in)); the array is reused once the
+            next step is requested
+        """
+        var = self.variable(varname)
+        if steps is None:
+            steps = range(var.shape[0])
+        if dtype is None:
+            dtype = var.dtype.newbyteorder("=")
+        shape = ((self.gall_1d(varname) - 2) ** 2,)
+
+        def read(step: int, out: np.ndarray):
+            self.read_rgn(varname, step, k, out=out)
 
-    def read_rgn(self, varname: str, step: int, k: int):
-        v_all = self.nc.variables[varname][step, k, :]
-        gall_1d = int(np.sqrt(v_all.shape[0]))
-        return v_all.reshape((gall_1d, gall_1d))[
-            1 : gall_1d - 1, 1 : gall_1d - 1
-        ].ravel()
+        yield from iter_prefetch(read, steps, shape, dtype, depth)
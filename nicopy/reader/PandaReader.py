@@ -1,12 +1,23 @@
 import typing
+import asyncio
+import functools
 import os
+import threading
+from concurrent.futures import Executor
 from ctypes import sizeof, c_char, c_int32, c_int64
 import numpy as np
 from logging import getLogger
-from ..util import calc_gall
+from numpy.typing import DTypeLike
+from ..util import as_cells, as_slice, calc_gall, copy_to, iter_prefetch
+
+if typing.TYPE_CHECKING:
+    from ..regrid import CellIndex
 
 logger = getLogger(__name__)
 
+# serializes seek + read where os.pread is missing (e.g. Windows)
+seek_lock = threading.Lock()
+
 # character length
 FIO_HSHORT = 16
 FIO_HMID = 64
@@ -41,6 +52,7 @@ FIO_FAPPEND = 2
 
 # list
 precision = [4, 8, 4, 8]
+dtypes = ["f4", "f8", "i4", "i8"]
 dinfosize = (
     sizeof(c_char) * FIO_HSHORT * 3
     + sizeof(c_char) * FIO_HMID
@@ -49,6 +61,36 @@ dinfosize = (
     + sizeof(c_int32) * 3
 )
 
+# header layout (big endian, see newbyteorder for little endian files)
+pkginfo_dtype = np.dtype(
+    [
+        ("description", f"S{FIO_HMID}"),
+        ("note", f"S{FIO_HLONG}"),
+        ("fmode", ">i4"),
+        ("endiantype", ">i4"),
+        ("grid_topology", ">i4"),
+        ("glevel", ">i4"),
+        ("rlevel", ">i4"),
+        ("num_of_rgn", ">i4"),
+    ]
+)
+dinfo_dtype = np.dtype(
+    [
+        ("varname", f"S{FIO_HSHORT}"),
+        ("description", f"S{FIO_HMID}"),
+        ("unit", f"S{FIO_HSHORT}"),
+        ("layername", f"S{FIO_HSHORT}"),
+        ("note", f"S{FIO_HLONG}"),
+        ("datasize", ">i8"),
+        ("datatype", ">i4"),
+        ("num_of_layer", ">i4"),
+        ("step", ">i4"),
+        ("time_start", ">i8"),
+        ("time_end", ">i8"),
+    ]
+)
+assert dinfo_dtype.itemsize == dinfosize
+
 
 class FIOError(Exception):
     pass
@@ -82,16 +124,26 @@ class DataInfo(typing.TypedDict):
     time_end: int
 
 
+class RecordInfo(typing.TypedDict):
+    did: int
+    offset: int
+    dtype: typing.Optional[str]
+    shape: typing.Tuple[int, int, int]
+
+
 class StatusInfo(typing.TypedDict):
     rwmode: int
     opened: int
     fp: typing.BinaryIO
     eoh: int
+    endian: str
+    mm: typing.Optional[np.memmap]
 
 
 class FileInfo(typing.TypedDict):
     header: HeaderInfo
     dinfo: typing.List[DataInfo]
+    index: typing.Dict[typing.Tuple[str, int], RecordInfo]
     status: StatusInfo
 
 
@@ -101,9 +153,21 @@ class PandaReader:
 
     put/get indicates the communication with the database
     read/write indicates the communication with the file
+
+    Reads never use the file position: headers and blocks are fetched with
+    positioned reads and arrays are views of one whole-file memory map, so
+    a single reader may be shared by any number of threads (but must not
+    be closed while they read).
     """
 
-    def __init__(self, filename: str):
+    def __init__(self, filename: str, metadata_only: bool = False):
+        """
+        Args:
+            filename: path to the PE file
+            metadata_only: close the file right after the header and the
+                record index are read; variables(), steps() and finfo stay
+                available but data cannot be read
+        """
         header: HeaderInfo = {
             "fname": filename,
             "description": "",
@@ -122,10 +186,20 @@ class PandaReader:
             "opened": 1,
             "fp": open(filename, "rb"),
             "eoh": 0,
+            "endian": ">",
+            "mm": None,
+        }
+        self.lock = threading.Lock()
+        self.finfo: FileInfo = {
+            "header": header,
+            "dinfo": [],
+            "index": {},
+            "status": status,
         }
-        self.finfo: FileInfo = {"header": header, "dinfo": [], "status": status}
         self.read_pkginfo()
         self.read_datainfo()
+        if metadata_only:
+            self.fclose()
 
     def fclose(self):
         """
@@ -133,135 +207,477 @@ class PandaReader:
         """
         self.finfo["status"]["fp"].close()
         self.finfo["status"]["opened"] = 0
+        self.finfo["status"]["mm"] = None  # views already handed out stay valid
+
+    def mmap(self) -> np.memmap:
+        """
+        Returns:
+            read-only byte map of the whole file, created on first use
+        """
+        status = self.finfo["status"]
+        with self.lock:
+            if status["mm"] is None:
+                status["mm"] = np.memmap(status["fp"], dtype=np.uint8, mode="r")
+            return status["mm"]
 
     def read_pkginfo(self):
         """
         read package information
         """
-        endian = "big"
         finfo = self.finfo
         if finfo["status"]["opened"] == 0:
             logger.error(f"{finfo['header']['fname']} is not open!")
             raise FIOError()
 
         fp = finfo["status"]["fp"]
-        fp.seek(0, os.SEEK_SET)
         header = finfo["header"]
-        header["description"] = bytes_to_str(fp.read(sizeof(c_char) * FIO_HMID))
-        header["note"] = bytes_to_str(fp.read(sizeof(c_char) * FIO_HLONG))
-        header["fmode"] = int.from_bytes(fp.read(sizeof(c_int32)), endian)
-        header["endiantype"] = int.from_bytes(fp.read(sizeof(c_int32)), endian)
-        header["grid_topology"] = int.from_bytes(fp.read(sizeof(c_int32)), endian)
-        header["glevel"] = int.from_bytes(fp.read(sizeof(c_int32)), endian)
-        header["rlevel"] = int.from_bytes(fp.read(sizeof(c_int32)), endian)
-        header["num_of_rgn"] = int.from_bytes(fp.read(sizeof(c_int32)), endian)
-        rgnid = []
-        for _ in range(header["num_of_rgn"]):
-            rgnid.append(int.from_bytes(fp.read(sizeof(c_int32)), endian))
-        header["rgnid"] = np.array(rgnid)
-        header["num_of_data"] = int.from_bytes(fp.read(sizeof(c_int32)), endian)
-        finfo["status"]["eoh"] = fp.tell()
+        buf = pread(fp, pkginfo_dtype.itemsize, 0)
+        pkginfo = np.frombuffer(buf, pkginfo_dtype)[0]
+        if pkginfo["endiantype"] not in [
+            FIO_UNKNOWN_ENDIAN,
+            FIO_LITTLE_ENDIAN,
+            FIO_BIG_ENDIAN,
+        ]:
+            # header written in little endian
+            finfo["status"]["endian"] = "<"
+            pkginfo = np.frombuffer(buf, pkginfo_dtype.newbyteorder("<"))[0]
+        endian = finfo["status"]["endian"]
+        header["description"] = bytes_to_str(pkginfo["description"])
+        header["note"] = bytes_to_str(pkginfo["note"])
+        header["fmode"] = int(pkginfo["fmode"])
+        header["endiantype"] = int(pkginfo["endiantype"])
+        header["grid_topology"] = int(pkginfo["grid_topology"])
+        header["glevel"] = int(pkginfo["glevel"])
+        header["rlevel"] = int(pkginfo["rlevel"])
+        header["num_of_rgn"] = int(pkginfo["num_of_rgn"])
+        # rgnid list and num_of_data in one read
+        num_of_rgn = header["num_of_rgn"]
+        buf = pread(fp, sizeof(c_int32) * (num_of_rgn + 1), pkginfo_dtype.itemsize)
+        rgnid = np.frombuffer(buf, f"{endian}i4")
+        header["rgnid"] = rgnid[:num_of_rgn].astype(int)
+        header["num_of_data"] = int(rgnid[num_of_rgn])
+        finfo["status"]["eoh"] = pkginfo_dtype.itemsize + len(buf)
 
     def read_datainfo(self):
         """
         read data information
         """
-        endian = "big"
         finfo = self.finfo
         if finfo["status"]["opened"] == 0:
             logger.error(f"{finfo['header']['fname']} is not open!")
             raise FIOError()
 
+        header = finfo["header"]
+        gall, _ = calc_gall(header["glevel"], header["rlevel"])
         fp = finfo["status"]["fp"]
-        fp.seek(finfo["status"]["eoh"], os.SEEK_SET)
-        pos: int = 0
-        for _ in range(finfo["header"]["num_of_data"]):
-            fp.seek(pos, os.SEEK_CUR)
-            varname = bytes_to_str(fp.read(sizeof(c_char) * FIO_HSHORT))
-            description = bytes_to_str(fp.read(sizeof(c_char) * FIO_HMID))
-            unit = bytes_to_str(fp.read(sizeof(c_char) * FIO_HSHORT))
-            layername = bytes_to_str(fp.read(sizeof(c_char) * FIO_HSHORT))
-            note = bytes_to_str(fp.read(sizeof(c_char) * FIO_HLONG))
-            datasize = int.from_bytes(fp.read(sizeof(c_int64)), endian)
-            datatype = int.from_bytes(fp.read(sizeof(c_int32)), endian)
-            num_of_layer = int.from_bytes(fp.read(sizeof(c_int32)), endian)
-            step = int.from_bytes(fp.read(sizeof(c_int32)), endian)
-            time_start = int.from_bytes(fp.read(sizeof(c_int64)), endian)
-            time_end = int.from_bytes(fp.read(sizeof(c_int64)), endian)
+        offset: int = finfo["status"]["eoh"]
+        endian = finfo["status"]["endian"]
+        record_dtype = dinfo_dtype.newbyteorder(endian)
+        # data arrays follow endiantype, the header byte order if unknown
+        if header["endiantype"] == FIO_LITTLE_ENDIAN:
+            endian = "<"
+        elif header["endiantype"] == FIO_BIG_ENDIAN:
+            endian = ">"
+        for did in range(header["num_of_data"]):
+            # one read per record, the data array itself is skipped
+            record = np.frombuffer(pread(fp, dinfosize, offset), record_dtype)[0]
+            varname = bytes_to_str(record["varname"])
+            datasize = int(record["datasize"])
+            datatype = int(record["datatype"])
+            num_of_layer = int(record["num_of_layer"])
+            step = int(record["step"])
             dinfo: DataInfo = {
                 "varname": varname,
-                "description": description,
-                "unit": unit,
-                "layername": layername,
-                "note": note,
+                "description": bytes_to_str(record["description"]),
+                "unit": bytes_to_str(record["unit"]),
+                "layername": bytes_to_str(record["layername"]),
+                "note": bytes_to_str(record["note"]),
                 "datasize": datasize,
                 "datatype": datatype,
                 "num_of_layer": num_of_layer,
                 "step": step,
-                "time_start": time_start,
-                "time_end": time_end,
+                "time_start": int(record["time_start"]),
+                "time_end": int(record["time_end"]),
             }
             finfo["dinfo"].append(dinfo)
-            pos = dinfo["datasize"]  # skip data array
-
-    def read_pe(self, varname: str, step: int, k: int):
+            offset += dinfosize
+            # the first record wins if (varname, step) is duplicated
+            finfo["index"].setdefault(
+                (varname, step),
+                {
+                    "did": did,
+                    "offset": offset,
+                    "dtype": (
+                        f"{endian}{dtypes[datatype]}" if 0 <= datatype < 4 else None
+                    ),
+                    "shape": (header["num_of_rgn"], num_of_layer, gall),
+                },
+            )
+            offset += datasize
+
+    def variables(self) -> typing.List[str]:
         """
-        read data array
+        Returns:
+            names of the variables in the file, in order of appearance
+        """
+        return list(dict.fromkeys(varname for varname, _ in self.finfo["index"]))
 
+    def steps(self, varname: str) -> typing.List[int]:
+        """
         Returns:
-            NDArray of shape (rgn, gall)
+            sorted steps stored in the file for varname
+        """
+        return sorted(
+            step for _varname, step in self.finfo["index"] if _varname == varname
+        )
+
+    def find_record(self, varname: str, step: int) -> RecordInfo:
+        """
+        look up a record and check that its data can be read
         """
         finfo = self.finfo
-        did = None
-        for _did in range(finfo["header"]["num_of_data"]):
-            dinfo = finfo["dinfo"][_did]
-            if dinfo["varname"] == varname and dinfo["step"] == step:
-                did = _did
-                break
-        if did is None:
+        if finfo["status"]["opened"] == 0:
+            logger.error(f"{finfo['header']['fname']} is not open!")
+            raise FIOError()
+
+        record = finfo["index"].get((varname, step))
+        if record is None:
             logger.error(f"Data not found: varname={varname} and step={step}")
             raise FIOError()
 
-        fp = finfo["status"]["fp"]
-        offset = finfo["status"]["eoh"]
-        for i in range(did):
-            offset += dinfosize + finfo["dinfo"][i]["datasize"]
-        offset += dinfosize
-        datasize = finfo["dinfo"][did]["datasize"]
-        endian = ">"  # big endian
-        datatype: int = finfo["dinfo"][did]["datatype"]
-        if datatype == FIO_REAL4:
-            dtype = "f4"
-            size = int(datasize / 4)
-        elif datatype == FIO_REAL8:
-            dtype = "f8"
-            size = int(datasize / 8)
-        elif datatype == FIO_INTEGER4:
-            dtype = "i4"
-            size = int(datasize / 4)
-        elif datatype == FIO_INTEGER8:
-            dtype = "i8"
-            size = int(datasize / 8)
-        else:
-            logger.error(f"Unsupported datatype {datatype}")
+        dinfo = finfo["dinfo"][record["did"]]
+        if record["dtype"] is None:
+            logger.error(f"Unsupported datatype {dinfo['datatype']}")
             raise FIOError()
+        size = int(dinfo["datasize"] / precision[dinfo["datatype"]])
 
-        rgn = finfo["header"]["num_of_rgn"]
-        kall = dinfo["num_of_layer"]
-        gall, gall_1d = calc_gall(finfo["header"]["glevel"], finfo["header"]["rlevel"])
-        shape = (rgn, kall, gall)
+        shape = record["shape"]
         if np.prod(shape) != size:
             logger.error(f"Input shape {shape} does not match data size {size}")
             raise FIOError()
-        v_all = np.memmap(
-            fp, dtype=f"{endian}{dtype}", mode="r", offset=offset, shape=shape
+        return record
+
+    def find_records(
+        self, varname: str, steps: typing.Sequence[int]
+    ) -> typing.List[RecordInfo]:
+        """
+        look up the records of several steps, which must share shape and
+        datatype
+        """
+        records = [self.find_record(varname, int(step)) for step in steps]
+        for record in records:
+            if (
+                record["shape"] != records[0]["shape"]
+                or record["dtype"] != records[0]["dtype"]
+            ):
+                logger.error(f"Records of {varname} differ in shape or datatype")
+                raise FIOError()
+        return records
+
+    def read_pe(
+        self,
+        varname: str,
+        step: int,
+        k: int,
+        out: typing.Optional[np.ndarray] = None,
+        dtype: DTypeLike = None,
+        native: bool = False,
+    ):
+        """
+        read data array
+
+        Without out, dtype or native, a read-only view in file byte order
+        is returned. Otherwise the layer is copied in one pass (byteswap,
+        halo strip and cast) into a native-endian C-contiguous array.
+
+        Args:
+            out: C-contiguous NDArray of shape (rgn, gall_in) to write into
+            dtype: dtype of the returned array, e.g. np.float32
+
+        Returns:
+            NDArray of shape (rgn, gall_in)
+        """
+        finfo = self.finfo
+        record = self.find_record(varname, step)
+        shape = record["shape"]
+        rgn = shape[0]
+        _, gall_1d = calc_gall(finfo["header"]["glevel"], finfo["header"]["rlevel"])
+        v_all = np.ndarray(
+            shape, dtype=record["dtype"], buffer=self.mmap(), offset=record["offset"]
         )[:, k, :]
-        return v_all.reshape((rgn, gall_1d, gall_1d))[
+        v_in = v_all.reshape((rgn, gall_1d, gall_1d))[
             :,
             1 : gall_1d - 1,
             1 : gall_1d - 1,
-        ].reshape((rgn, (gall_1d - 2) ** 2))
+        ]
+        if out is None and dtype is None and not native:
+            return v_in.reshape((rgn, (gall_1d - 2) ** 2))
+        return copy_to(v_in, out, dtype).reshape((rgn, (gall_1d - 2) ** 2))
+
+    async def aread_pe(
+        self,
+        varname: str,
+        step: int,
+        k: int,
+        dtype: DTypeLike = None,
+        executor: typing.Optional[Executor] = None,
+    ):
+        """
+        read_pe for asyncio; the layer is copied on executor (the bounded
+        default executor of the event loop if None) into a new
+        native-endian array
+
+        Returns:
+            NDArray of shape (rgn, gall_in)
+        """
+        loop = asyncio.get_running_loop()
+        read = functools.partial(
+            self.read_pe, varname, step, k, dtype=dtype, native=True
+        )
+        return await loop.run_in_executor(executor, read)
+
+    def read_block(
+        self,
+        varname: str,
+        steps: typing.Union[int, typing.Sequence[int]],
+        ks: typing.Union[int, typing.Sequence[int], None] = None,
+        out: typing.Optional[np.ndarray] = None,
+        dtype: DTypeLike = None,
+        max_gap: int = dinfosize,
+        buffer_size: int = 64 * 1024**2,
+    ):
+        """
+        read several steps and layers of a variable at once
+
+        Records that lie close to each other in the file (at most max_gap
+        bytes apart, i.e. only a dinfo header in between by default) are
+        fetched with a single read of up to buffer_size bytes.
+
+        Args:
+            varname: variable name
+            steps: step or sequence of steps, e.g. range(1, 25)
+            ks: layer or sequence of layers, all layers if None
+            out: C-contiguous NDArray of shape (nstep, rgn, nk, gall_in)
+                to write into instead of allocating a new array
+            dtype: dtype of the new array if out is None, native-endian
+                file dtype if None
+
+        Returns:
+            NDArray of shape (nstep, rgn, nk, gall_in)
+        """
+        finfo = self.finfo
+        steps = np.atleast_1d(steps)
+        records = self.find_records(varname, steps)
+        shape = records[0]["shape"]
+        file_dtype = records[0]["dtype"]
+
+        rgn, kall, gall = shape
+        _, gall_1d = calc_gall(finfo["header"]["glevel"], finfo["header"]["rlevel"])
+        ks = np.arange(kall) if ks is None else np.atleast_1d(np.arange(kall)[ks])
+        out_shape = (len(steps), rgn, len(ks), (gall_1d - 2) ** 2)
+        if out is None:
+            if dtype is None:
+                dtype = np.dtype(file_dtype).newbyteorder("=")
+            out = np.empty(out_shape, dtype=dtype)
+        elif out.shape != out_shape or not out.flags.c_contiguous:
+            raise ValueError(f"'out' must be a C-contiguous array of shape {out_shape}")
+        k_index = as_slice(ks)
+
+        fp = finfo["status"]["fp"]
+        datasize = int(np.prod(shape)) * np.dtype(file_dtype).itemsize
+        order = sorted(range(len(records)), key=lambda n: records[n]["offset"])
+        runs: typing.List[typing.List[int]] = []
+        for n in order:
+            if runs:
+                start = records[runs[-1][0]]["offset"]
+                end = records[runs[-1][-1]]["offset"] + datasize
+                offset = records[n]["offset"]
+                if offset - end <= max_gap and offset + datasize - start <= buffer_size:
+                    runs[-1].append(n)
+                    continue
+            runs.append([n])
+
+        for run in runs:
+            start = records[run[0]]["offset"]
+            end = records[run[-1]]["offset"] + datasize
+            buf = pread(fp, end - start, start)
+            for n in run:
+                v_all = np.frombuffer(
+                    buf,
+                    dtype=file_dtype,
+                    count=int(np.prod(shape)),
+                    offset=records[n]["offset"] - start,
+                ).reshape((rgn, kall, gall_1d, gall_1d))
+                # halo strip, layer selection, byteswap and cast in one copy
+                out[n].reshape((rgn, len(ks), gall_1d - 2, gall_1d - 2))[...] = v_all[
+                    :, k_index, 1 : gall_1d - 1, 1 : gall_1d - 1
+                ]
+        return out
+
+    def read_points(
+        self,
+        varname: str,
+        points: np.ndarray,
+        steps: typing.Union[int, typing.Sequence[int], None] = None,
+        ks: typing.Union[int, typing.Sequence[int], None] = None,
+        index: typing.Optional["CellIndex"] = None,
+        dtype: DTypeLike = None,
+        max_gap: int = 4096,
+    ):
+        """
+        read time series at a few cells
+
+        The byte offset of every value is computed from the record index and
+        only these values are read; offsets at most max_gap bytes apart are
+        fetched with a single read.
+
+        Args:
+            varname: variable name
+            points: (region, ij) pairs of shape (npoints, 2) with region ids
+                of this file and inner grid point numbers, or (lat, lon)
+                pairs [deg] if index is given
+            steps: step or sequence of steps, all steps of varname if None
+            ks: layer or sequence of layers, all layers if None
+            index: CellIndex placing (lat, lon) points at the nearest cell
+            dtype: dtype of the returned array, native-endian file dtype
+                if None
+
+        Returns:
+            NDArray of shape (nstep, nk, npoints)
+        """
+        finfo = self.finfo
+        l, ij = as_cells(points, index)
+        steps = self.steps(varname) if steps is None else np.atleast_1d(steps)
+        records = self.find_records(varname, steps)
+        _, kall, gall = records[0]["shape"]
+        file_dtype = np.dtype(records[0]["dtype"])
+        ks = np.arange(kall) if ks is None else np.atleast_1d(np.arange(kall)[ks])
+
+        position = {int(r): n for n, r in enumerate(finfo["header"]["rgnid"])}
+        missing = [int(r) for r in l if int(r) not in position]
+        if missing:
+            logger.error(f"Regions {missing} are not in {finfo['header']['fname']}")
+            raise FIOError()
+        nmax = calc_gall(finfo["header"]["glevel"], finfo["header"]["rlevel"])[1] - 2
+        if ij.min(initial=0) < 0 or ij.max(initial=0) >= nmax * nmax:
+            raise ValueError(f"'ij' must be in [0, {nmax * nmax})")
+        r = np.array([position[int(region)] for region in l], dtype=np.int64)
+        # inner grid point -> grid point with halo
+        j, i = np.divmod(ij, nmax)
+        g = (j + 1) * (nmax + 2) + (i + 1)
+
+        # (nstep, nk, npoints) byte offsets
+        offset = np.array([record["offset"] for record in records], dtype=np.int64)
+        element = (r[np.newaxis, :] * kall + ks[:, np.newaxis]) * gall + g
+        offsets = offset[:, np.newaxis, np.newaxis] + element * file_dtype.itemsize
+        values = pread_points(finfo["status"]["fp"], offsets, file_dtype, max_gap)
+        if dtype is None:
+            dtype = file_dtype.newbyteorder("=")
+        return values.astype(dtype, copy=False)
+
+    def iter_steps(
+        self,
+        varname: str,
+        k: int,
+        steps: typing.Optional[typing.Iterable[int]] = None,
+        depth: int = 2,
+        dtype: DTypeLike = None,
+    ) -> typing.Iterator[typing.Tuple[int, np.ndarray]]:
+        """
+        stream steps of one layer while the next depth steps are read on a
+        background thread
+
+        Args:
+            steps: steps to read, all steps of varname if None
+            depth: number of steps read ahead
+            dtype: dtype of the buffers, native-endian file dtype if None
+
+        Yields:
+            (step, NDArray of shape (rgn, gall_in)); the array is reused
+            once the next step is requested
+        """
+        if steps is None:
+            steps = self.steps(varname)
+        steps = list(steps)
+        if len(steps) == 0:
+            return
+        record = self.find_record(varname, steps[0])
+        if dtype is None:
+            dtype = np.dtype(record["dtype"]).newbyteorder("=")
+        _, gall_1d = calc_gall(
+            self.finfo["header"]["glevel"], self.finfo["header"]["rlevel"]
+        )
+        shape = (record["shape"][0], (gall_1d - 2) ** 2)
+
+        def read(step: int, out: np.ndarray):
+            self.read_pe(varname, step, k, out=out)
+
+        yield from iter_prefetch(read, steps, shape, dtype, depth)
 
 
 def bytes_to_str(b: bytes):
     return b.decode("ascii").rstrip("\x00")
+
+
+def pread(fp: typing.BinaryIO, size: int, offset: int) -> bytes:
+    """
+    read size bytes at offset without relying on the file position; safe to
+    call from several threads on one file object
+    """
+    if hasattr(os, "pread"):
+        b = os.pread(fp.fileno(), size, offset)
+    else:
+        with seek_lock:
+            fp.seek(offset, os.SEEK_SET)
+            b = fp.read(size)
+    if len(b) != size:
+        logger.error(f"Unexpected end of file at offset {offset}")
+        raise FIOError()
+    return b
+
+
+def pread_points(
+    fp: typing.BinaryIO,
+    offsets: np.ndarray,
+    dtype: DTypeLike,
+    max_gap: int = 4096,
+    buffer_size: int = 64 * 1024**2,
+) -> np.ndarray:
+    """
+    read single values at arbitrary byte offsets; offsets at most max_gap
+    bytes apart are coalesced into one read of up to buffer_size bytes
+
+    Args:
+        offsets: NDArray of byte offsets of any shape
+        dtype: dtype of the values in the file
+
+    Returns:
+        NDArray of shape offsets.shape in the file dtype
+    """
+    dtype = np.dtype(dtype)
+    itemsize = dtype.itemsize
+    flat = np.ravel(offsets).astype(np.int64)
+    order = np.argsort(flat, kind="stable")
+    sorted_offsets = flat[order]
+    # a new read starts after a gap of more than max_gap bytes ...
+    new_run = np.ones(len(flat), dtype=bool)
+    new_run[1:] = sorted_offsets[1:] - sorted_offsets[:-1] - itemsize > max_gap
+    run_start = sorted_offsets[new_run][np.cumsum(new_run) - 1]
+    # ... or every buffer_size bytes within a run
+    piece = (sorted_offsets - run_start) // max(buffer_size, itemsize)
+    new_run[1:] |= piece[1:] != piece[:-1]
+    bounds = np.append(np.flatnonzero(new_run), len(flat))
+
+    values = np.empty(len(flat), dtype=dtype)
+    sorted_values = np.empty(len(flat), dtype=dtype)
+    byte = np.arange(itemsize)
+    for first, last in zip(bounds[:-1], bounds[1:]):
+        start = int(sorted_offsets[first])
+        end = int(sorted_offsets[last - 1]) + itemsize
+        buf = np.frombuffer(pread(fp, end - start, start), dtype=np.uint8)
+        relative = sorted_offsets[first:last] - start
+        sorted_values[first:last] = buf[relative[:, np.newaxis] + byte].view(dtype)[
+            :, 0
+        ]
+    values[order] = sorted_values
+    return values.reshape(np.shape(offsets))
@@ -0,0 +1,366 @@
+import typing
+import os
+from logging import getLogger
+import numpy as np
+from ..util import calc_gall, calc_lall
+from .PandaReader import (
+    FIO_BIG_ENDIAN,
+    FIO_FAPPEND,
+    FIO_FWRITE,
+    FIO_ICOSAHEDRON,
+    FIO_INTEG_FILE,
+    FIO_LITTLE_ENDIAN,
+    FIO_SPLIT_FILE,
+    FIOError,
+    FileInfo,
+    HeaderInfo,
+    PandaReader,
+    StatusInfo,
+    dinfo_dtype,
+    dtypes,
+    pkginfo_dtype,
+)
+
+logger = getLogger(__name__)
+
+
+class PandaWriter:
+    """
+    Write half of the Advanced file I/O module (CORE)
+
+    The package header and every dinfo record are serialized from the
+    structured dtypes shared with PandaReader. A record is written as its
+    dinfo followed by the (rgn, kall, gall) array through one buffered file
+    object, so many small records cost few system calls and a large array
+    goes to the file without an intermediate copy if it is already in the
+    file dtype. num_of_data in the header is updated by flush and fclose;
+    a file cut short after a flush stays readable up to that point, and
+    appending to it drops whatever follows the last counted record.
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        glevel: typing.Optional[int] = None,
+        rlevel: typing.Optional[int] = None,
+        rgnid: typing.Optional[typing.Sequence[int]] = None,
+        rwmode: int = FIO_FWRITE,
+        description: str = "",
+        note: str = "",
+        endian: str = ">",
+        fmode: int = FIO_SPLIT_FILE,
+        buffer_size: int = 64 * 1024**2,
+    ):
+        """
+        Args:
+            filename: path to the PE file
+            glevel: nicam glevel, required unless appending to a file
+            rlevel: nicam rlevel, required unless appending to a file
+            rgnid: regions of the file, required unless appending to a file
+            rwmode: FIO_FWRITE to create the file, FIO_FAPPEND to add
+                records to it (created if missing)
+            description: package description
+            note: package note
+            endian: byte order ">" or "<" of header and data of a new file
+            fmode: FIO_SPLIT_FILE or FIO_INTEG_FILE
+            buffer_size: size of the write buffer
+        """
+        if rwmode not in [FIO_FWRITE, FIO_FAPPEND]:
+            raise ValueError("'rwmode' must be FIO_FWRITE or FIO_FAPPEND")
+        if endian not in [">", "<"]:
+            raise ValueError("'endian' must be '>' or '<'")
+        append = rwmode == FIO_FAPPEND and os.path.exists(filename)
+        if append:
+            reader = PandaReader(filename, metadata_only=True)
+            header = reader.finfo["header"]
+            for name, value in [("glevel", glevel), ("rlevel", rlevel)]:
+                if value is not None and header[name] != value:
+                    logger.error(f"{filename} has {name}={header[name]}")
+                    raise FIOError()
+            if rgnid is not None and not np.array_equal(header["rgnid"], rgnid):
+                logger.error(f"{filename} has other regions")
+                raise FIOError()
+            endian = reader.finfo["status"]["endian"]
+            dinfo = reader.finfo["dinfo"]
+            index = reader.finfo["index"]
+            # records are contiguous after the header; anything beyond the
+            # num_of_data counted records is left over from an interrupted
+            # write
+            end = reader.finfo["status"]["eoh"] + sum(
+                dinfo_dtype.itemsize + d["datasize"] for d in dinfo
+            )
+            fp = open(filename, "r+b", buffering=buffer_size)
+            fp.seek(end, os.SEEK_SET)
+            fp.truncate()
+        else:
+            if glevel is None or rlevel is None or rgnid is None:
+                raise ValueError("'glevel', 'rlevel' and 'rgnid' are required")
+            rgnid = np.asarray(rgnid, dtype=int)
+            header = {
+                "fname": filename,
+                "description": description,
+                "note": note,
+                "fmode": fmode,
+                "endiantype": FIO_BIG_ENDIAN if endian == ">" else FIO_LITTLE_ENDIAN,
+                "grid_topology": FIO_ICOSAHEDRON,
+                "glevel": glevel,
+                "rlevel": rlevel,
+                "num_of_rgn": len(rgnid),
+                "rgnid": rgnid,
+                "num_of_data": 0,
+            }
+            dinfo = []
+            index = {}
+            fp = open(filename, "wb", buffering=buffer_size)
+        status: StatusInfo = {
+            "rwmode": rwmode,
+            "opened": 1,
+            "fp": fp,
+            "eoh": pkginfo_dtype.itemsize + 4 * (header["num_of_rgn"] + 1),
+            "endian": endian,
+            "mm": None,
+        }
+        self.finfo: FileInfo = {
+            "header": typing.cast(HeaderInfo, header),
+            "dinfo": dinfo,
+            "index": index,
+            "status": status,
+        }
+        self.written = header["num_of_data"]
+        if not append:
+            self.write_pkginfo()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.fclose()
+
+    def write_pkginfo(self):
+        """
+        write package information, the rgnid list and num_of_data
+        """
+        header = self.finfo["header"]
+        endian = self.finfo["status"]["endian"]
+        pkginfo = np.zeros(1, dtype=pkginfo_dtype.newbyteorder(endian))
+        for name in pkginfo_dtype.names:
+            value = header[name]  # type: ignore
+            pkginfo[name] = value.encode("ascii") if isinstance(value, str) else value
+        rgnid = np.append(header["rgnid"], header["num_of_data"]).astype(f"{endian}i4")
+        fp = self.finfo["status"]["fp"]
+        fp.seek(0, os.SEEK_SET)
+        fp.write(pkginfo.tobytes() + rgnid.tobytes())
+
+    def write_pe(
+        self,
+        varname: str,
+        step: int,
+        data: np.ndarray,
+        description: str = "",
+        unit: str = "",
+        layername: str = "",
+        note: str = "",
+        time_start: int = 0,
+        time_end: int = 0,
+        datatype: typing.Optional[int] = None,
+    ):
+        """
+        write a record
+
+        Args:
+            varname: variable name
+            step: step
+            data: NDArray of shape (rgn, kall, gall), or (rgn, kall, gall_in)
+                written with a halo of zeros
+            datatype: FIO_REAL4, FIO_REAL8, FIO_INTEGER4 or FIO_INTEGER8,
+                from the dtype of data if None
+        """
+        finfo = self.finfo
+        if finfo["status"]["opened"] == 0:
+            logger.error(f"{finfo['header']['fname']} is not open!")
+            raise FIOError()
+        header = finfo["header"]
+        gall, gall_1d = calc_gall(header["glevel"], header["rlevel"])
+        data = np.asarray(data)
+        if datatype is None:
+            kinds = [np.dtype(d).str[1:] for d in dtypes]
+            if data.dtype.str[1:] not in kinds:
+                raise ValueError(f"no FIO datatype for {data.dtype}")
+            datatype = kinds.index(data.dtype.str[1:])
+        if data.ndim != 3 or data.shape[0] != header["num_of_rgn"]:
+            raise ValueError(
+                f"'data' must be of shape ({header['num_of_rgn']}, kall, gall)"
+            )
+        rgn, kall, ncell = data.shape
+        if ncell == (gall_1d - 2) ** 2:
+            with_halo = np.zeros((rgn, kall, gall_1d, gall_1d), dtype=data.dtype)
+            with_halo[..., 1 : gall_1d - 1, 1 : gall_1d - 1] = data.reshape(
+                (rgn, kall, gall_1d - 2, gall_1d - 2)
+            )
+            data = with_halo.reshape((rgn, kall, gall))
+        elif ncell != gall:
+            raise ValueError(f"the last axis of 'data' must be {gall} or gall_in")
+
+        data_endian = "<" if header["endiantype"] == FIO_LITTLE_ENDIAN else ">"
+        file_dtype = f"{data_endian}{dtypes[datatype]}"
+        # byteswap and cast in one copy, none if data is in the file dtype
+        array = np.ascontiguousarray(data, dtype=file_dtype)
+        endian = finfo["status"]["endian"]
+        record = np.zeros(1, dtype=dinfo_dtype.newbyteorder(endian))
+        fields = {
+            "varname": varname,
+            "description": description,
+            "unit": unit,
+            "layername": layername,
+            "note": note,
+            "datasize": array.nbytes,
+            "datatype": datatype,
+            "num_of_layer": kall,
+            "step": step,
+            "time_start": time_start,
+            "time_end": time_end,
+        }
+        for name, value in fields.items():
+            record[name] = value.encode("ascii") if isinstance(value, str) else value
+
+        fp = finfo["status"]["fp"]
+        offset = fp.tell() + record.nbytes
+        fp.write(record.tobytes())
+        fp.write(memoryview(array).cast("B"))
+        finfo["dinfo"].append(typing.cast(typing.Any, fields))
+        finfo["index"].setdefault(
+            (varname, step),
+            {
+                "did": len(finfo["dinfo"]) - 1,
+                "offset": offset,
+                "dtype": file_dtype,
+                "shape": (rgn, kall, gall),
+            },
+        )
+        header["num_of_data"] += 1
+
+    def flush(self):
+        """
+        write the buffered records and update num_of_data in the header
+        """
+        finfo = self.finfo
+        fp = finfo["status"]["fp"]
+        header = finfo["header"]
+        if header["num_of_data"] != self.written:
+            end = fp.tell()
+            endian = finfo["status"]["endian"]
+            count = np.array([header["num_of_data"]], dtype=f"{endian}i4")
+            fp.seek(finfo["status"]["eoh"] - count.nbytes, os.SEEK_SET)
+            fp.write(count.tobytes())
+            fp.seek(end, os.SEEK_SET)
+            self.written = header["num_of_data"]
+        fp.flush()
+
+    def fclose(self):
+        """
+        flush and close file IO stream
+        """
+        if self.finfo["status"]["opened"] == 0:
+            return
+        self.flush()
+        self.finfo["status"]["fp"].close()
+        self.finfo["status"]["opened"] = 0
+
+
+def repartition(
+    filenames: typing.Sequence[str],
+    output: str,
+    num_of_pe: int,
+    variables: typing.Optional[typing.Sequence[str]] = None,
+    steps: typing.Optional[typing.Sequence[int]] = None,
+) -> typing.List[str]:
+    """
+    rewrite the regions of PE files into num_of_pe files, each holding a
+    contiguous block of regions as NICAM distributes them; one record of
+    one output file is in memory at a time
+
+    Args:
+        filenames: PE files of a run
+        output: format string of the output files with the PE number as pe,
+            e.g. "history.pe{pe:06d}"
+        num_of_pe: number of output files
+        variables: variables to write, all variables if None
+        steps: steps to write, all steps if None
+
+    Returns:
+        paths of the output files
+    """
+    readers = [PandaReader(filename) for filename in filenames]
+    try:
+        first = readers[0].finfo
+        glevel = first["header"]["glevel"]
+        rlevel = first["header"]["rlevel"]
+        owner: typing.Dict[int, typing.Tuple[PandaReader, int]] = {}
+        for reader in readers:
+            header = reader.finfo["header"]
+            if header["glevel"] != glevel or header["rlevel"] != rlevel:
+                raise ValueError(f"{header['fname']} has another glevel or rlevel")
+            for r, rgn in enumerate(header["rgnid"]):
+                owner[int(rgn)] = (reader, r)
+        rgnid = np.array(sorted(owner))
+        if num_of_pe < 1 or num_of_pe > len(rgnid):
+            raise ValueError(f"'num_of_pe' must be between 1 and {len(rgnid)}")
+        partition = np.array_split(rgnid, num_of_pe)
+        integ = len(rgnid) == calc_lall(rlevel) and num_of_pe == 1
+        endian = first["status"]["endian"]
+        paths = [output.format(pe=pe) for pe in range(num_of_pe)]
+        writers = [
+            PandaWriter(
+                path,
+                glevel,
+                rlevel,
+                part,
+                description=first["header"]["description"],
+                note=first["header"]["note"],
+                endian=endian,
+                fmode=FIO_INTEG_FILE if integ else FIO_SPLIT_FILE,
+            )
+            for path, part in zip(paths, partition)
+        ]
+        try:
+            # records in the order of the first file
+            for did, dinfo in enumerate(first["dinfo"]):
+                key = (dinfo["varname"], dinfo["step"])
+                if first["index"][key]["did"] != did:
+                    continue
+                if variables is not None and key[0] not in variables:
+                    continue
+                if steps is not None and key[1] not in steps:
+                    continue
+                blocks = {}
+                for reader in set(r for r, _ in owner.values()):
+                    record = reader.find_record(*key)
+                    blocks[reader] = np.ndarray(
+                        record["shape"],
+                        dtype=record["dtype"],
+                        buffer=reader.mmap(),
+                        offset=record["offset"],
+                    )
+                for writer, part in zip(writers, partition):
+                    data = np.stack(
+                        [blocks[owner[rgn][0]][owner[rgn][1]] for rgn in part]
+                    )
+                    writer.write_pe(
+                        dinfo["varname"],
+                        dinfo["step"],
+                        data,
+                        dinfo["description"],
+                        dinfo["unit"],
+                        dinfo["layername"],
+                        dinfo["note"],
+                        dinfo["time_start"],
+                        dinfo["time_end"],
+                        dinfo["datatype"],
+                    )
+        finally:
+            for writer in writers:
+                writer.fclose()
+    finally:
+        for reader in readers:
+            reader.fclose()
+    return paths
@@ -1,5 +1,14 @@
 from .LegacyReader import LegacyReader
 from .PandaReader import PandaReader
+from .PandaWriter import PandaWriter, repartition
 from .NetcdfReader import NetcdfReader
+from .GlobalReader import GlobalReader
 
-__all__ = ["LegacyReader", "PandaReader", "NetcdfReader"]
+__all__ = [
+    "LegacyReader",
+    "PandaReader",
+    "PandaWriter",
+    "NetcdfReader",
+    "GlobalReader",
+    "repartition",
+]
@@ -0,0 +1,191 @@
+import typing
+import numpy as np
+import scipy.spatial
+from ..grids.mod_grid import hexagon_vertex_index
+from .Regridder import to_xyz
+
+if typing.TYPE_CHECKING:
+    from ..grids import GlobalGrids
+    from ..grids.AbstractGrids import AbstractGrids
+
+
+class CellIndex:
+    """
+    Spatial index of the cells of all regions
+
+    A KD-tree over the cell centers on the unit sphere answers nearest-cell
+    queries for arrays of points. The hexagon (pentagon) vertices of every
+    cell are kept to find the cell containing a point among the nearest
+    cell centers.
+
+    Cells are numbered l * gall_in + ij, the order of get_lonlat_c().
+    """
+
+    def __init__(
+        self,
+        xyz_c: np.ndarray,
+        xyz_v: np.ndarray,
+        gall_in: int,
+    ):
+        """
+        Args:
+            xyz_c: cell centers on the unit sphere of shape (ncell, 3)
+            xyz_v: hexagon vertices on the unit sphere of shape (ncell, 6, 3)
+            gall_in: number of inner grid points per region
+        """
+        self.xyz_c = np.asarray(xyz_c, dtype=float)
+        self.xyz_v = np.asarray(xyz_v, dtype=np.float32)
+        self.gall_in = gall_in
+        if len(self.xyz_c) % gall_in != 0 or self.xyz_v.shape != (
+            len(self.xyz_c),
+            6,
+            3,
+        ):
+            raise ValueError("cell centers and vertices do not match")
+        self.lall = len(self.xyz_c) // gall_in
+        self.tree = scipy.spatial.cKDTree(self.xyz_c)
+
+    @classmethod
+    def from_grids(
+        cls, grids: typing.Union["GlobalGrids", typing.Sequence["AbstractGrids"]]
+    ):
+        """
+        Args:
+            grids: GlobalGrids, or grids of every region in region order
+        """
+        if hasattr(grids, "grd_x"):
+            grd_x = np.asarray(grids.grd_x)  # type: ignore
+            grd_xt = np.asarray(grids.grd_xt)  # type: ignore
+        else:
+            grd_x = np.stack([g.grd_x for g in grids])  # type: ignore
+            grd_xt = np.stack([g.grd_xt for g in grids])  # type: ignore
+        lall, _, gall = grd_x.shape
+        gall_1d = int(np.sqrt(gall))
+        # (lall, 3, gall) -> (lall, gall_in, 3)
+        x = grd_x.reshape((lall, 3, gall_1d, gall_1d))[
+            :, :, 1 : gall_1d - 1, 1 : gall_1d - 1
+        ]
+        x = x.reshape((lall, 3, -1)).transpose(0, 2, 1)
+        # (lall, 3, 2, gall) -> (lall, gall_in, 6, 3)
+        index = hexagon_vertex_index(gall_1d)
+        v = grd_xt.reshape((lall, 3, 2 * gall))[:, :, index].transpose(0, 2, 3, 1)
+        gall_in = x.shape[1]
+        return cls(
+            normalize(x.reshape((-1, 3))), normalize(v.reshape((-1, 6, 3))), gall_in
+        )
+
+    def save(self, filename: str):
+        """
+        store centers and vertices in a .npz file; the KD-tree is rebuilt
+        on load
+        """
+        np.savez(
+            filename,
+            xyz_c=self.xyz_c,
+            xyz_v=self.xyz_v,
+            gall_in=np.array(self.gall_in),
+        )
+
+    @classmethod
+    def load(cls, filename: str):
+        with np.load(filename) as f:
+            return cls(f["xyz_c"], f["xyz_v"], int(f["gall_in"]))
+
+    def split(self, cell: np.ndarray) -> typing.Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns:
+            l: region of the cells, -1 where cell is -1
+            ij: inner grid point of the cells, -1 where cell is -1
+        """
+        l, ij = np.divmod(cell, self.gall_in)
+        return np.where(cell < 0, -1, l), np.where(cell < 0, -1, ij)
+
+    def nearest(
+        self, lon: np.ndarray, lat: np.ndarray
+    ) -> typing.Tuple[np.ndarray, np.ndarray]:
+        """
+        Args:
+            lon: longitudes [deg] of any shape
+            lat: latitudes [deg] of the same shape
+
+        Returns:
+            l: region of the nearest cell center, of the shape of lon
+            ij: inner grid point of the nearest cell center
+        """
+        lon, lat = np.broadcast_arrays(lon, lat)
+        _, cell = self.tree.query(normalize(to_xyz(lon.ravel(), lat.ravel())))
+        l, ij = self.split(cell)
+        return l.reshape(lon.shape), ij.reshape(lon.shape)
+
+    def locate(
+        self,
+        lon: np.ndarray,
+        lat: np.ndarray,
+        k: int = 3,
+        tolerance: float = 1e-6,
+        block: int = 65536,
+    ) -> typing.Tuple[np.ndarray, np.ndarray]:
+        """
+        find the hexagon containing every point among the cells of the k
+        nearest centers
+
+        Args:
+            lon: longitudes [deg] of any shape
+            lat: latitudes [deg] of the same shape
+            k: number of candidate cells per point
+            tolerance: distance [rad] a point may lie outside a hexagon edge
+            block: points located at once, bounds the memory use
+
+        Returns:
+            l: region of the containing cell, of the shape of lon; -1 where
+                no candidate contains the point (e.g. at the poles, which
+                belong to no region)
+            ij: inner grid point of the containing cell, -1 likewise
+        """
+        lon, lat = np.broadcast_arrays(lon, lat)
+        xyz = normalize(to_xyz(lon.ravel(), lat.ravel()))
+        cell = np.full(len(xyz), -1)
+        for start in range(0, len(xyz), block):
+            p = xyz[start : start + block]
+            _, near = self.tree.query(p, k=k)
+            near = np.reshape(near, (len(p), k))
+            inside = self.contains(near, p, tolerance)
+            found = inside.any(axis=1)
+            first = np.argmax(inside, axis=1)
+            cell[start : start + block] = np.where(
+                found, near[np.arange(len(p)), first], -1
+            )
+        l, ij = self.split(cell)
+        return l.reshape(lon.shape), ij.reshape(lon.shape)
+
+    def contains(
+        self, cell: np.ndarray, xyz: np.ndarray, tolerance: float = 1e-6
+    ) -> np.ndarray:
+        """
+        Args:
+            cell: candidate cells of shape (n, k)
+            xyz: points on the unit sphere of shape (n, 3)
+            tolerance: distance [rad] a point may lie outside a hexagon edge
+
+        Returns:
+            NDArray of bool of shape (n, k)
+        """
+        a = self.xyz_v[cell].astype(float)  # (n, k, 6, 3)
+        b = np.roll(a, -1, axis=2)
+        normal = np.cross(a, b)
+        length = np.linalg.norm(normal, axis=-1)
+        # signed distance of the points to the great circles of the edges
+        with np.errstate(divide="ignore", invalid="ignore"):
+            side = np.einsum("nkec,nc->nke", normal, xyz) / length
+        # the repeated vertex of a pentagon makes an edge of length 0
+        degenerate = length < 1e-12
+        left = (side >= -tolerance) | degenerate
+        right = (side <= tolerance) | degenerate
+        return left.all(axis=-1) | right.all(axis=-1)
+
+
+def normalize(x: np.ndarray) -> np.ndarray:
+    """
+    scale vectors along the last axis to unit length
+    """
+    return x / np.linalg.norm(x, axis=-1, keepdims=True)
@@ -0,0 +1,475 @@
+import typing
+import numpy as np
+import scipy.sparse
+import scipy.spatial
+from ..grids.mod_grid import latlon2xyz
+
+if typing.TYPE_CHECKING:
+    from ..grids import GlobalGrids
+    from ..grids.AbstractGrids import AbstractGrids
+
+methods = ["nearest", "bilinear", "conservative"]
+
+
+class Regridder:
+    """
+    Regridding from icosahedral cells to a regular lat-lon grid
+
+    The weights are computed once into a sparse matrix of shape
+    (nlat * nlon, lall * gall_in) and applied to any number of fields as a
+    single sparse matrix product.
+
+    methods:
+        nearest: value of the nearest cell center
+        bilinear: barycentric interpolation on the triangles spanned by
+            neighbouring cell centers
+        conservative: first-order conservative remapping; the weight of
+            a cell in a box is the area of their overlap, normalized by the
+            covered area of the box. Overlaps are computed exactly in the
+            (lon, sin(lat)) plane, where lat-lon boxes keep their area, with
+            the hexagon edges taken as straight lines there; every cell
+            outline is thus split among the boxes without loss
+    """
+
+    def __init__(
+        self,
+        weights: scipy.sparse.csr_matrix,
+        lon: np.ndarray,
+        lat: np.ndarray,
+        method: str,
+    ):
+        """
+        Args:
+            weights: sparse matrix of shape (nlat * nlon, ncell)
+            lon: target longitudes [deg] of shape (nlon)
+            lat: target latitudes [deg] of shape (nlat)
+            method: method the weights were built with
+        """
+        self.weights = weights.tocsr()
+        self.lon = np.asarray(lon)
+        self.lat = np.asarray(lat)
+        self.method = method
+        if self.weights.shape[0] != len(self.lat) * len(self.lon):
+            raise ValueError("weights do not match the target grid")
+
+    @classmethod
+    def from_grids(
+        cls,
+        grids: typing.Union["GlobalGrids", typing.Sequence["AbstractGrids"]],
+        lon: np.ndarray,
+        lat: np.ndarray,
+        method: str = "bilinear",
+    ):
+        """
+        Args:
+            grids: GlobalGrids, or grids of every region in region order
+            lon: target longitudes [deg] of shape (nlon)
+            lat: target latitudes [deg] of shape (nlat)
+            method: "nearest", "bilinear" or "conservative"
+        """
+        lon_v = lat_v = None
+        if hasattr(grids, "get_lonlat_c"):
+            lon_c, lat_c = grids.get_lonlat_c()  # type: ignore
+            if method == "conservative":
+                lon_v, lat_v = grids.get_lonlat_v()  # type: ignore
+        else:
+            lonlat_c = [g.get_lonlat_c() for g in grids]  # type: ignore
+            lon_c = np.stack([lon for lon, _ in lonlat_c])
+            lat_c = np.stack([lat for _, lat in lonlat_c])
+            if method == "conservative":
+                lonlat_v = [g.get_lonlat_v() for g in grids]  # type: ignore
+                lon_v = np.stack([lon for lon, _ in lonlat_v])
+                lat_v = np.stack([lat for _, lat in lonlat_v])
+        weights = build_weights(
+            np.ravel(lon_c), np.ravel(lat_c), lon, lat, method, lon_v, lat_v
+        )
+        return cls(weights, lon, lat, method)
+
+    def save(self, filename: str):
+        """
+        store weights and target grid in a .npz file
+        """
+        weights = self.weights
+        np.savez(
+            filename,
+            data=weights.data,
+            indices=weights.indices,
+            indptr=weights.indptr,
+            shape=np.array(weights.shape),
+            lon=self.lon,
+            lat=self.lat,
+            method=np.array(self.method),
+        )
+
+    @classmethod
+    def load(cls, filename: str):
+        with np.load(filename) as f:
+            weights = scipy.sparse.csr_matrix(
+                (f["data"], f["indices"], f["indptr"]), shape=tuple(f["shape"])
+            )
+            return cls(weights, f["lon"], f["lat"], str(f["method"]))
+
+    def apply(self, field: np.ndarray) -> np.ndarray:
+        """
+        Args:
+            field: NDArray of shape (..., lall, gall_in), e.g. (lall, gall_in)
+                or (nstep, k, lall, gall_in)
+
+        Returns:
+            NDArray of shape (..., nlat, nlon)
+        """
+        ncell = self.weights.shape[1]
+        if field.shape[-2] * field.shape[-1] != ncell:
+            raise ValueError(f"field must hold {ncell} cells in its last 2 axes")
+        batch = field.shape[:-2]
+        x = field.reshape((-1, ncell))
+        # (ntarget, ncell) @ (ncell, nbatch) -> (ntarget, nbatch)
+        v = self.weights @ x.T
+        v = np.ascontiguousarray(v.T).reshape(batch + (len(self.lat), len(self.lon)))
+        if np.issubdtype(field.dtype, np.floating):
+            v = v.astype(field.dtype, copy=False)
+        return v
+
+
+def build_weights(
+    lon_c: np.ndarray,
+    lat_c: np.ndarray,
+    lon: np.ndarray,
+    lat: np.ndarray,
+    method: str = "bilinear",
+    lon_v: typing.Optional[np.ndarray] = None,
+    lat_v: typing.Optional[np.ndarray] = None,
+    block: int = 65536,
+) -> scipy.sparse.csr_matrix:
+    """
+    Args:
+        lon_c: cell center longitudes [deg] of shape (ncell)
+        lat_c: cell center latitudes [deg] of shape (ncell)
+        lon: target longitudes [deg] of shape (nlon)
+        lat: target latitudes [deg] of shape (nlat)
+        method: "nearest", "bilinear" or "conservative"
+        lon_v: cell vertex longitudes [deg] of shape (ncell, 6), required
+            for "conservative"
+        lat_v: cell vertex latitudes [deg] of shape (ncell, 6), required
+            for "conservative"
+        block: (cell, box) pairs intersected at once for "conservative",
+            bounds the memory use
+
+    Returns:
+        sparse matrix of shape (nlat * nlon, ncell)
+    """
+    if method not in methods:
+        raise ValueError(f"'method' must be one of {methods}")
+    xyz_c = to_xyz(lon_c, lat_c)
+    tree = scipy.spatial.cKDTree(xyz_c)
+    ncell = len(lon_c)
+    lon2d, lat2d = np.meshgrid(lon, lat)
+    ntarget = lon2d.size
+
+    if method == "nearest":
+        _, index = tree.query(to_xyz(lon2d.ravel(), lat2d.ravel()))
+        return scipy.sparse.csr_matrix(
+            (np.ones(ntarget), (np.arange(ntarget), index)), shape=(ntarget, ncell)
+        )
+
+    if method == "bilinear":
+        index, weight = barycentric(xyz_c, tree, to_xyz(lon2d.ravel(), lat2d.ravel()))
+        rows = np.repeat(np.arange(ntarget), 3)
+        return scipy.sparse.csr_matrix(
+            (weight.ravel(), (rows, index.ravel())), shape=(ntarget, ncell)
+        )
+
+    if lon_v is None or lat_v is None:
+        raise ValueError("'lon_v' and 'lat_v' are required for 'conservative'")
+    # conservative: overlap areas of the cell polygons with the boxes
+    x, y = cell_polygons(
+        np.reshape(lon_v, (ncell, -1)), np.reshape(lat_v, (ncell, -1)), lon_c
+    )
+    lon_b = bounds(np.asarray(lon, dtype=float))
+    y_b = np.sin(np.deg2rad(np.clip(bounds(np.asarray(lat, dtype=float)), -90, 90)))
+    rows, cells, areas = [], [], []
+    # cells and boxes are periodic in longitude
+    for shift in [-360.0, 0.0, 360.0]:
+        cell, j, i = candidates(x + shift, y, lon_b, y_b)
+        for start in range(0, len(cell), block):
+            c = cell[start : start + block]
+            jj = j[start : start + block]
+            ii = i[start : start + block]
+            area = overlap_area(
+                x[c] + shift,
+                y[c],
+                lon_b[ii, None],
+                lon_b[ii + 1, None],
+                y_b[jj, None],
+                y_b[jj + 1, None],
+            )
+            keep = area > 0.0
+            rows.append(jj[keep] * len(lon) + ii[keep])
+            cells.append(c[keep])
+            areas.append(area[keep])
+    # duplicate (row, cell) pairs are summed by the conversion to csr
+    weights = scipy.sparse.coo_matrix(
+        (np.concatenate(areas), (np.concatenate(rows), np.concatenate(cells))),
+        shape=(ntarget, ncell),
+    ).tocsr()
+    # normalized by the covered part of every box
+    norm = np.asarray(weights.sum(axis=1)).ravel()
+    norm[norm == 0.0] = 1.0
+    return scipy.sparse.diags(1.0 / norm) @ weights
+
+
+def cell_polygons(
+    lon_v: np.ndarray, lat_v: np.ndarray, lon_c: np.ndarray
+) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """
+    cell outlines in the (lon, sin(lat)) plane, counterclockwise
+
+    Longitudes are unwrapped along every outline starting next to the cell
+    center, and outlines around a pole are closed along the pole line
+    sin(lat) = +-1.
+
+    Args:
+        lon_v: vertex longitudes [deg] of shape (ncell, nv)
+        lat_v: vertex latitudes [deg] of shape (ncell, nv)
+        lon_c: cell center longitudes [deg] of shape (ncell)
+
+    Returns:
+        x: longitudes [deg] of shape (ncell, nv + 3)
+        y: sin(lat) of shape (ncell, nv + 3)
+    """
+    lon_v = np.asarray(lon_v, dtype=float)
+    ncell = len(lon_v)
+    start = np.asarray(lon_c, dtype=float) + wrap(lon_v[:, 0] - lon_c)
+    step = wrap(np.diff(lon_v, axis=1, append=lon_v[:, :1]))
+    x = start[:, None] + np.concatenate(
+        [np.zeros((ncell, 1)), np.cumsum(step, axis=1)], axis=1
+    )
+    y = np.sin(np.deg2rad(np.asarray(lat_v, dtype=float)))
+    y = np.concatenate([y, y[:, :1]], axis=1)
+    # an outline around a pole ends a full turn away from its start; it is
+    # closed by (x_end, pole) and (x_start, pole), the others repeat their
+    # first vertex
+    turn = np.abs(x[:, -1] - x[:, 0]) > 180.0
+    pole = np.where(turn, np.sign(y.mean(axis=1)), y[:, 0])[:, None]
+    x = np.concatenate([x, x[:, -1:], x[:, :1]], axis=1)
+    y = np.concatenate([y, pole, pole], axis=1)
+    # counterclockwise by the shoelace formula
+    signed = np.sum(x * np.roll(y, -1, axis=1) - np.roll(x, -1, axis=1) * y, axis=1)
+    reverse = signed < 0
+    x[reverse] = x[reverse, ::-1]
+    y[reverse] = y[reverse, ::-1]
+    return x, y
+
+
+def candidates(
+    x: np.ndarray, y: np.ndarray, lon_b: np.ndarray, y_b: np.ndarray
+) -> typing.Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    boxes overlapping the bounding box of every cell outline
+
+    Args:
+        x, y: cell outlines of shape (ncell, n)
+        lon_b: box bounds in longitude of shape (nlon + 1)
+        y_b: box bounds in sin(lat) of shape (nlat + 1)
+
+    Returns:
+        cell, j, i: cells and (lat, lon) box indices of the candidate pairs
+    """
+    i_lo, i_hi = box_range(lon_b, x.min(axis=1), x.max(axis=1))
+    j_lo, j_hi = box_range(y_b, y.min(axis=1), y.max(axis=1))
+    ni = np.maximum(i_hi - i_lo + 1, 0)
+    nj = np.maximum(j_hi - j_lo + 1, 0)
+    count = ni * nj
+    cell = np.repeat(np.arange(len(x)), count)
+    rank = np.arange(len(cell)) - np.repeat(np.cumsum(count) - count, count)
+    i = i_lo[cell] + rank % ni[cell]
+    j = j_lo[cell] + rank // ni[cell]
+    return cell, j, i
+
+
+def box_range(
+    b: np.ndarray, lo: np.ndarray, hi: np.ndarray
+) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns:
+        first and last box with bounds b (ascending or descending) that
+        overlap [lo, hi]; last < first if none does
+    """
+    n = len(b) - 1
+    if b[0] <= b[-1]:
+        first = np.searchsorted(b, lo, side="right") - 1
+        last = np.searchsorted(b, hi, side="left") - 1
+    else:
+        first = n - np.searchsorted(b[::-1], hi, side="left")
+        last = n - np.searchsorted(b[::-1], lo, side="right")
+    first = np.maximum(first, 0)
+    last = np.minimum(last, n - 1)
+    return first, last
+
+
+def overlap_area(
+    x: np.ndarray,
+    y: np.ndarray,
+    x0: np.ndarray,
+    x1: np.ndarray,
+    y0: np.ndarray,
+    y1: np.ndarray,
+) -> np.ndarray:
+    """
+    area of counterclockwise polygons within boxes
+
+    By Green's theorem the area of a polygon within [x0, x1] x [y0, y1] is
+    minus the integral of clip(y, y0, y1) - y0 along its edges, restricted
+    to x0 <= x <= x1. On every edge this integrand is piecewise linear in x
+    with breaks where the edge crosses y0 or y1, so the trapezoid rule on
+    the breaks is exact.
+
+    Args:
+        x, y: polygons of shape (m, n)
+        x0, x1, y0, y1: boxes of shape (m, 1), in any order of the bounds
+
+    Returns:
+        areas [deg] of shape (m), times pi / 180 for steradians
+    """
+    x0, x1 = np.minimum(x0, x1), np.maximum(x0, x1)
+    y0, y1 = np.minimum(y0, y1), np.maximum(y0, y1)
+    xa, ya = x, y
+    xb, yb = np.roll(x, -1, axis=1), np.roll(y, -1, axis=1)
+    forward = xb > xa
+    lo = np.where(forward, xa, xb)
+    hi = np.where(forward, xb, xa)
+    y_lo = np.where(forward, ya, yb)
+    y_hi = np.where(forward, yb, ya)
+    u0 = np.maximum(lo, x0)
+    u1 = np.minimum(hi, x1)
+    slope = (y_hi - y_lo) / np.where(hi > lo, hi - lo, 1.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        c0 = lo + (y0 - y_lo) / slope
+        c1 = lo + (y1 - y_lo) / slope
+    c0 = np.where(np.isnan(c0), u0, c0)
+    c1 = np.where(np.isnan(c1), u0, c1)
+    u = np.stack([u0, np.clip(c0, u0, u1), np.clip(c1, u0, u1), u1], axis=-1)
+    u.sort(axis=-1)
+    h = np.clip(
+        y_lo[..., None] + slope[..., None] * (u - lo[..., None]),
+        y0[..., None],
+        y1[..., None],
+    )
+    h -= y0[..., None]
+    integral = np.sum(0.5 * (h[..., 1:] + h[..., :-1]) * np.diff(u, axis=-1), axis=-1)
+    integral = np.where(u1 > u0, integral, 0.0)
+    return np.sum(np.where(forward, -integral, integral), axis=1)
+
+
+def wrap(lon: np.ndarray) -> np.ndarray:
+    """
+    Returns:
+        lon [deg] wrapped into [-180, 180)
+    """
+    return (np.asarray(lon) + 180.0) % 360.0 - 180.0
+
+
+def barycentric(
+    xyz_c: np.ndarray,
+    tree: scipy.spatial.cKDTree,
+    xyz: np.ndarray,
+    block: int = 65536,
+) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """
+    locate points in the triangulation of the cell centers
+
+    Args:
+        xyz_c: cell centers of shape (ncell, 3)
+        tree: KD-tree over xyz_c
+        xyz: points of shape (n, 3)
+        block: points located at once, bounds the memory use
+
+    Returns:
+        index: corner cells of shape (n, 3)
+        weight: barycentric weights of shape (n, 3)
+    """
+    # the convex hull of points on a sphere is their spherical Delaunay
+    # triangulation
+    simplices = scipy.spatial.ConvexHull(xyz_c).simplices
+    # triangles incident to every cell, padded with -1
+    corner = simplices.ravel()
+    order = np.argsort(corner, kind="stable")
+    count = np.bincount(corner, minlength=len(xyz_c))
+    start = np.concatenate([[0], np.cumsum(count)[:-1]])
+    incident = np.full((len(xyz_c), count.max()), -1)
+    rank = np.arange(len(corner)) - np.repeat(start, count)
+    incident[corner[order], rank] = order // 3
+
+    n = len(xyz)
+    index = np.empty((n, 3), dtype=int)
+    weight = np.empty((n, 3))
+    for start in range(0, n, block):
+        stop = min(start + block, n)
+        locate(
+            xyz_c, tree, simplices, incident, xyz, np.arange(start, stop), index, weight
+        )
+    return index, weight
+
+
+def locate(
+    xyz_c: np.ndarray,
+    tree: scipy.spatial.cKDTree,
+    simplices: np.ndarray,
+    incident: np.ndarray,
+    xyz: np.ndarray,
+    todo: np.ndarray,
+    index: np.ndarray,
+    weight: np.ndarray,
+):
+    """
+    fill index and weight of the points xyz[todo]
+    """
+    for k in [1, 3]:
+        # candidates: triangles around the k nearest cells
+        _, near = tree.query(xyz[todo], k=k)
+        cand = incident[np.reshape(near, (len(todo), k))].reshape(len(todo), -1)
+        valid = cand >= 0
+        tri = simplices[np.where(valid, cand, 0)]  # (m, ncand, 3)
+        # solve p = w0 * a + w1 * b + w2 * c for every candidate
+        mat = xyz_c[tri].transpose(0, 1, 3, 2)  # columns are the corners
+        rhs = np.broadcast_to(xyz[todo][:, None, :], mat.shape[:-1])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            w = np.linalg.solve(mat, rhs[..., None])[..., 0]
+        inside = valid & (w >= -1e-12).all(axis=-1)
+        found = inside.any(axis=1)
+        first = np.argmax(inside, axis=1)
+        sel = np.flatnonzero(found)
+        w_sel = w[sel, first[sel]]
+        index[todo[sel]] = tri[sel, first[sel]]
+        weight[todo[sel]] = w_sel / w_sel.sum(axis=1, keepdims=True)
+        todo = todo[~found]
+        if len(todo) == 0:
+            break
+    if len(todo) > 0:
+        # not located (degenerate triangles): nearest cell
+        _, near = tree.query(xyz[todo])
+        index[todo] = near[:, None]
+        weight[todo] = [1.0, 0.0, 0.0]
+
+
+def to_xyz(lon: np.ndarray, lat: np.ndarray) -> np.ndarray:
+    """
+    Returns:
+        NDArray of shape (n, 3) on the sphere
+    """
+    lon = np.deg2rad(np.asarray(lon, dtype=float))
+    lat = np.deg2rad(np.asarray(lat, dtype=float))
+    return latlon2xyz(lat, lon).T
+
+
+def bounds(center: np.ndarray) -> np.ndarray:
+    """
+    Returns:
+        cell bounds of shape (n + 1) halfway between the centers
+    """
+    if len(center) == 1:
+        return np.array([center[0] - 0.5, center[0] + 0.5])
+    mid = 0.5 * (center[1:] + center[:-1])
+    return np.concatenate(
+        [[center[0] - (mid[0] - center[0])], mid, [center[-1] + (center[-1] - mid[-1])]]
+    )
@@ -0,0 +1,4 @@
+from .Regridder import Regridder, build_weights
+from .CellIndex import CellIndex
+
+__all__ = ["Regridder", "CellIndex", "build_weights"]
@@ -0,0 +1,257 @@
+import typing
+import numpy as np
+import scipy.sparse
+from ..grids.mod_grid import radius
+
+if typing.TYPE_CHECKING:
+    from ..grids import GlobalGrids
+    from ..reader import GlobalReader
+
+
+class Summary(typing.NamedTuple):
+    """
+    Area-weighted statistics of fields
+
+    mean, variance, minimum, maximum: NDArray of the leading shape of the
+        fields, e.g. (nstep, nk)
+    argmin, argmax: flat cell index l * gall_in + ij of minimum and maximum
+    zonal_mean: NDArray of shape (..., nband)
+    """
+
+    mean: np.ndarray
+    variance: np.ndarray
+    minimum: np.ndarray
+    argmin: np.ndarray
+    maximum: np.ndarray
+    argmax: np.ndarray
+    zonal_mean: np.ndarray
+
+
+class Statistics:
+    """
+    Area-weighted reductions over all cells
+
+    Global and zonal means are one sparse matrix product with a matrix of
+    shape (ncell, nband + 1) holding the cell areas in the column of the band
+    of every cell and in the last (global) column, so any number of fields
+    is reduced at once. Cells holding nan, e.g. regions without a file in
+    GlobalReader, are left out of every statistic.
+
+    Fields are NDArrays of shape (..., lall, gall_in) or (..., ncell).
+    """
+
+    def __init__(
+        self,
+        area: np.ndarray,
+        lat: typing.Optional[np.ndarray] = None,
+        bands: typing.Optional[np.ndarray] = None,
+    ):
+        """
+        Args:
+            area: cell areas of shape (lall, gall_in) or (ncell)
+            lat: cell center latitudes [deg] of the shape of area, required
+                for zonal means
+            bands: ascending edges [deg] of the latitude bands, 10 degree
+                bands if None
+        """
+        self.area = np.asarray(area, dtype=np.float64).ravel()
+        self.ncell = len(self.area)
+        self.bands = np.linspace(-90.0, 90.0, 19) if bands is None else bands
+        self.bands = np.asarray(self.bands, dtype=np.float64)
+        nband = len(self.bands) - 1
+        if lat is None:
+            self.band = np.full(self.ncell, -1)
+        else:
+            lat = np.asarray(lat).ravel()
+            if len(lat) != self.ncell:
+                raise ValueError("'lat' must have the shape of 'area'")
+            self.band = np.searchsorted(self.bands, lat, side="right") - 1
+            # the last edge belongs to the last band
+            self.band[lat == self.bands[-1]] = nband - 1
+            self.band[(self.band < 0) | (self.band >= nband)] = -1
+
+        # precomputed band membership: cell areas by (cell, band), global last
+        cell = np.arange(self.ncell)
+        inside = self.band >= 0
+        self.weights = scipy.sparse.csr_matrix(
+            (
+                np.concatenate([self.area[inside], self.area]),
+                (
+                    np.concatenate([cell[inside], cell]),
+                    np.concatenate([self.band[inside], np.full(self.ncell, nband)]),
+                ),
+            ),
+            shape=(self.ncell, nband + 1),
+        )
+        self.total = np.asarray(self.weights.sum(axis=0)).ravel()
+
+    @classmethod
+    def from_grids(
+        cls,
+        grids: "GlobalGrids",
+        bands: typing.Optional[np.ndarray] = None,
+        radius: float = radius,
+    ):
+        """
+        Args:
+            grids: GlobalGrids
+            bands: ascending edges [deg] of the latitude bands
+            radius: radius of the sphere [m]
+        """
+        _, lat = grids.get_lonlat_c()
+        return cls(grids.get_area(radius), lat, bands)
+
+    def cells(self, field: np.ndarray) -> np.ndarray:
+        """
+        Returns:
+            field as NDArray of shape (m, ncell), a view where possible
+        """
+        field = np.asarray(field)
+        if field.shape[-1:] == (self.ncell,):
+            return field.reshape((-1, self.ncell))
+        if field.ndim >= 2 and field.shape[-2] * field.shape[-1] == self.ncell:
+            return field.reshape((-1, self.ncell))
+        raise ValueError(f"'field' must end in {self.ncell} cells")
+
+    def leading_shape(self, field: np.ndarray) -> typing.Tuple[int, ...]:
+        if field.shape[-1] == self.ncell:
+            return field.shape[:-1]
+        return field.shape[:-2]
+
+    def means(self, x: np.ndarray) -> typing.Tuple[np.ndarray, np.ndarray]:
+        """
+        Args:
+            x: NDArray of shape (m, ncell)
+
+        Returns:
+            band means and global mean (last column) of shape (m, nband + 1)
+            and the valid mask of x, None if all cells are valid
+        """
+        finite = np.isfinite(x)
+        # empty bands give nan
+        with np.errstate(divide="ignore", invalid="ignore"):
+            if finite.all():
+                return (self.weights.T @ x.T).T / self.total, None
+            summed = (self.weights.T @ np.where(finite, x, 0.0).T).T
+            area = (self.weights.T @ finite.T.astype(np.float64)).T
+            return summed / area, finite
+
+    def mean(self, field: np.ndarray) -> np.ndarray:
+        """
+        Returns:
+            area-weighted global mean of shape field.shape[:-2] (or [:-1])
+        """
+        mean, _ = self.means(self.cells(field))
+        return mean[:, -1].reshape(self.leading_shape(field))
+
+    def zonal_mean(self, field: np.ndarray) -> np.ndarray:
+        """
+        Returns:
+            area-weighted mean of every latitude band of shape
+            field.shape[:-2] (or [:-1]) + (nband,)
+        """
+        mean, _ = self.means(self.cells(field))
+        return mean[:, :-1].reshape(self.leading_shape(field) + (-1,))
+
+    def variance(self, field: np.ndarray) -> np.ndarray:
+        """
+        Returns:
+            area-weighted variance of shape field.shape[:-2] (or [:-1])
+        """
+        return self.summary(field).variance
+
+    def summary(self, field: np.ndarray) -> Summary:
+        """
+        all statistics of field in one pass over its cells
+
+        Returns:
+            Summary of arrays of leading shape field.shape[:-2] (or [:-1])
+        """
+        x = self.cells(field)
+        shape = self.leading_shape(field)
+        mean, finite = self.means(x)
+        # variance about the mean, which is stable for large offsets
+        anomaly = x - mean[:, -1:]
+        if finite is None:
+            variance = (anomaly * anomaly) @ self.area / self.total[-1]
+            valid = x
+        else:
+            anomaly[~finite] = 0.0
+            with np.errstate(divide="ignore", invalid="ignore"):
+                variance = (anomaly * anomaly) @ self.area / (finite @ self.area)
+            valid = np.where(finite, x, np.inf)
+        argmin = valid.argmin(axis=1)
+        if finite is not None:
+            valid[~finite] = -np.inf
+        argmax = valid.argmax(axis=1)
+        rows = np.arange(len(x))
+        minimum = x[rows, argmin]
+        maximum = x[rows, argmax]
+        return Summary(
+            mean[:, -1].reshape(shape),
+            variance.reshape(shape),
+            minimum.reshape(shape),
+            argmin.reshape(shape),
+            maximum.reshape(shape),
+            argmax.reshape(shape),
+            mean[:, :-1].reshape(shape + (-1,)),
+        )
+
+    def summarize(
+        self,
+        reader: "GlobalReader",
+        steps: typing.Union[int, typing.Sequence[int]],
+        ks: typing.Union[int, typing.Sequence[int], None] = None,
+        varname: typing.Optional[str] = None,
+        max_bytes: int = 256 * 1024**2,
+    ) -> Summary:
+        """
+        statistics of every step and layer of a run, read in chunks of at
+        most max_bytes (all layers of several steps, or several layers of
+        one step); a few chunks are held in memory at a time
+
+        Args:
+            reader: GlobalReader of the run
+            steps: step or sequence of steps
+            ks: layer or sequence of layers, all layers if None
+            varname: variable name, required for PE files
+            max_bytes: size of a chunk in float64
+
+        Returns:
+            Summary of arrays of shape (nstep, nk)
+        """
+        steps = np.atleast_1d(steps)
+        if ks is None:
+            ks = np.arange(reader.num_of_layer(int(steps[0]), varname))
+        ks = np.atleast_1d(ks)
+        nstep, nk = len(steps), len(ks)
+        layer_bytes = self.ncell * np.dtype(np.float64).itemsize
+        nk_chunk = int(np.clip(max_bytes // layer_bytes, 1, nk))
+        nstep_chunk = 1
+        if nk_chunk == nk:
+            nstep_chunk = int(np.clip(max_bytes // (layer_bytes * nk), 1, nstep))
+
+        parts: typing.List[typing.List[Summary]] = []
+        buffer = None
+        for s in range(0, nstep, nstep_chunk):
+            row = []
+            for k in range(0, nk, nk_chunk):
+                chunk_steps = steps[s : s + nstep_chunk]
+                chunk_ks = ks[k : k + nk_chunk]
+                if buffer is None:
+                    block = reader.read_block(chunk_steps, chunk_ks, varname)
+                    buffer = block
+                else:
+                    block = buffer[: len(chunk_steps), :, : len(chunk_ks)]
+                    reader.read_block(chunk_steps, chunk_ks, varname, out=block)
+                # (nstep, lall, nk, gall_in) -> (nstep, nk, lall, gall_in)
+                row.append(self.summary(block.transpose(0, 2, 1, 3)))
+            parts.append(row)
+        return Summary(
+            *[
+                np.concatenate(
+                    [np.concatenate([p[i] for p in row], axis=1) for row in parts]
+                )
+                for i in range(len(Summary._fields))
+            ]
+        )
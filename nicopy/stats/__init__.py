@@ -0,0 +1,3 @@
+from .Statistics import Statistics, Summary
+
+__all__ = ["Statistics", "Summary"]
@@ -1,3 +1,21 @@
-from .main import calc_gall, calc_gall_in, calc_lall, rearrange_lon
+from .main import (
+    as_cells,
+    as_slice,
+    calc_gall,
+    calc_gall_in,
+    calc_lall,
+    copy_to,
+    rearrange_lon,
+)
+from .prefetch import iter_prefetch
 
-__all__ = ["calc_gall", "calc_gall_in", "calc_lall", "rearrange_lon"]
+__all__ = [
+    "as_cells",
+    "as_slice",
+    "calc_gall",
+    "calc_gall_in",
+    "calc_lall",
+    "copy_to",
+    "iter_prefetch",
+    "rearrange_lon",
+]
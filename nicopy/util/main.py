@@ -1,6 +1,8 @@
 #!/usr/bin/env python
 # coding: utf-8
+from typing import Any, Optional, Tuple, Union
 import numpy as np
+from numpy.typing import DTypeLike
 
 """
 NICoPy
@@ -46,3 +48,60 @@ def rearrange_lon(lon: np.ndarray) -> np.ndarray:
     lon[less_than] = lon[less_than] + 360.0
     lon[greater_than] = lon[greater_than] - 360.0
     return lon
+
+
+def as_slice(index: np.ndarray) -> Union[slice, np.ndarray]:
+    """
+    turn an evenly spaced ascending index array into a slice
+    """
+    if len(index) == 0:
+        return index
+    step = int(index[1] - index[0]) if len(index) > 1 else 1
+    if step > 0 and (np.diff(index) == step).all():
+        return slice(int(index[0]), int(index[-1]) + 1, step)
+    return index
+
+
+def copy_to(
+    src: np.ndarray, out: Optional[np.ndarray] = None, dtype: DTypeLike = None
+) -> np.ndarray:
+    """
+    copy src into a native-endian C-contiguous array; byteswap, gather of
+    strided views and cast to dtype happen in a single pass
+
+    Args:
+        src: NDArray of any byte order and layout
+        out: C-contiguous NDArray with the same number of elements as src
+        dtype: dtype of the new array if out is None (native src dtype if None)
+
+    Returns:
+        out, or a new NDArray of shape src.shape
+    """
+    if out is None:
+        dtype = src.dtype.newbyteorder("=") if dtype is None else np.dtype(dtype)
+        out = np.empty(src.shape, dtype=dtype)
+    elif out.size != src.size or not out.flags.c_contiguous:
+        raise ValueError(f"'out' must be a C-contiguous array of size {src.size}")
+    out.reshape(src.shape)[...] = src
+    return out
+
+
+def as_cells(points: np.ndarray, index: Any = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Args:
+        points: (region, ij) pairs of shape (npoints, 2), or (lat, lon) pairs
+            [deg] if index is given
+        index: CellIndex placing (lat, lon) points at the nearest cell
+
+    Returns:
+        l: region of the points of shape (npoints)
+        ij: inner grid point of the points of shape (npoints)
+    """
+    points = np.asarray(points)
+    if points.ndim != 2 or points.shape[1] != 2:
+        raise ValueError("'points' must be of shape (npoints, 2)")
+    if index is not None:
+        return index.nearest(points[:, 1], points[:, 0])
+    if not np.issubdtype(points.dtype, np.integer):
+        raise ValueError("(region, ij) points must be integers, or give an index")
+    return points[:, 0].astype(np.int64), points[:, 1].astype(np.int64)
@@ -0,0 +1,69 @@
+import typing
+import queue
+import threading
+import numpy as np
+from numpy.typing import DTypeLike
+
+T = typing.TypeVar("T")
+
+
+def iter_prefetch(
+    read: typing.Callable[[T, np.ndarray], typing.Any],
+    keys: typing.Iterable[T],
+    shape: typing.Tuple[int, ...],
+    dtype: DTypeLike,
+    depth: int = 2,
+) -> typing.Iterator[typing.Tuple[T, np.ndarray]]:
+    """
+    read ahead on a background thread into a ring of depth + 1 buffers
+
+    Args:
+        read: read(key, out) fills the buffer out for key
+        keys: keys in the order they are yielded, e.g. steps
+        shape: shape of one buffer
+        dtype: dtype of the buffers
+        depth: number of keys read ahead of the consumer
+
+    Yields:
+        (key, buffer); the buffer is reused once the consumer asks for the
+        next key, so copy it to keep it
+    """
+    if depth < 1:
+        raise ValueError("'depth' must be positive")
+    free: "queue.Queue[np.ndarray]" = queue.Queue()
+    for _ in range(depth + 1):
+        free.put(np.empty(shape, dtype=dtype))
+    ready: "queue.Queue[typing.Any]" = queue.Queue()
+    stop = threading.Event()
+    done = object()
+
+    def worker():
+        try:
+            for key in keys:
+                buf = free.get()
+                if stop.is_set():
+                    return
+                read(key, buf)
+                ready.put((key, buf))
+        except BaseException as e:
+            ready.put(e)
+            return
+        ready.put(done)
+
+    thread = threading.Thread(target=worker, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = ready.get()
+            if item is done:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            key, buf = item
+            yield key, buf
+            # the consumer is done with buf
+            free.put(buf)
+    finally:
+        stop.set()
+        free.put(np.empty(0))  # wake up the worker if it waits for a buffer
+        thread.join()
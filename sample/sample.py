@@ -9,13 +9,15 @@ import matplotlib
 import matplotlib.pyplot as plt
 import matplotlib.colors as mcolors
 from matplotlib.cm import jet
+from matplotlib.collections import PolyCollection
 import cartopy.crs as ccrs
+import pyarrow as pa
 from spatialpandas import GeoDataFrame
 from spatialpandas.geometry import PolygonArray
 import datashader as ds
 import datashader.transfer_functions as tf
 
-from nicopy.grids import LegacyGrids
+from nicopy.grids import GlobalGrids
 from nicopy.reader import LegacyReader, PandaReader
 from nicopy.util import calc_lall
 
@@ -64,6 +66,9 @@ def main():
             data = []
             for pe in range(run_pe):
                 data.extend(read_panda(glevel, rlevel, num_of_rgn, pe))
+    # (lall, gall_in)
+    values = np.stack(data)
+    grids = GlobalGrids(glevel, rlevel, "./testdata/grid/grid.rgn{l:05d}")
     end_time = time.perf_counter()
     print("read:", end_time - start_time)
 
@@ -71,20 +76,20 @@ def main():
     start_time = time.perf_counter()
     projection = ccrs.Orthographic(central_latitude=0.0, central_longitude=0.0)
     if args.plot == "ds":
-        outlines = []
-        _values = []
-        for lonlat_v, sa_t2m in data:
-            ncells, _, _ = lonlat_v.shape
-            for i in range(ncells):
-                coords = projection.transform_points(
-                    ccrs.Geodetic(), lonlat_v[i, :, 0], lonlat_v[i, :, 1]
-                )
-                points = coords[:, 0:2].ravel()
-                outline = np.concatenate([points, points[0:2]])
-                outlines.append([outline])
-            _values.append(sa_t2m)
-        values = np.concatenate(_values)
-        polygons = PolygonArray(outlines)
+        outlines = grids.get_polygons(closed=True)
+        coords = projection.transform_points(
+            ccrs.Geodetic(), outlines.coords[:, 0], outlines.coords[:, 1]
+        )
+        # polygons of one ring each: (polygon -> ring -> x, y) list arrays
+        rings = pa.ListArray.from_arrays(
+            (outlines.offsets * 2).astype(np.int32), coords[:, 0:2].ravel()
+        )
+        polygons = PolygonArray(
+            pa.ListArray.from_arrays(
+                np.arange(len(outlines) + 1, dtype=np.int32), rings
+            )
+        )
+        values = values.ravel()[outlines.cell]
         df = GeoDataFrame({"polygons": polygons, "values": values})
 
         vmin = 0
@@ -122,14 +127,15 @@ def main():
         cmap = plt.cm.jet
         norm = mcolors.Normalize(vmin=0, vmax=30)
 
-        for lonlat_v, sa_t2m in data:
-            ncells, _, _ = lonlat_v.shape
-            gscolors = cmap(norm(sa_t2m))
-            for i in range(ncells):
-                poly = plt.Polygon(
-                    lonlat_v[i], fc=gscolors[i], transform=ccrs.Geodetic()
-                )
-                ax.add_patch(poly)
+        outlines = grids.get_polygons()
+        collection = PolyCollection(
+            outlines.padded(),
+            array=values.ravel()[outlines.cell],
+            cmap=cmap,
+            norm=norm,
+            transform=ccrs.PlateCarree(),
+        )
+        ax.add_collection(collection)
 
         sm = plt.cm.ScalarMappable(cmap=cmap, norm=norm)
         fig.colorbar(sm, ax=ax)
@@ -147,18 +153,14 @@ def main():
 
 
 def read_legacy(glevel: int, rlevel: int, l: int):
-    grids = LegacyGrids(glevel, rlevel, f"./testdata/grid/grid.rgn{l:05d}")
-    lon_v, lat_v = grids.get_lonlat_v()
-    lonlat_v = np.stack([lon_v, lat_v], axis=-1)
-
     kall = 1
     reader = LegacyReader(
         glevel, rlevel, kall, f"./testdata/data_legacy/sa_t2m.rgn{l:05d}"
     )
     step = 0
     k = 0
-    sa_t2m = reader.read_rgn(step, k) - 273.15
-    return lonlat_v, sa_t2m
+    sa_t2m = reader.read_rgn(step, k, output_shape="1D") - 273.15
+    return sa_t2m
 
 
 def read_panda(glevel: int, rlevel: int, num_of_rgn: int, pe: int):
@@ -166,15 +168,7 @@ def read_panda(glevel: int, rlevel: int, num_of_rgn: int, pe: int):
     step = 1
     k = 0
     sa_t2m = reader.read_pe("sa_t2m", step, k) - 273.15
-    output = []
-    for rgn in range(num_of_rgn):
-        # read grids
-        l = num_of_rgn * pe + rgn
-        grids = LegacyGrids(glevel, rlevel, f"./testdata/grid/grid.rgn{l:05d}")
-        lon_v, lat_v = grids.get_lonlat_v()
-        lonlat_v = np.stack([lon_v, lat_v], axis=-1)
-        output.append((lonlat_v, sa_t2m[rgn]))
-    return output
+    return list(sa_t2m)
 
 
 if __name__ == "__main__":
@@ -6,4 +6,5 @@ setup(
     description="NICAM Icosahedral Grid Operator for Python",
     license="BSD-3-Clause",
     packages=find_packages(),
+    install_requires=["numpy", "scipy", "netCDF4"],
 )
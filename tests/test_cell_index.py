@@ -0,0 +1,51 @@
+import numpy as np
+
+from nicopy.regrid import CellIndex
+from nicopy.regrid.CellIndex import normalize
+
+deg = np.pi / 180
+
+
+def unit(lon: float, lat: float) -> np.ndarray:
+    lon, lat = lon * deg, lat * deg
+    return np.array([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+def hexagons() -> CellIndex:
+    """
+    hexagons of radius 1 deg around (0, 0), (10, 0) and (20, 0)
+    """
+    theta = np.deg2rad(60.0 * np.arange(6))
+    xyz_c = np.stack([unit(lon, 0.0) for lon in [0.0, 10.0, 20.0]])
+    xyz_v = np.stack(
+        [[unit(lon + np.cos(t), np.sin(t)) for t in theta] for lon in [0.0, 10.0, 20.0]]
+    )
+    return CellIndex(xyz_c, xyz_v, gall_in=3)
+
+
+def lonlat(xyz: np.ndarray):
+    return np.rad2deg(np.arctan2(xyz[1], xyz[0])), np.rad2deg(np.arcsin(xyz[2]))
+
+
+def test_locate_tolerance_is_in_radians():
+    index = hexagons()
+    a, b = index.xyz_v[0, 1].astype(float), index.xyz_v[0, 2].astype(float)
+    normal = normalize(np.cross(a, b))
+    # outward normal of the top edge, whose vertices run counterclockwise
+    outside = normalize(normalize(a + b) - 1e-7 * normal)
+    lon, lat = lonlat(outside)
+
+    l, ij = index.locate(lon, lat, tolerance=1e-6)
+    assert (l, ij) == (0, 0)
+    l, ij = index.locate(lon, lat, tolerance=1e-8)
+    assert (l, ij) == (-1, -1)
+
+
+def test_nearest_and_locate_agree():
+    index = hexagons()
+    lon = np.array([0.3, 9.6, 20.2, 4.0])
+    lat = np.array([0.2, -0.4, 0.5, 0.0])
+    l, ij = index.nearest(lon, lat)
+    np.testing.assert_array_equal(ij, [0, 1, 2, 0])
+    l, ij = index.locate(lon, lat)
+    np.testing.assert_array_equal(ij, [0, 1, 2, -1])
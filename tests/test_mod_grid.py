@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+from nicopy.grids.mod_grid import VECTR_abs, VECTR_cross, VECTR_dot, grid_conv
+from nicopy.util import calc_gall
+
+
+def center2vertex_loop(conv: grid_conv, GRD_x: np.ndarray) -> np.ndarray:
+    """
+    the former per-cell grid_conv.center2vertex, kept as the reference; the
+    work array starts as nan like the corners the batched version never fills
+    """
+    ADM_TI = 0
+    ADM_TJ = 1
+    ADM_gmin = conv.ADM_gmin
+    ADM_gmax = conv.ADM_gmax
+    GRD_xt = np.zeros([3, 2, conv.ADM_gall])
+    wk = np.full([2, conv.ADM_gall, 4, 3], np.nan)
+
+    for j in range(ADM_gmin - 1, ADM_gmax):
+        for i in range(ADM_gmin - 1, ADM_gmax):
+            ij = conv.suf(j, i)
+            ip1j = conv.suf(j, i + 1)
+            ip1jp1 = conv.suf(j + 1, i + 1)
+            ijp1 = conv.suf(j + 1, i)
+            for d in range(conv.ADM_nxyz):
+                wk[ADM_TI, ij, 0, d] = GRD_x[d, ij]
+                wk[ADM_TI, ij, 1, d] = GRD_x[d, ip1j]
+                wk[ADM_TI, ij, 2, d] = GRD_x[d, ip1jp1]
+                wk[ADM_TI, ij, 3, d] = GRD_x[d, ij]
+
+                wk[ADM_TJ, ij, 0, d] = GRD_x[d, ij]
+                wk[ADM_TJ, ij, 1, d] = GRD_x[d, ip1jp1]
+                wk[ADM_TJ, ij, 2, d] = GRD_x[d, ijp1]
+                wk[ADM_TJ, ij, 3, d] = GRD_x[d, ij]
+    wk[ADM_TI, conv.suf(ADM_gmin - 1, ADM_gmax), :, :] = wk[
+        ADM_TJ, conv.suf(ADM_gmin - 1, ADM_gmax), :, :
+    ]
+    wk[ADM_TJ, conv.suf(ADM_gmax, ADM_gmin - 1), :, :] = wk[
+        ADM_TI, conv.suf(ADM_gmax, ADM_gmin - 1), :, :
+    ]
+    # pentagone tentative
+    wk[ADM_TI, conv.suf(ADM_gmin - 1, ADM_gmin - 1), :, :] = wk[
+        ADM_TJ, conv.suf(ADM_gmin - 1, ADM_gmin), :, :
+    ]
+    o = np.zeros(3)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for t in range(2):
+            for j in range(ADM_gmin - 1, ADM_gmax + 1):
+                for i in range(ADM_gmin - 1, ADM_gmax + 1):
+                    ij = conv.suf(j, i)
+                    gc = np.zeros(3)
+                    for m in range(3):
+                        r_lenC = VECTR_dot(o, wk[t, ij, m, :], o, wk[t, ij, m + 1, :])
+                        r = VECTR_cross(o, wk[t, ij, m, :], o, wk[t, ij, m + 1, :])
+                        r_lenS = VECTR_abs(r)
+                        r[:] = r[:] / r_lenS * np.arctan2(r_lenS, r_lenC)
+                        gc[:] = gc[:] + r[:]
+                    gc_len = VECTR_abs(gc)
+                    GRD_xt[:, t, ij] = gc[:] / gc_len
+    return GRD_xt
+
+
+@pytest.mark.parametrize("glevel, rlevel", [(3, 1), (5, 2)])
+def test_center2vertex_matches_loop(glevel, rlevel):
+    gall, gall_1d = calc_gall(glevel, rlevel)
+    rng = np.random.default_rng(glevel)
+    grd_x = rng.standard_normal((3, gall))
+    grd_x /= np.linalg.norm(grd_x, axis=0)
+    conv = grid_conv(gall_1d)
+
+    expected = center2vertex_loop(conv, grd_x)
+    actual = conv.center2vertex(grd_x)
+
+    assert actual.shape == (3, 2, gall)
+    np.testing.assert_array_equal(actual, expected)
+
+
+def test_center2vertex_rejects_wrong_shape():
+    conv = grid_conv(6)
+    with pytest.raises(ValueError):
+        conv.center2vertex(np.zeros((3, 35)))
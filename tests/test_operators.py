@@ -0,0 +1,50 @@
+import os
+import sys
+import types
+
+import numpy as np
+import pytest
+
+from nicopy.operators import Operators
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "benchmark"))
+from synthetic import make_grids  # noqa: E402
+
+# real spherical harmonics Y_l^m (unnormalized) and l (l + 1)
+harmonics = {
+    "Y_1^0": (lambda x, y, z: z, 2),
+    "Y_1^1": (lambda x, y, z: x, 2),
+    "Y_2^0": (lambda x, y, z: 1.5 * z**2 - 0.5, 6),
+    "Y_2^2": (lambda x, y, z: x**2 - y**2, 6),
+    "Y_3^2": (lambda x, y, z: x * y * z, 12),
+}
+
+
+@pytest.fixture(scope="module")
+def operators():
+    ops = {}
+    for glevel in [5, 6]:
+        grd_x, grd_xt = make_grids(glevel, 1)
+        ops[glevel] = Operators(types.SimpleNamespace(grd_x=grd_x, grd_xt=grd_xt))
+    return ops
+
+
+def laplacian_error(op: Operators, name: str) -> np.ndarray:
+    f, eigenvalue = harmonics[name]
+    x, y, z = op.center.transpose(2, 0, 1)
+    value = f(x, y, z)
+    lap = op.laplacian(value) * op.radius**2
+    return np.abs(lap + eigenvalue * value) / eigenvalue
+
+
+@pytest.mark.parametrize("name", list(harmonics))
+def test_laplacian_max_error_falls(operators, name):
+    coarse = laplacian_error(operators[5], name)
+    fine = laplacian_error(operators[6], name)
+    assert coarse.max() < 5e-3
+    assert fine.max() < 0.7 * coarse.max()
+    # pentagons and the cells next to the poles converge too
+    before = coarse[operators[5].irregular]
+    after = fine[operators[6].irregular]
+    assert len(after) == 20
+    assert after.max() < 0.85 * before.max()
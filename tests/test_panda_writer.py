@@ -0,0 +1,50 @@
+import numpy as np
+
+from nicopy.reader import PandaReader, PandaWriter
+from nicopy.reader.PandaReader import FIO_FAPPEND
+from nicopy.util import calc_gall
+
+glevel, rlevel = 3, 1
+gall, _ = calc_gall(glevel, rlevel)
+rgnid = [0, 1, 2]
+
+
+def record(step: int) -> np.ndarray:
+    return np.full((len(rgnid), 2, gall), step, dtype=np.float32)
+
+
+def test_append_after_interrupted_write(tmp_path):
+    filename = str(tmp_path / "history.pe000000")
+    with PandaWriter(filename, glevel, rlevel, rgnid) as writer:
+        for step in range(3):
+            writer.write_pe("v", step, record(step))
+    # an interrupted write leaves bytes after the last counted record
+    with open(filename, "ab") as f:
+        f.write(b"\x01" * 500)
+
+    with PandaWriter(filename, rwmode=FIO_FAPPEND) as writer:
+        writer.write_pe("v", 3, record(3))
+
+    reader = PandaReader(filename)
+    assert reader.finfo["header"]["num_of_data"] == 4
+    assert reader.steps("v") == [0, 1, 2, 3]
+    for step in range(4):
+        block = reader.read_block("v", step)
+        assert np.all(block == step)
+    reader.fclose()
+
+
+def test_append_keeps_existing_records(tmp_path):
+    filename = str(tmp_path / "history.pe000000")
+    with PandaWriter(filename, glevel, rlevel, rgnid, endian="<") as writer:
+        writer.write_pe("v", 0, record(0))
+    size = len(open(filename, "rb").read())
+
+    with PandaWriter(filename, rwmode=FIO_FAPPEND) as writer:
+        writer.write_pe("v", 1, record(1))
+
+    reader = PandaReader(filename)
+    assert reader.finfo["status"]["endian"] == "<"
+    assert reader.finfo["index"][("v", 1)]["offset"] > size
+    np.testing.assert_array_equal(reader.read_block("v", [0, 1])[:, 0, 0, 0], [0, 1])
+    reader.fclose()